@@ -1,11 +1,15 @@
-from flask import Flask, jsonify
+from flask import Flask, jsonify, Response
 from flask_cors import CORS
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, scoped_session
 from config import Config
-from models import Base
-from utils.firebase_utils import initialize_firebase
-from utils.supabase_utils import initialize_supabase
+from database import db, engine, read_engine, SessionLocal, init_db
+from utils.http_utils import get_upstream_stats
+from utils.circuit_breaker_utils import get_breaker_stats
+from utils.service_utils import get_service_stats, warm_services
+from utils.upload_utils import SpooledRequest
+from utils.logging_utils import init_logging
+from utils.compression_utils import init_compression
+from utils.database_utils import mark_write
+from utils.metrics_utils import init_metrics, render_metrics, InstrumentedJSONProvider, CONTENT_TYPE as METRICS_CONTENT_TYPE
 
 # Import blueprints
 from routes.auth_routes import auth_bp
@@ -13,99 +17,105 @@ from routes.detect_routes import detect_bp, scan_bp
 from routes.appointment_routes import appointment_bp
 from routes.chatbot_routes import chatbot_bp
 from routes.clinic_routes import clinic_bp
-
-# Initialize Flask app
-app = Flask(__name__)
-app.config.from_object(Config)
-
-# Enable CORS for React frontend
-CORS(app, resources={
-    r"/api/*": {
-        "origins": ["http://localhost:5173", "http://localhost:8080", "http://localhost:3000", "http://localhost:8081"],
-        "methods": ["GET", "POST", "PUT", "DELETE", "PATCH"],
-        "allow_headers": ["Content-Type", "Authorization"]
-    }
-})
-
-# Initialize database
-if not Config.SQLALCHEMY_DATABASE_URI:
-    raise ValueError("DATABASE_URL environment variable is required")
-
-engine = create_engine(
-    Config.SQLALCHEMY_DATABASE_URI,
-    echo=Config.SQLALCHEMY_ECHO,
-    pool_pre_ping=True
-)
-
-# Create session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-db = scoped_session(SessionLocal)
-
-# Create tables
-def init_db():
-    """Initialize database tables"""
-    try:
-        Base.metadata.create_all(bind=engine)
-        print("✓ Database tables created successfully")
-    except Exception as e:
-        print(f"✗ Database initialization error: {e}")
-
-# Initialize services
-def init_services():
-    """Initialize external services"""
-    print("\nInitializing services...")
-    
-    # Firebase
-    if initialize_firebase():
-        print("✓ Firebase initialized")
-    else:
-        print("✗ Firebase initialization failed (optional)")
-    
-    # Supabase
-    if initialize_supabase():
-        print("✓ Supabase initialized")
-    else:
-        print("✗ Supabase initialization failed (optional)")
-
-# Register blueprints
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(detect_bp, url_prefix='/api/detect')
-app.register_blueprint(scan_bp, url_prefix='/api/scan')  # Frontend compatibility
-app.register_blueprint(appointment_bp, url_prefix='/api/appointments')
-app.register_blueprint(chatbot_bp, url_prefix='/api/chat')
-app.register_blueprint(clinic_bp, url_prefix='/api/clinics')
-
-# Health check endpoint
-@app.route('/')
-def index():
-    return jsonify({
-        'message': 'AI Health Scanner API',
-        'version': '1.0.0',
-        'status': 'running'
+import click
+import logging
+
+logger = logging.getLogger(__name__)
+
+def create_app(config=Config):
+    """
+    Build the Flask app. Nothing here connects to the database or sets up an
+    SDK: clients are created on first use (utils/service_utils.py) or by
+    gunicorn's worker hook (gunicorn.conf.py), and tables by `flask --app app init-db`.
+    """
+    # Structured logging through a background writer thread
+    init_logging()
+
+    # Initialize Flask app
+    app = Flask(__name__)
+    app.config.from_object(config)
+
+    # Spool large uploads to disk instead of holding them in memory
+    app.request_class = SpooledRequest
+
+    # Request/span timing for GET /api/metrics
+    app.json = InstrumentedJSONProvider(app)
+    init_metrics(app)
+
+    # gzip/brotli for large JSON responses
+    init_compression(app)
+
+    # Enable CORS for React frontend
+    CORS(app, resources={
+        r"/api/*": {
+            "origins": ["http://localhost:5173", "http://localhost:8080", "http://localhost:3000", "http://localhost:8081"],
+            "methods": ["GET", "POST", "PUT", "DELETE", "PATCH"],
+            "allow_headers": ["Content-Type", "Authorization", "X-Last-Write"],
+            "expose_headers": ["X-Last-Write"]
+        }
     })
 
-@app.route('/api/health')
-def health_check():
-    return jsonify({'status': 'healthy'}), 200
-
-# Error handlers
-@app.errorhandler(404)
-def not_found(error):
-    return jsonify({'error': 'Endpoint not found'}), 404
-
-@app.errorhandler(500)
-def internal_error(error):
-    return jsonify({'error': 'Internal server error'}), 500
-
-# Request teardown
-@app.teardown_appcontext
-def shutdown_session(exception=None):
-    db.remove()
-
-# Initialize on startup
-with app.app_context():
-    init_db()
-    init_services()
+    # Callers who just wrote read from the primary
+    app.after_request(mark_write)
+
+    # Register blueprints
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(detect_bp, url_prefix='/api/detect')
+    app.register_blueprint(scan_bp, url_prefix='/api/scan')  # Frontend compatibility
+    app.register_blueprint(appointment_bp, url_prefix='/api/appointments')
+    app.register_blueprint(chatbot_bp, url_prefix='/api/chat')
+    app.register_blueprint(clinic_bp, url_prefix='/api/clinics')
+
+    # Health check endpoint
+    @app.route('/')
+    def index():
+        return jsonify({
+            'message': 'AI Health Scanner API',
+            'version': '1.0.0',
+            'status': 'running'
+        })
+
+    @app.route('/api/health')
+    def health_check():
+        return jsonify({'status': 'healthy'}), 200
+
+    @app.route('/api/health/upstreams')
+    def upstream_health():
+        """Connection reuse and latency counters, circuit breaker state and SDK client status"""
+        return jsonify({
+            'upstreams': get_upstream_stats(),
+            'circuit_breakers': get_breaker_stats(),
+            'services': get_service_stats()
+        }), 200
+
+    @app.route('/api/metrics')
+    def metrics():
+        """Request and span latency histograms in Prometheus text format"""
+        return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+    # Error handlers
+    @app.errorhandler(404)
+    def not_found(error):
+        return jsonify({'error': 'Endpoint not found'}), 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return jsonify({'error': 'Internal server error'}), 500
+
+    # Request teardown
+    @app.teardown_appcontext
+    def shutdown_session(exception=None):
+        db.remove()
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the database tables"""
+        init_db()
+        click.echo("✓ Database tables created")
+
+    return app
+
+app = create_app()
 
 if __name__ == '__main__':
     print("\n" + "="*50)
@@ -125,7 +135,10 @@ if __name__ == '__main__':
     print("  - GET    /api/clinics/nearby")
     print("  - GET    /api/clinics/details/<place_id>")
     print("\n" + "="*50 + "\n")
-    
+
+    # The development server sets up the SDK clients before the first request
+    warm_services()
+
     app.run(
         host='0.0.0.0',
         port=5000,
@@ -0,0 +1,71 @@
+"""
+Generate thumbnail and medium renditions for scans saved before renditions existed
+
+Usage:
+    python backfill_renditions.py [--batch-size 50] [--workers 4] [--limit N]
+
+Originals without renditions are processed in batches ordered by image URL;
+each batch is downloaded, resized and uploaded in parallel, then the URLs are
+stored on every scan sharing that original. Safe to stop and re-run: finished
+originals are skipped, and failed ones are retried on the next run.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import or_
+from database import SessionLocal
+from config import Config
+from models import Scan
+from utils.rendition_utils import create_renditions, store_renditions
+
+def pending_originals(db, after, batch_size):
+    rows = db.query(Scan.image_url).filter(
+        or_(Scan.thumbnail_url.is_(None), Scan.medium_url.is_(None)),
+        Scan.image_url > after
+    ).distinct().order_by(Scan.image_url).limit(batch_size).all()
+    return [row.image_url for row in rows]
+
+def backfill(batch_size, workers, limit=None):
+    db = SessionLocal()
+    last_url = ''
+    done = failed = 0
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='rendition-backfill') as executor:
+            while limit is None or done + failed < limit:
+                size = batch_size if limit is None else min(batch_size, limit - done - failed)
+                image_urls = pending_originals(db, last_url, size)
+                if not image_urls:
+                    break
+                last_url = image_urls[-1]
+
+                futures = [(image_url, executor.submit(create_renditions, image_url)) for image_url in image_urls]
+                for image_url, future in futures:
+                    try:
+                        store_renditions(db, image_url, future.result())
+                        done += 1
+                    except Exception as e:
+                        db.rollback()
+                        failed += 1
+                        print(f"✗ {image_url}: {e}")
+
+                print(f"Processed {done + failed} originals ({done} done, {failed} failed)")
+    finally:
+        db.close()
+
+    print(f"✓ Rendition backfill finished: {done} originals done, {failed} failed")
+    return done, failed
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate renditions for existing scans')
+    parser.add_argument('--batch-size', type=int, default=Config.RENDITION_BACKFILL_BATCH,
+                        help='Originals per batch')
+    parser.add_argument('--workers', type=int, default=4,
+                        help='Images processed in parallel')
+    parser.add_argument('--limit', type=int, default=None,
+                        help='Stop after this many originals')
+    args = parser.parse_args()
+
+    backfill(args.batch_size, args.workers, args.limit)
+
+if __name__ == "__main__":
+    main()
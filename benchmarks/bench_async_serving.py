@@ -0,0 +1,178 @@
+"""
+Throughput with a slow upstream: sync vs gthread vs gevent (async) workers
+
+A local stub stands in for Gemini and answers every call after --delay
+seconds, so POST /api/chat/ spends its time waiting on the network, as the
+scan, chat and clinics routes do. Each mode serves the app with gunicorn
+(gunicorn.conf.py, --workers workers) and, at each concurrency level, that
+many clients send one request each at the same time:
+
+    sync     one request per worker at a time (the previous default)
+    gthread  --threads requests per worker
+    gevent   the async serving mode: up to GUNICORN_WORKER_CONNECTIONS per worker
+
+Needs gevent for the gevent mode (pip install -r requirements.txt).
+
+Usage:
+    python benchmarks/bench_async_serving.py [--concurrency 50,200,1000] [--delay 0.1]
+        [--workers 1] [--threads 32] [--modes sync,gthread,gevent]
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+GEMINI_REPLY = b'{"candidates": [{"content": {"parts": [{"text": "Drink water and rest."}]}}]}'
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def raise_file_limit():
+    # Every in-flight request holds a socket in the client, the server and the stub
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+async def _serve_stub(port, delay):
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                length = 0
+                for line in head.split(b'\r\n'):
+                    if line.lower().startswith(b'content-length:'):
+                        length = int(line.split(b':', 1)[1])
+                await reader.readexactly(length)
+                await asyncio.sleep(delay)
+                writer.write(
+                    b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n'
+                    b'Content-Length: %d\r\n\r\n%s' % (len(GEMINI_REPLY), GEMINI_REPLY)
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, '127.0.0.1', port, backlog=4096)
+    async with server:
+        await server.serve_forever()
+
+def start_stub(delay):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, __file__, '--stub-port', str(port), '--delay', str(delay)])
+    wait_for_port(port)
+    return process, port
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Nothing listening on port {port}")
+
+def start_server(mode, args, stub_port):
+    port = free_port()
+    env = dict(
+        os.environ,
+        PORT=str(port),
+        WEB_CONCURRENCY=str(args.workers),
+        GUNICORN_WORKER_CLASS=mode,
+        # gunicorn turns sync workers with threads > 1 into gthread workers
+        GUNICORN_THREADS=str(args.threads if mode == 'gthread' else 1),
+        GUNICORN_WORKER_CONNECTIONS=str(max(args.concurrency)),
+        DATABASE_URL='sqlite://',
+        FLASK_ENV='production',
+        LOG_LEVEL='WARNING',
+        GEMINI_API_KEY='bench',
+        GEMINI_BASE_URL=f"http://127.0.0.1:{stub_port}",
+        HTTP_POOL_MAXSIZE=str(max(args.concurrency)),
+        HTTP_MAX_RETRIES='0'
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '--backlog', '4096', '--log-level', 'warning', 'app:app'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL
+    )
+    wait_for_port(port)
+    return process, port
+
+async def run_level(port, concurrency):
+    """(seconds, [latency seconds], errors) for `concurrency` simultaneous requests"""
+    import httpx
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=0)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=600) as client:
+        async def one():
+            start = time.perf_counter()
+            try:
+                response = await client.post('/api/chat/', json={'message': 'I have a headache'})
+                ok = response.status_code == 200
+            except httpx.HTTPError:
+                ok = False
+            return time.perf_counter() - start, ok
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(one() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+    return elapsed, [latency for latency, _ in results], sum(1 for _, ok in results if not ok)
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--concurrency', default='50,200,1000')
+    parser.add_argument('--delay', type=float, default=0.1, help='Upstream response time, seconds')
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--modes', default='sync,gthread,gevent')
+    parser.add_argument('--stub-port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    raise_file_limit()
+    if args.stub_port:
+        asyncio.run(_serve_stub(args.stub_port, args.delay))
+        return
+
+    args.concurrency = [int(value) for value in args.concurrency.split(',')]
+    modes = args.modes.split(',')
+    if 'gevent' in modes:
+        try:
+            import gevent  # noqa: F401
+        except ImportError:
+            print("gevent is not installed; skipping the gevent mode")
+            modes.remove('gevent')
+
+    stub, stub_port = start_stub(args.delay)
+    print(f"Upstream delay {args.delay * 1000:.0f}ms, {args.workers} worker(s), gthread with {args.threads} threads")
+    print(f"{'mode':>8} {'concurrency':>12} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    try:
+        for mode in modes:
+            server, port = start_server(mode, args, stub_port)
+            try:
+                asyncio.run(run_level(port, 10))  # Warm-up: worker boot, upstream pool
+                for concurrency in args.concurrency:
+                    elapsed, latencies, errors = asyncio.run(run_level(port, concurrency))
+                    print(f"{mode:>8} {concurrency:>12} {concurrency / elapsed:>8.0f} "
+                          f"{statistics.median(latencies) * 1000:>8.0f} {percentile(latencies, 0.99) * 1000:>8.0f} {errors:>7}")
+            finally:
+                server.terminate()
+                server.wait()
+    finally:
+        stub.terminate()
+        stub.wait()
+
+if __name__ == '__main__':
+    main()
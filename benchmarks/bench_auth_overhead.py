@@ -0,0 +1,122 @@
+"""
+Auth overhead per request: firebase_admin verify_id_token vs local keys vs token cache
+
+A throwaway RSA key signs Firebase-shaped ID tokens, and its certificate is
+served in place of Google's, so nothing goes over the network:
+
+    verify_id_token  auth.verify_id_token on every request (old require_auth); the
+                     certificate download is answered from memory, so this is a lower bound
+    local            verify_locally(): signature and claims checked with the in-memory keys
+    cached           verify_token() for a token already verified (the common case:
+                     clients reuse a token for up to an hour)
+    cached (many)    verify_token() cycling over --tokens distinct cached tokens
+
+Usage:
+    python benchmarks/bench_auth_overhead.py [--requests 2000] [--tokens 1000]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PROJECT_ID = 'bench-project'
+KEY_ID = 'bench-key'
+
+def make_key():
+    """PEM private key and a self-signed certificate for it"""
+    from datetime import datetime, timedelta
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, 'bench')])
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(key.public_key()) \
+        .serial_number(1).not_valid_before(datetime.utcnow() - timedelta(days=1)) \
+        .not_valid_after(datetime.utcnow() + timedelta(days=1)).sign(key, hashes.SHA256())
+    private_pem = key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    )
+    return private_pem, cert.public_bytes(serialization.Encoding.PEM).decode()
+
+def make_token(signer, uid):
+    import google.auth.jwt
+
+    now = int(time.time())
+    payload = {
+        'iss': f"https://securetoken.google.com/{PROJECT_ID}",
+        'aud': PROJECT_ID,
+        'auth_time': now,
+        'sub': uid,
+        'iat': now,
+        'exp': now + 3600,
+        'email': f"{uid}@example.com"
+    }
+    return google.auth.jwt.encode(signer, payload).decode()
+
+class LocalCertsResponse:
+    def __init__(self, certs):
+        self.status = 200
+        self.headers = {'cache-control': 'public, max-age=3600'}
+        self.data = json.dumps(certs).encode()
+
+def per_request_us(func, tokens, requests):
+    start = time.perf_counter()
+    for i in range(requests):
+        func(tokens[i % len(tokens)])
+    return (time.perf_counter() - start) / requests * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--tokens', type=int, default=1000)
+    args = parser.parse_args()
+
+    os.environ['LOG_LEVEL'] = 'CRITICAL'
+    sys.path.insert(0, ROOT)
+
+    import firebase_admin
+    import google.auth.crypt
+    from firebase_admin import auth, credentials
+    from utils.firebase_token_utils import signing_keys, verify_locally
+    from utils.firebase_utils import verify_token
+
+    private_pem, cert_pem = make_key()
+    signer = google.auth.crypt.RSASigner.from_string(private_pem, key_id=KEY_ID)
+    tokens = [make_token(signer, f"user-{i}") for i in range(args.tokens)]
+
+    # A service account for the throwaway key; nothing is fetched with it
+    app = firebase_admin.initialize_app(credentials.Certificate({
+        'type': 'service_account',
+        'project_id': PROJECT_ID,
+        'private_key': private_pem.decode(),
+        'client_email': f"bench@{PROJECT_ID}.iam.gserviceaccount.com",
+        'token_uri': 'https://oauth2.googleapis.com/token'
+    }))
+    certs = {KEY_ID: cert_pem}
+    # Serve our certificate where firebase_admin would download Google's
+    auth._get_client(app)._token_verifier.request = lambda url, method='GET', **kwargs: LocalCertsResponse(certs)
+    signing_keys.load(certs, max_age=3600)
+
+    assert auth.verify_id_token(tokens[0])['uid'] == 'user-0'
+    assert verify_locally(tokens[0], PROJECT_ID)['uid'] == 'user-0'
+    assert verify_token(tokens[0])['uid'] == 'user-0'
+    for token in tokens:
+        verify_token(token)
+
+    print(f"{args.requests} verifications per mode, {args.tokens} distinct tokens")
+    print(f"{'mode':>16} {'us/request':>11}")
+    results = [
+        ('verify_id_token', per_request_us(auth.verify_id_token, tokens, args.requests)),
+        ('local', per_request_us(lambda token: verify_locally(token, PROJECT_ID), tokens, args.requests)),
+        ('cached', per_request_us(verify_token, tokens[:1], args.requests)),
+        ('cached (many)', per_request_us(verify_token, tokens, args.requests))
+    ]
+    for mode, us in results:
+        print(f"{mode:>16} {us:>11.1f}")
+
+if __name__ == '__main__':
+    main()
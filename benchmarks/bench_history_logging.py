@@ -0,0 +1,150 @@
+"""
+Throughput of GET /api/detect/history with the old print logging vs the queued logger
+
+Seeds one user with scans and requests their history pages from several
+threads through the Flask test client. Each mode runs in a fresh process
+whose stdout goes to a file, like a container log:
+
+    before  the previous behaviour: banner prints and json.dumps(scans, indent=2) of every page
+    after   the structured logger at the default INFO level
+    debug   routes.detect_routes at DEBUG, payload logs sampled at LOG_PAYLOAD_SAMPLE_RATE
+
+Without DATABASE_URL an SQLite file is used (UUID columns stored as CHAR(32)).
+
+Usage:
+    python benchmarks/bench_history_logging.py [--scans 200] [--per-page 50] [--threads 4] [--seconds 5]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def serve(mode, scans, per_page, threads, seconds, database_dir):
+    """Run the benchmark in this process and print requests/sec to stderr"""
+    if not os.environ.get('DATABASE_URL'):
+        from sqlalchemy.dialects.postgresql import UUID
+        from sqlalchemy.ext.compiler import compiles
+
+        @compiles(UUID, 'sqlite')
+        def compile_uuid(element, compiler, **kw):
+            return 'CHAR(32)'
+
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(database_dir, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'production'
+    if mode == 'debug':
+        os.environ['LOG_LEVELS'] = 'routes.detect_routes=DEBUG'
+    sys.path.insert(0, ROOT)
+
+    import json
+    import uuid
+    from datetime import datetime, timedelta
+    import app as app_module
+    app_module.init_db()
+    import utils.firebase_utils as firebase_utils
+    from models import Scan, User
+
+    firebase_utils.verify_token = lambda token: {'uid': 'bench-user', 'email': 'bench@example.com'}
+
+    db = app_module.db
+    user = User(id=uuid.uuid4(), uid='bench-user', name='Bench', email='bench@example.com')
+    db.add(user)
+    now = datetime.utcnow()
+    for i in range(scans):
+        db.add(Scan(
+            id=uuid.uuid4(), user_id=user.id, disease_type='skin' if i % 2 else 'eye',
+            disease_name='Contact Dermatitis', confidence=0.87, severity='medium',
+            description='Red, itchy rash caused by contact with an irritant or allergen. ' * 3,
+            recommendations=['Avoid the irritant', 'Apply a cool compress', 'Use a fragrance-free moisturizer'],
+            image_url=f"https://storage.example.com/scans/{uuid.uuid4()}.jpg",
+            timestamp=now - timedelta(minutes=i)
+        ))
+    user_email, user_id = user.email, user.id
+    db.commit()
+    db.remove()
+
+    if mode == 'before':
+        # Re-create the removed print logging around the current view
+        view = app_module.app.view_functions['detect.get_scan_history']
+
+        def printing_view(user_uid):
+            from flask import request
+            print("\n" + "="*80)
+            print(f"📊 Fetching Scan History from Neon Database for user: {user_uid}")
+            print("="*80)
+            print(f"Pagination: page={request.args.get('page', 1)}, per_page={request.args.get('per_page', 10)}")
+            response, status = view(user_uid)
+            scans_data = response.get_json()['scans']
+            print(f"User found: {user_email} (ID: {user_id})")
+            print(f"\nRetrieved {len(scans_data)} scans (Total: {scans}):")
+            print(json.dumps(scans_data, indent=2))
+            print("="*80)
+            print("✅ Scan history fetched successfully!")
+            print("="*80 + "\n")
+            return response, status
+
+        app_module.app.view_functions['detect.get_scan_history'] = printing_view
+
+    pages = max((scans + per_page - 1) // per_page, 1)
+    counts = [0] * threads
+    deadline = time.perf_counter() + seconds
+
+    def client_loop(index):
+        client = app_module.app.test_client()
+        headers = {'Authorization': 'Bearer bench'}
+        while time.perf_counter() < deadline:
+            page = counts[index] % pages + 1
+            response = client.get(f"/api/detect/history/bench-user?page={page}&per_page={per_page}", headers=headers)
+            assert response.status_code == 200, response.status_code
+            counts[index] += 1
+
+    workers = [threading.Thread(target=client_loop, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    sys.stdout.flush()
+    print(f"{sum(counts) / elapsed:.1f}", file=sys.stderr)
+
+def run_case(mode, args):
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, 'stdout.log')
+        with open(log_path, 'w') as log:
+            result = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--serve', mode, '--database-dir', directory,
+                 '--scans', str(args.scans), '--per-page', str(args.per_page),
+                 '--threads', str(args.threads), '--seconds', str(args.seconds)],
+                stdout=log, stderr=subprocess.PIPE, text=True
+            )
+        if result.returncode != 0:
+            raise RuntimeError(result.stderr)
+        return float(result.stderr.strip().splitlines()[-1]), os.path.getsize(log_path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scans', type=int, default=200)
+    parser.add_argument('--per-page', type=int, default=50)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--database-dir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.scans, args.per_page, args.threads, args.seconds, args.database_dir)
+        return
+
+    print(f"{args.scans} scans, {args.per_page} per page, {args.threads} threads, {args.seconds:.0f}s per mode")
+    print(f"{'mode':>7} {'requests/sec':>13} {'stdout bytes':>13}")
+    for mode in ('before', 'after', 'debug'):
+        throughput, log_bytes = run_case(mode, args)
+        print(f"{mode:>7} {throughput:>13.1f} {log_bytes:>13}")
+
+if __name__ == '__main__':
+    main()
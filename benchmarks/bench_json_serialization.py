@@ -0,0 +1,99 @@
+"""
+History response serialization for 100 / 1,000 / 10,000 Scan rows
+
+Builds Scan objects in memory (no database) and times one response per mode:
+
+    stdlib         to_dict() per row + Flask's DefaultJSONProvider (old path)
+    orjson         to_dict() per row + OrjsonJSONProvider
+    orjson native  to_dict(native=True): UUIDs and datetimes left to orjson
+
+then compresses the orjson body with gzip (COMPRESSION_GZIP_LEVEL) and, when
+the brotli package is installed, brotli (COMPRESSION_BROTLI_QUALITY).
+
+Usage:
+    python benchmarks/bench_json_serialization.py [--rows 100 1000 10000] [--repeat 5]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def make_scans(count):
+    from datetime import datetime, timedelta
+    from models import Scan
+
+    user_id = uuid.uuid4()
+    start = datetime(2025, 1, 1)
+    return [
+        Scan(
+            id=uuid.uuid4(),
+            user_id=user_id,
+            disease_type='skin',
+            disease_name='Contact Dermatitis',
+            confidence=0.87,
+            severity='medium',
+            description='An itchy rash caused by contact with an irritant or allergen.',
+            recommendations=['Avoid the irritant', 'Apply a fragrance-free moisturizer', 'See a dermatologist if it spreads'],
+            image_url=f"https://storage.example.com/scans/{i}.jpg",
+            thumbnail_url=f"https://storage.example.com/scans/{i}_thumbnail.jpg",
+            medium_url=f"https://storage.example.com/scans/{i}_medium.jpg",
+            image_stats={'original_bytes': 2400000, 'bytes': 310000, 'width': 1536, 'height': 1152},
+            timestamp=start + timedelta(minutes=i, microseconds=i)
+        )
+        for i in range(count)
+    ]
+
+def timed_ms(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    sys.path.insert(0, ROOT)
+
+    from flask import Flask
+    from flask.json.provider import DefaultJSONProvider
+    from utils.compression_utils import brotli, compress
+    from utils.json_utils import OrjsonJSONProvider, orjson
+
+    if orjson is None:
+        sys.exit("orjson is not installed (pip install orjson)")
+
+    app = Flask(__name__)
+    stdlib, fast = DefaultJSONProvider(app), OrjsonJSONProvider(app)
+
+    def respond(provider, scans, native=False):
+        return provider.response({'scans': [scan.to_dict(native=native) for scan in scans], 'next_cursor': None}).get_data()
+
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    print(f"{'rows':>6} {'stdlib ms':>10} {'orjson ms':>10} {'native ms':>10} {'bytes':>9}"
+          + ''.join(f" {encoding + ' ms':>8} {encoding + ' bytes':>9}" for encoding in encodings))
+    with app.app_context():
+        for count in args.rows:
+            scans = make_scans(count)
+            stdlib_ms, body = timed_ms(lambda: respond(stdlib, scans), args.repeat)
+            orjson_ms, fast_body = timed_ms(lambda: respond(fast, scans), args.repeat)
+            native_ms, native_body = timed_ms(lambda: respond(fast, scans, native=True), args.repeat)
+            assert orjson.loads(body) == orjson.loads(fast_body) == orjson.loads(native_body)
+
+            line = f"{count:>6} {stdlib_ms:>10.2f} {orjson_ms:>10.2f} {native_ms:>10.2f} {len(native_body):>9}"
+            for encoding in encodings:
+                compress_ms, compressed = timed_ms(lambda: compress(native_body, encoding), args.repeat)
+                line += f" {compress_ms:>8.2f} {len(compressed):>9}"
+            print(line)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Throughput of the local CPU analysis backend (images/sec per core)
+
+Decodes and preprocesses synthetic camera-sized JPEGs and runs them through
+the local classifier at several batch sizes, pinned to one thread so the
+numbers are per core. Without --model a random NumPy MLP with the same
+input shape is generated, which measures the pipeline overhead only.
+
+Usage:
+    python benchmarks/bench_local_inference.py [--model skin.onnx] [--images 64] [--batch-sizes 1,8,32]
+"""
+import os
+
+# One thread per process: results are per core
+for variable in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+    os.environ.setdefault(variable, '1')
+os.environ.setdefault('LOCAL_INFERENCE_THREADS', '1')
+
+import argparse
+import io
+import json
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import numpy as np
+from PIL import Image
+from utils.local_inference_utils import LocalClassifier
+
+def synthetic_model(directory, input_size=128, hidden=256, classes=8):
+    """Random two-layer MLP in the .npz format plus its labels file"""
+    rng = np.random.default_rng(0)
+    features = 3 * input_size * input_size
+    path = os.path.join(directory, 'bench.npz')
+    np.savez(
+        path,
+        w0=(rng.standard_normal((features, hidden)) * 0.01).astype(np.float32),
+        b0=np.zeros(hidden, dtype=np.float32),
+        w1=(rng.standard_normal((hidden, classes)) * 0.1).astype(np.float32),
+        b1=np.zeros(classes, dtype=np.float32)
+    )
+    with open(os.path.join(directory, 'bench.json'), 'w') as f:
+        json.dump({'version': 'bench', 'input_size': input_size, 'labels': [f"Class {i}" for i in range(classes)]}, f)
+    return path
+
+def synthetic_images(count, size=(1536, 1152)):
+    images = []
+    for i in range(count):
+        img = Image.effect_noise(size, 40 + i % 20).convert('RGB')
+        output = io.BytesIO()
+        img.save(output, format='JPEG', quality=85)
+        images.append(output.getvalue())
+    return images
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--model', help='.onnx or .npz model with a .json labels file next to it')
+    parser.add_argument('--images', type=int, default=64)
+    parser.add_argument('--batch-sizes', default='1,8,32')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        classifier = LocalClassifier(args.model or synthetic_model(directory))
+        images = synthetic_images(args.images)
+        print(f"Model: {classifier.model_name} (input {classifier.input_size}px), {len(images)} images, 1 thread")
+
+        start = time.perf_counter()
+        tensors = [classifier.preprocess(image) for image in images]
+        preprocess_s = time.perf_counter() - start
+        print(f"Decode + preprocess: {len(images) / preprocess_s:8.1f} images/sec")
+
+        classifier.predict(np.stack(tensors[:1]))  # Warm-up
+
+        print(f"{'batch':>6} {'inference img/s':>16} {'end-to-end img/s':>18}")
+        for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+            start = time.perf_counter()
+            for offset in range(0, len(tensors), batch_size):
+                classifier.predict(np.stack(tensors[offset:offset + batch_size]))
+            inference_s = time.perf_counter() - start
+            print(f"{batch_size:>6} {len(tensors) / inference_s:>16.1f} {len(tensors) / (inference_s + preprocess_s):>18.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Per-request cost of the metrics layer (microseconds)
+
+Times the recording primitives directly (histogram observe, span()), then
+serves the same requests through the Flask test client with METRICS_ENABLED
+on and off, each in a fresh process. The benchmark route runs one SQL query,
+a few spans and a JSON response, so the request hooks, the db.query and
+serialize spans and the span() calls are all on the measured path.
+
+Usage:
+    python benchmarks/bench_metrics_overhead.py [--requests 5000]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def per_call_us(func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def primitives(iterations):
+    sys.path.insert(0, ROOT)
+    from utils.metrics_utils import Histogram, span
+
+    histogram = Histogram('bench_seconds', 'Benchmark', ('span', 'endpoint'))
+
+    def empty_span():
+        with span('bench'):
+            pass
+
+    print(f"Histogram.observe: {per_call_us(lambda: histogram.observe(0.003, 'bench', 'endpoint'), iterations):6.2f} us")
+    print(f"span():            {per_call_us(empty_span, iterations):6.2f} us")
+
+def serve(requests_count):
+    """Run the requests in this process and print microseconds per request"""
+    os.environ.setdefault('DATABASE_URL', 'sqlite://')
+    os.environ['FLASK_ENV'] = 'production'
+    sys.path.insert(0, ROOT)
+
+    from flask import jsonify
+    from sqlalchemy import text
+    import app as app_module
+    from utils.metrics_utils import span
+
+    @app_module.app.route('/__bench')
+    def bench():
+        with span('bench.lookup'):
+            app_module.db.execute(text('SELECT 1')).scalar()
+        with span('bench.work'):
+            pass
+        return jsonify({'ok': True, 'items': list(range(10))})
+
+    client = app_module.app.test_client()
+    for _ in range(200):  # Warm-up
+        client.get('/__bench')
+    app_module.db.remove()
+
+    start = time.perf_counter()
+    for _ in range(requests_count):
+        client.get('/__bench')
+    elapsed = time.perf_counter() - start
+    print(f"{elapsed / requests_count * 1e6:.2f}")
+
+def run_case(enabled, requests_count):
+    env = dict(os.environ, METRICS_ENABLED='true' if enabled else 'false')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--serve', '--requests', str(requests_count)],
+        env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.requests)
+        return
+
+    primitives(200000)
+
+    disabled = run_case(False, args.requests)
+    enabled = run_case(True, args.requests)
+    print(f"Request, metrics off: {disabled:8.1f} us")
+    print(f"Request, metrics on:  {enabled:8.1f} us")
+    print(f"Overhead per request: {enabled - disabled:8.1f} us")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+Scan history page latency on a seeded scans table: OFFSET vs keyset cursor
+
+Seeds --scans scans (default 1M) spread over --users users, then times
+history pages for one user at increasing depth:
+
+    offset+count  LIMIT/OFFSET page plus COUNT over the user's scans (old endpoint)
+    offset        LIMIT/OFFSET page only
+    keyset        page after a (timestamp, id) cursor (history_page(cursor=...))
+
+and the total count by COUNT_MODES ('exact' vs 'stats'). Run once with
+--without-indexes to drop the composite history indexes and compare, or
+with --fields to time pages that load only those columns (the fields=
+parameter); the pages are serialized with to_dict() in every mode.
+Without DATABASE_URL an SQLite file is used (UUID columns stored as CHAR(32));
+pass --db to keep and reuse the seeded file.
+
+Usage:
+    python benchmarks/bench_scan_history.py [--scans 1000000] [--users 100] [--per-page 20]
+                                            [--type skin] [--db PATH] [--without-indexes]
+                                            [--fields disease_name,confidence,severity,thumbnail_url,timestamp]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SEED_CHUNK = 20000
+
+HISTORY_INDEXES = ('idx_scans_user_id_timestamp', 'idx_scans_user_id_disease_type_timestamp')
+
+def seed(app_module, scans, users):
+    from datetime import datetime, timedelta
+    from sqlalchemy import func, insert, select
+    from models import Scan, User, UserStats
+
+    with app_module.engine.begin() as conn:
+        existing = conn.execute(select(func.count()).select_from(Scan)).scalar()
+        if existing >= scans:
+            print(f"Reusing {existing} seeded scans")
+            return conn.execute(select(User.id).order_by(User.id).limit(1)).scalar()
+
+        user_ids = [uuid.uuid4() for _ in range(users)]
+        conn.execute(insert(User), [
+            {'id': user_id, 'uid': f"bench-{i}", 'name': 'Bench', 'email': f"bench{i}@example.com"}
+            for i, user_id in enumerate(user_ids)
+        ])
+
+    start = datetime(2023, 1, 1)
+    began = time.perf_counter()
+    for offset in range(0, scans, SEED_CHUNK):
+        rows = [
+            {
+                'id': uuid.uuid4(),
+                'user_id': user_ids[i % users],
+                'disease_type': 'skin' if (i // users) % 2 else 'eye',
+                'disease_name': 'Contact Dermatitis',
+                'confidence': 0.87,
+                'severity': 'medium',
+                'description': 'An itchy rash caused by contact with an irritant or allergen. ' * 8,
+                'recommendations': ['Avoid the irritant', 'Apply a fragrance-free moisturizer', 'See a dermatologist if it spreads'],
+                'image_url': f"https://storage.example.com/scans/{i}.jpg",
+                # Several scans share a second, so the id tie-breaker matters
+                'timestamp': start + timedelta(seconds=i // 3)
+            }
+            for i in range(offset, min(offset + SEED_CHUNK, scans))
+        ]
+        with app_module.engine.begin() as conn:
+            conn.execute(insert(Scan), rows)
+    print(f"Seeded {scans} scans for {users} users in {time.perf_counter() - began:.1f}s")
+
+    with app_module.engine.begin() as conn:
+        totals = conn.execute(
+            select(Scan.user_id, Scan.disease_type, func.count()).group_by(Scan.user_id, Scan.disease_type)
+        ).all()
+        stats = {}
+        for user_id, disease_type, count in totals:
+            item = stats.setdefault(user_id, {'id': uuid.uuid4(), 'user_id': user_id, 'total_scans': 0, 'skin_scans': 0, 'eye_scans': 0})
+            item['total_scans'] += count
+            item[f"{disease_type}_scans"] = count
+        conn.execute(insert(UserStats), list(stats.values()))
+
+    return min(user_ids)
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scans', type=int, default=1000000)
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--type', default=None, help="Filter by disease type ('skin' or 'eye')")
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--db', default=None, help='SQLite file to create or reuse')
+    parser.add_argument('--without-indexes', action='store_true', help='Drop the composite history indexes first')
+    parser.add_argument('--fields', default=None, help='Comma-separated Scan fields to load and serialize')
+    args = parser.parse_args()
+
+    if not os.environ.get('DATABASE_URL'):
+        from sqlalchemy.dialects.postgresql import UUID
+        from sqlalchemy.ext.compiler import compiles
+
+        @compiles(UUID, 'sqlite')
+        def compile_uuid(element, compiler, **kw):
+            return 'CHAR(32)'
+
+        path = args.db or os.path.join(tempfile.mkdtemp(), 'bench.db')
+        os.environ['DATABASE_URL'] = f"sqlite:///{path}"
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import text
+    import app as app_module
+    app_module.init_db()
+    from utils.scan_history_utils import count_history, encode_cursor, history_page, history_query, parse_fields
+
+    user_id = seed(app_module, args.scans, args.users)
+
+    from models import Scan
+    with app_module.engine.begin() as conn:
+        # A reused database may have had them dropped by an earlier run
+        for index in Scan.__table__.indexes:
+            if index.name in HISTORY_INDEXES:
+                if args.without_indexes:
+                    index.drop(conn, checkfirst=True)
+                else:
+                    index.create(conn, checkfirst=True)
+        conn.execute(text('ANALYZE'))
+
+    fields = parse_fields(args.fields)
+    db = app_module.SessionLocal()
+    history = history_query(db, user_id, args.type, fields)
+    total = count_history(db, user_id, args.type)
+    pages = max(1, total // args.per_page)
+    print(f"User with {total} scans{' of type ' + args.type if args.type else ''}, {args.per_page} per page, "
+          f"composite indexes {'dropped' if args.without_indexes else 'present'}, fields: {', '.join(fields) if fields else 'all'}")
+
+    print(f"{'page':>7} {'offset+count ms':>16} {'offset ms':>10} {'keyset ms':>10}")
+    for page in sorted({1, max(1, pages // 10), max(1, pages // 2), pages}):
+        # The cursor a client would hold after reading the previous pages (not timed)
+        cursor = encode_cursor(history.offset((page - 1) * args.per_page - 1).first()) if page > 1 else None
+
+        def old():
+            [scan.to_dict(fields=fields) for scan in history.limit(args.per_page).offset((page - 1) * args.per_page)]
+            history.count()
+
+        def new(**position):
+            scans, _ = history_page(db, user_id, args.per_page, args.type, fields=fields, **position)
+            [scan.to_dict(fields=fields) for scan in scans]
+            # Fresh objects every time, as in a request
+            db.expunge_all()
+
+        offset_ms = timed(lambda: new(page=page), args.repeat)
+        keyset_ms = timed(lambda: new(cursor=cursor), args.repeat)
+        print(f"{page:>7} {timed(old, args.repeat):>16.2f} {offset_ms:>10.2f} {keyset_ms:>10.2f}")
+
+    for mode in ('exact', 'stats'):
+        print(f"count={mode:<6} {timed(lambda: count_history(db, user_id, args.type, mode), args.repeat):>8.2f} ms")
+
+    if app_module.engine.dialect.name == 'sqlite':
+        from sqlalchemy import tuple_
+        query = history.filter(tuple_(Scan.timestamp, Scan.id) < tuple_(history.first().timestamp, history.first().id))
+        sql = str(query.limit(args.per_page).statement.compile(app_module.engine, compile_kwargs={'literal_binds': True}))
+        plan = db.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+        print("Keyset query plan:")
+        for row in plan:
+            print(f"  {row[-1]}")
+    db.close()
+
+if __name__ == '__main__':
+    main()
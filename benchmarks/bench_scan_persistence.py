@@ -0,0 +1,125 @@
+"""
+Statements, commits and time per saved scan: old ORM path vs single transaction
+
+    before  db.add + commit + refresh, then get-or-create the stats row (commit + refresh
+            on the first scan), read-modify-write the counters, commit, refresh
+    after   save_scans(): INSERT ... RETURNING id, timestamp plus the user_stats upsert,
+            one commit
+
+Statements are counted with SQLAlchemy cursor events. --rtt-ms adds a sleep per
+statement and commit to model a remote database (Neon is typically 1-20 ms away).
+Without DATABASE_URL an SQLite file is used (UUID columns stored as CHAR(32)).
+
+Usage:
+    python benchmarks/bench_scan_persistence.py [--scans 200] [--rtt-ms 0]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RESULT = {
+    'disease_name': 'Contact Dermatitis',
+    'confidence': 0.87,
+    'severity': 'medium',
+    'description': 'Red, itchy rash caused by contact with an irritant or allergen.',
+    'recommendations': ['Avoid the irritant', 'Apply a cool compress']
+}
+
+def save_before(db, user_id, disease_type):
+    """The persistence sequence the scan routes used before save_scans()"""
+    from datetime import datetime
+    from models import Scan, UserStats
+
+    scan = Scan(
+        user_id=user_id, disease_type=disease_type, image_url='https://storage.example.com/scan.jpg',
+        **RESULT
+    )
+    db.add(scan)
+    db.commit()
+    db.refresh(scan)
+
+    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    if not user_stats:
+        user_stats = UserStats(user_id=user_id)
+        db.add(user_stats)
+        db.commit()
+        db.refresh(user_stats)
+
+    user_stats.total_scans = (user_stats.total_scans or 0) + 1
+    user_stats.last_scan_date = datetime.utcnow()
+    if disease_type == 'skin':
+        user_stats.skin_scans = (user_stats.skin_scans or 0) + 1
+    db.commit()
+    db.refresh(user_stats)
+
+def save_after(db, user_id, disease_type):
+    from utils.scan_pipeline_utils import save_scans, scan_row
+
+    save_scans(db, user_id, disease_type, [scan_row(disease_type, RESULT, 'https://storage.example.com/scan.jpg')])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--scans', type=int, default=200)
+    parser.add_argument('--rtt-ms', type=float, default=0.0, help='Simulated round-trip time per statement')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    if not os.environ.get('DATABASE_URL'):
+        from sqlalchemy.dialects.postgresql import UUID
+        from sqlalchemy.ext.compiler import compiles
+
+        @compiles(UUID, 'sqlite')
+        def compile_uuid(element, compiler, **kw):
+            return 'CHAR(32)'
+
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['LOG_LEVEL'] = 'WARNING'
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import event
+    import app as app_module
+    app_module.init_db()
+    from models import User
+
+    counts = {'statements': 0, 'commits': 0}
+    rtt = args.rtt_ms / 1000
+
+    @event.listens_for(app_module.engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counts['statements'] += 1
+        if rtt:
+            time.sleep(rtt)
+
+    @event.listens_for(app_module.engine, 'commit')
+    def count_commit(conn):
+        counts['commits'] += 1
+        if rtt:
+            time.sleep(rtt)
+
+    print(f"{args.scans} scans per mode, simulated RTT {args.rtt_ms:g} ms")
+    print(f"{'mode':>7} {'statements/scan':>16} {'commits/scan':>13} {'ms/scan':>9}")
+    for mode, save in (('before', save_before), ('after', save_after)):
+        db = app_module.SessionLocal()
+        user = User(id=uuid.uuid4(), uid=f"bench-{mode}", name='Bench', email=f"{mode}@example.com")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+
+        counts.update(statements=0, commits=0)
+        start = time.perf_counter()
+        for _ in range(args.scans):
+            save(db, user_id, 'skin')
+        elapsed = time.perf_counter() - start
+        db.close()
+
+        print(f"{mode:>7} {counts['statements'] / args.scans:>16.2f} {counts['commits'] / args.scans:>13.2f} "
+              f"{elapsed / args.scans * 1000:>9.2f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+"""
+Startup cost: `import app` and a worker's boot up to its first response
+
+Each measurement runs in a fresh interpreter (python -X importtime), so
+nothing is already imported. Reports:
+
+    import app       total import time, and the slowest imports made by app.py
+    SDK modules      SDK packages imported by `import app` (should be none:
+                     Firebase Admin, Supabase, Groq and httpx load on first use)
+    worker boot      import + GET /api/health through the test client, then
+                     warm_services() as gunicorn's post_worker_init runs it
+
+test_startup.py runs the same checks against IMPORT_BUDGET_MS.
+
+Usage:
+    python benchmarks/bench_startup.py [--runs 5] [--top 10]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Imported lazily; none of these may appear in `import app`
+SDK_MODULES = ('firebase_admin', 'supabase', 'groq', 'httpx', 'google.auth', 'google.cloud', 'cryptography')
+
+BOOT_SCRIPT = """
+import time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+response = app.app.test_client().get('/api/health')
+assert response.status_code == 200, response.status_code
+served = time.perf_counter()
+from utils.service_utils import warm_services
+warm_services()
+warmed = time.perf_counter()
+print(imported - start, served - start, warmed - served)
+"""
+
+def startup_env():
+    env = dict(os.environ)
+    env.setdefault('DATABASE_URL', 'sqlite://')
+    env['FLASK_ENV'] = 'production'
+    env['LOG_LEVEL'] = 'CRITICAL'
+    return env
+
+def import_profile():
+    """
+    (total ms, [(depth, module, cumulative ms)]) for `import app` in a fresh
+    interpreter. Lists the modules `import app` loaded for the first time,
+    depth 1 being the ones app.py imports itself.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, env=startup_env(), capture_output=True, text=True, check=True
+    )
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        entries.append((depth, name.strip(), int(cumulative) / 1000))
+
+    # Children are printed before their parent: app's subtree ends at its own line
+    end = max(i for i, (depth, name, _) in enumerate(entries) if depth == 0 and name == 'app')
+    start = end
+    while start > 0 and entries[start - 1][0] > 0:
+        start -= 1
+    return entries[end][2], entries[start:end]
+
+def sdk_imports(modules):
+    """SDK modules in an import profile"""
+    return sorted({
+        name for _, name, _ in modules
+        if any(name == sdk or name.startswith(sdk + '.') for sdk in SDK_MODULES)
+    })
+
+def worker_boot():
+    """(import s, first response s, warm_services s) in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, '-c', BOOT_SCRIPT],
+        cwd=ROOT, env=startup_env(), capture_output=True, text=True, check=True
+    )
+    return tuple(float(value) for value in result.stdout.split()[-3:])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10)
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    totals = [total for total, _ in profiles]
+    modules = profiles[-1][1]
+    print(f"import app: median {statistics.median(totals):.0f} ms, min {min(totals):.0f} ms ({args.runs} runs)")
+
+    print("\nSlowest imports made by app.py (last run):")
+    direct = [(name, ms) for depth, name, ms in modules if depth == 1]
+    for name, ms in sorted(direct, key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<40} {ms:7.1f} ms")
+
+    sdks = sdk_imports(modules)
+    print(f"\nSDK modules imported by `import app`: {', '.join(sdks) if sdks else 'none'}")
+
+    boots = [worker_boot() for _ in range(args.runs)]
+    print(f"\n{'worker boot':<24} {'median ms':>10}")
+    print(f"{'import app':<24} {statistics.median(b[0] for b in boots) * 1000:>10.0f}")
+    print(f"{'first response':<24} {statistics.median(b[1] for b in boots) * 1000:>10.0f}")
+    print(f"{'warm_services()':<24} {statistics.median(b[2] for b in boots) * 1000:>10.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Peak RSS of the scan upload path as concurrent upload size grows
+
+Compares the old buffered path (whole upload held in memory and read with
+file.read()) with the spooled/streaming path. For every mode and size a fresh
+server process is started; its peak RSS growth is reported after N concurrent
+uploads. Supabase and Groq are replaced by local sinks, so no credentials are needed.
+
+Usage:
+    python benchmarks/bench_upload_memory.py [--concurrency 8] [--sizes 1,4,8,15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def serve(mode):
+    """Run the app in this process with stubbed upstreams and print the port"""
+    if not os.environ.get('DATABASE_URL'):
+        from sqlalchemy.dialects.postgresql import UUID
+        from sqlalchemy.ext.compiler import compiles
+
+        @compiles(UUID, 'sqlite')
+        def compile_uuid(element, compiler, **kw):
+            return 'CHAR(32)'
+
+        # A file, not sqlite://: each server thread would get its own empty in-memory database
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['ANALYSIS_CACHE_ENABLED'] = 'false'
+    os.environ['IMAGE_NORMALIZE_ENABLED'] = 'false'
+    if mode == 'buffered':
+        os.environ['UPLOAD_SPOOL_THRESHOLD'] = str(1024 ** 3)
+    sys.path.insert(0, ROOT)
+
+    import resource
+    from flask import jsonify
+    from werkzeug.serving import make_server
+    import app as app_module
+    app_module.init_db()
+    import utils.scan_pipeline_utils as pipeline
+    import utils.inference_utils as inference
+    import utils.upload_utils as upload_utils
+
+    if mode == 'buffered':
+        # Old behaviour: the whole body is read into memory before the upload
+        pipeline.open_upload_body = upload_utils.read_all
+
+    def storage_sink(body, user_id, scan_type, content_type, extension):
+        if hasattr(body, 'read'):
+            while body.read(64 * 1024):
+                pass
+        time.sleep(0.2)  # Keep uploads overlapping like a real network upload
+        return f"https://storage.invalid/{scan_type}/{user_id}.{extension}"
+
+    pipeline.upload_image_bytes = storage_sink
+    inference.GroqBackend.analyze = lambda self, image_url, disease_type: {'disease_name': 'Benchmark', 'confidence': 0.5}
+
+    @app_module.app.route('/__peak_rss')
+    def peak_rss():
+        return jsonify({'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss})
+
+    server = make_server('127.0.0.1', 0, app_module.app, threaded=True)
+    print(server.server_port, flush=True)
+    server.serve_forever()
+
+def run_case(mode, size_mb, concurrency):
+    import requests
+
+    # stderr goes to a file (a pipe nobody reads could fill up); shown if the server dies
+    stderr = tempfile.TemporaryFile(mode='w+')
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(__file__), '--serve', mode],
+        stdout=subprocess.PIPE, stderr=stderr, text=True
+    )
+    try:
+        port = None
+        while port is None:
+            line = proc.stdout.readline()
+            if not line:
+                proc.wait()
+                stderr.seek(0)
+                raise RuntimeError(f"benchmark server failed to start:\n{stderr.read()[-4000:]}")
+            if line.strip().isdigit():
+                port = int(line.strip())
+        base_url = f"http://127.0.0.1:{port}"
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as tmp:
+            tmp.write(b'\xff\xd8\xff')
+            tmp.write(os.urandom(size_mb * 1024 * 1024 - 3))
+            image_path = tmp.name
+
+        baseline = requests.get(f"{base_url}/__peak_rss").json()['peak_rss_kb']
+        errors = []
+
+        def upload():
+            with open(image_path, 'rb') as f:
+                response = requests.post(f"{base_url}/api/scan/skin", files={'image': ('bench.jpg', f, 'image/jpeg')})
+            if response.status_code != 200:
+                errors.append(response.status_code)
+
+        threads = [threading.Thread(target=upload) for _ in range(concurrency)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+
+        peak = requests.get(f"{base_url}/__peak_rss").json()['peak_rss_kb']
+        os.unlink(image_path)
+        return (peak - baseline) / 1024, elapsed, errors
+    finally:
+        proc.terminate()
+        proc.wait()
+        stderr.close()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--sizes', default='1,4,8,15', help='Upload sizes in MB')
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    print(f"Concurrent uploads: {args.concurrency}")
+    print(f"{'mode':<10} {'size MB':>8} {'peak RSS growth MB':>20} {'wall s':>8}")
+    for mode in ('buffered', 'streaming'):
+        for size_mb in sizes:
+            growth_mb, elapsed, errors = run_case(mode, size_mb, args.concurrency)
+            note = f"  ({len(errors)} failed)" if errors else ''
+            print(f"{mode:<10} {size_mb:>8} {growth_mb:>20.1f} {elapsed:>8.2f}{note}")
+
+if __name__ == '__main__':
+    main()
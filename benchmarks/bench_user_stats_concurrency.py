@@ -0,0 +1,148 @@
+"""
+Lost updates and write statements for concurrent user_stats increments
+
+Several threads record scans for the same user at once:
+
+    before     read-modify-write through the ORM (SELECT, setattr, UPDATE, commit,
+               refresh), as update_scan_stats() did before the upsert
+    upsert     update_scan_stats(): one INSERT ... ON CONFLICT DO UPDATE per scan
+    coalesced  USER_STATS_COALESCE: increments buffered per process and written
+               by StatsBuffer as bulk upserts
+
+The final total_scans is compared with the number of increments that did not
+raise; the difference is updates lost silently. The upsert modes must not lose
+any (the script exits with status 1 if they do). On SQLite, writers that wait
+too long for the database lock fail and show up as errors instead. Without
+DATABASE_URL an SQLite file is used (UUID columns stored as CHAR(32)).
+
+Usage:
+    python benchmarks/bench_user_stats_concurrency.py [--threads 4] [--increments 100] [--flush-ms 50]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def increment_before(db, user_id):
+    """The read-modify-write sequence update_scan_stats() used before"""
+    from datetime import datetime
+    from models import UserStats
+
+    user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
+    setattr(user_stats, 'total_scans', (getattr(user_stats, 'total_scans') or 0) + 1)
+    setattr(user_stats, 'skin_scans', (getattr(user_stats, 'skin_scans') or 0) + 1)
+    setattr(user_stats, 'last_scan_date', datetime.utcnow())
+    db.commit()
+    db.refresh(user_stats)
+
+def increment_upsert(db, user_id):
+    from utils.user_stats_utils import update_scan_stats
+
+    if not update_scan_stats(db, user_id, 'skin'):
+        raise RuntimeError('update_scan_stats failed')
+
+def run(mode, app_module, user_id, threads, increments, buffer=None):
+    errors = []
+
+    def worker():
+        db = app_module.SessionLocal()
+        try:
+            for _ in range(increments):
+                try:
+                    if mode == 'before':
+                        increment_before(db, user_id)
+                    elif mode == 'upsert':
+                        increment_upsert(db, user_id)
+                    else:
+                        from utils.user_stats_utils import scan_increments
+                        buffer.add(scan_increments(user_id, 'skin'))
+                except Exception as e:
+                    db.rollback()
+                    errors.append(e)
+        finally:
+            db.close()
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+    if buffer is not None:
+        buffer.flush()
+    return time.perf_counter() - start, errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--increments', type=int, default=100, help='Increments per thread')
+    parser.add_argument('--flush-ms', type=float, default=50, help='Coalesced mode flush interval')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    if not os.environ.get('DATABASE_URL'):
+        from sqlalchemy.dialects.postgresql import UUID
+        from sqlalchemy.ext.compiler import compiles
+
+        @compiles(UUID, 'sqlite')
+        def compile_uuid(element, compiler, **kw):
+            return 'CHAR(32)'
+
+        os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(directory, 'bench.db')}"
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['LOG_LEVEL'] = 'CRITICAL'
+    sys.path.insert(0, ROOT)
+
+    from sqlalchemy import event
+    import app as app_module
+    app_module.init_db()
+    from config import Config
+    from models import User, UserStats
+    from utils.user_stats_utils import StatsBuffer, get_or_create_user_stats
+
+    counts = {'statements': 0}
+
+    @event.listens_for(app_module.engine, 'before_cursor_execute')
+    def count_statement(conn, cursor, statement, parameters, context, executemany):
+        counts['statements'] += 1
+
+    expected = args.threads * args.increments
+    print(f"{args.threads} threads x {args.increments} increments for one user")
+    print(f"{'mode':>9} {'expected':>9} {'stored':>7} {'lost':>6} {'errors':>7} {'statements':>11} {'seconds':>8}")
+
+    lost_with_upserts = False
+    for mode in ('before', 'upsert', 'coalesced'):
+        db = app_module.SessionLocal()
+        user = User(id=uuid.uuid4(), uid=f"bench-{mode}", name='Bench', email=f"{mode}@example.com")
+        db.add(user)
+        db.commit()
+        user_id = user.id
+        get_or_create_user_stats(db, user_id)
+        db.close()
+
+        buffer = None
+        if mode == 'coalesced':
+            buffer = StatsBuffer(args.flush_ms, Config.USER_STATS_FLUSH_MAX_EVENTS, app_module.SessionLocal)
+
+        counts['statements'] = 0
+        elapsed, errors = run(mode, app_module, user_id, args.threads, args.increments, buffer)
+        statements = counts['statements']
+
+        db = app_module.SessionLocal()
+        stored = db.query(UserStats.total_scans).filter(UserStats.user_id == user_id).scalar()
+        db.close()
+
+        lost = expected - len(errors) - stored
+        if mode != 'before' and lost:
+            lost_with_upserts = True
+        print(f"{mode:>9} {expected:>9} {stored:>7} {lost:>6} {len(errors):>7} {statements:>11} {elapsed:>8.2f}")
+
+    sys.exit(1 if lost_with_upserts else 0)
+
+if __name__ == '__main__':
+    main()
@@ -13,6 +13,18 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = True if FLASK_ENV == 'development' else False
+    DATABASE_READ_URL = os.getenv('DATABASE_READ_URL')  # Optional read replica for @read_replica handlers
+    
+    # Database Engine Configuration (see utils/database_utils.py)
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))  # Connections kept open per worker process
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '10'))  # Extra connections opened under load
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', '10'))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', '240'))  # Replace connections older than this (Neon closes idle ones after 5 minutes)
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'false').lower() == 'true'  # Test every checkout with a round trip
+    DB_CONNECT_TIMEOUT = int(os.getenv('DB_CONNECT_TIMEOUT', '10'))  # Seconds
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '15000'))  # 0 disables
+    DB_PGBOUNCER = os.getenv('DB_PGBOUNCER', 'false').lower() == 'true'  # Transaction-pooling PgBouncer in front of Postgres
+    DB_READ_YOUR_WRITES_SECONDS = int(os.getenv('DB_READ_YOUR_WRITES_SECONDS', '10'))  # Read from the primary this long after a user's write
     
     # Supabase Configuration
     SUPABASE_URL = os.getenv('SUPABASE_URL')
@@ -25,7 +37,132 @@ class Config:
     GROQ_API_KEY = os.getenv('GROQ_API_KEY')
     GEMINI_API_KEY = os.getenv('GEMINI_API_KEY')
     SERPAPI_KEY = os.getenv('SERPAPI_KEY')
+    GEMINI_BASE_URL = os.getenv('GEMINI_BASE_URL', 'https://generativelanguage.googleapis.com')  # Override for a proxy or local stub
+    SERPAPI_BASE_URL = os.getenv('SERPAPI_BASE_URL', 'https://serpapi.com')
     
+    # Outbound HTTP Configuration (shared pools in utils/http_utils.py)
+    HTTP_POOL_CONNECTIONS = int(os.getenv('HTTP_POOL_CONNECTIONS', '4'))  # Hosts kept per upstream pool
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '20'))  # Keep-alive connections per host
+    HTTP_KEEPALIVE_EXPIRY = float(os.getenv('HTTP_KEEPALIVE_EXPIRY', '60'))  # Seconds an idle connection is kept
+    HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+    HTTP_DEFAULT_TIMEOUT = float(os.getenv('HTTP_DEFAULT_TIMEOUT', '30'))  # Read timeout, seconds
+    HTTP_MAX_RETRIES = int(os.getenv('HTTP_MAX_RETRIES', '3'))  # Idempotent calls only
+    HTTP_BACKOFF_FACTOR = float(os.getenv('HTTP_BACKOFF_FACTOR', '0.3'))
+    HTTP_BACKOFF_JITTER = float(os.getenv('HTTP_BACKOFF_JITTER', '0.3'))
+    GROQ_TIMEOUT = float(os.getenv('GROQ_TIMEOUT', '60'))
+    GROQ_MAX_RETRIES = int(os.getenv('GROQ_MAX_RETRIES', '2'))  # Groq SDK retries with jittered backoff
+    GROQ_DEADLINE = float(os.getenv('GROQ_DEADLINE', '90'))  # All attempts of one analysis together; keep below GUNICORN_TIMEOUT
+    GEMINI_TIMEOUT = float(os.getenv('GEMINI_TIMEOUT', '30'))
+    SERPAPI_TIMEOUT = float(os.getenv('SERPAPI_TIMEOUT', '15'))
+    SUPABASE_TIMEOUT = float(os.getenv('SUPABASE_TIMEOUT', '30'))
+    FIREBASE_TIMEOUT = float(os.getenv('FIREBASE_TIMEOUT', '10'))  # Signing key downloads
+
+    # Logging Configuration (see utils/logging_utils.py)
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_LEVELS = os.getenv('LOG_LEVELS', '')  # Per-module overrides, e.g. "utils.groq_utils=DEBUG,routes=WARNING"
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')  # 'text' or 'json' (one object per line)
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '10000'))  # Records buffered for the writer thread; extra records are dropped
+    LOG_PAYLOAD_MAX_CHARS = int(os.getenv('LOG_PAYLOAD_MAX_CHARS', '2000'))  # Logged payloads are truncated to this
+    LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '0.01'))  # Share of payload logs kept
+
+    # Metrics Configuration (GET /api/metrics, see utils/metrics_utils.py)
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+
+    # Response Encoding Configuration (see utils/json_utils.py and utils/compression_utils.py)
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'auto')  # 'auto' (orjson when installed), 'orjson' or 'stdlib'
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_BYTES = int(os.getenv('COMPRESSION_MIN_BYTES', '1024'))  # Smaller responses are sent as is
+    COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', '6'))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', '4'))  # 0-11; higher is smaller but much slower
+
+    # Circuit Breaker Configuration (per model endpoint, see utils/circuit_breaker_utils.py)
+    CIRCUIT_BREAKER_ENABLED = os.getenv('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+    CIRCUIT_BREAKER_WINDOW = float(os.getenv('CIRCUIT_BREAKER_WINDOW', '60'))  # Rolling window, seconds
+    CIRCUIT_BREAKER_MIN_CALLS = int(os.getenv('CIRCUIT_BREAKER_MIN_CALLS', '5'))  # Calls in window before it can trip
+    CIRCUIT_BREAKER_FAILURE_RATE = float(os.getenv('CIRCUIT_BREAKER_FAILURE_RATE', '0.5'))
+    CIRCUIT_BREAKER_SLOW_CALL_MS = float(os.getenv('CIRCUIT_BREAKER_SLOW_CALL_MS', '20000'))
+    CIRCUIT_BREAKER_SLOW_CALL_RATE = float(os.getenv('CIRCUIT_BREAKER_SLOW_CALL_RATE', '0.8'))
+    CIRCUIT_BREAKER_OPEN_SECONDS = float(os.getenv('CIRCUIT_BREAKER_OPEN_SECONDS', '30'))  # Fast-fail period before probing
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS = int(os.getenv('CIRCUIT_BREAKER_HALF_OPEN_CALLS', '1'))  # Concurrent probe calls
+    SCAN_QUEUE_ON_CIRCUIT_OPEN = os.getenv('SCAN_QUEUE_ON_CIRCUIT_OPEN', 'false').lower() == 'true'  # Queue scans instead of fallback
+
+    # Analysis Backend Configuration (see utils/inference_utils.py)
+    ANALYSIS_BACKEND_SKIN = os.getenv('ANALYSIS_BACKEND_SKIN', 'groq')  # 'groq' or 'local'
+    ANALYSIS_BACKEND_EYE = os.getenv('ANALYSIS_BACKEND_EYE', 'groq')
+    LOCAL_MODEL_SKIN_PATH = os.getenv('LOCAL_MODEL_SKIN_PATH')  # .onnx or .npz, labels in a .json next to it
+    LOCAL_MODEL_EYE_PATH = os.getenv('LOCAL_MODEL_EYE_PATH')
+    LOCAL_BATCH_SIZE = int(os.getenv('LOCAL_BATCH_SIZE', '16'))  # Max images per forward pass
+    LOCAL_BATCH_WAIT_MS = float(os.getenv('LOCAL_BATCH_WAIT_MS', '5'))  # Wait for more requests to fill a batch
+    LOCAL_INFERENCE_THREADS = int(os.getenv('LOCAL_INFERENCE_THREADS', '0'))  # ONNX Runtime intra-op threads, 0 = default
+
     # Upload Configuration
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
+    UPLOAD_SPOOL_THRESHOLD = int(os.getenv('UPLOAD_SPOOL_THRESHOLD', str(512 * 1024)))  # Uploads above this go to a temp file
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(64 * 1024)))  # Read/hash/stream chunk size
+    
+    # Firebase Token Verification (see utils/firebase_token_utils.py)
+    FIREBASE_TOKEN_CACHE_ENABLED = os.getenv('FIREBASE_TOKEN_CACHE_ENABLED', 'true').lower() == 'true'
+    FIREBASE_TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('FIREBASE_TOKEN_CACHE_MAX_ENTRIES', '10000'))
+    FIREBASE_TOKEN_CACHE_MAX_TTL = int(os.getenv('FIREBASE_TOKEN_CACHE_MAX_TTL', '3600'))  # Entries never outlive the token's exp
+    FIREBASE_LOCAL_VERIFY = os.getenv('FIREBASE_LOCAL_VERIFY', 'true').lower() == 'true'  # Verify with in-memory signing keys
+    FIREBASE_KEYS_REFRESH_SECONDS = int(os.getenv('FIREBASE_KEYS_REFRESH_SECONDS', '3600'))  # When the response has no max-age
+    FIREBASE_KEYS_RETRY_SECONDS = int(os.getenv('FIREBASE_KEYS_RETRY_SECONDS', '30'))  # After a failed download
+    FIREBASE_CLOCK_SKEW_SECONDS = int(os.getenv('FIREBASE_CLOCK_SKEW_SECONDS', '0'))
+
+    # Identity Cache Configuration (Firebase UID -> user, see utils/identity_utils.py)
+    IDENTITY_CACHE_ENABLED = os.getenv('IDENTITY_CACHE_ENABLED', 'true').lower() == 'true'
+    IDENTITY_CACHE_MAX_ENTRIES = int(os.getenv('IDENTITY_CACHE_MAX_ENTRIES', '10000'))
+    IDENTITY_CACHE_TTL = int(os.getenv('IDENTITY_CACHE_TTL', '300'))  # Seconds; bounds staleness across workers
+    
+    # Analysis Cache Configuration
+    ANALYSIS_CACHE_ENABLED = os.getenv('ANALYSIS_CACHE_ENABLED', 'true').lower() == 'true'
+    ANALYSIS_CACHE_MAX_ENTRIES = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', '1024'))
+    ANALYSIS_CACHE_TTL = int(os.getenv('ANALYSIS_CACHE_TTL', '86400'))  # In-process tier, seconds
+    ANALYSIS_CACHE_DB_TTL = int(os.getenv('ANALYSIS_CACHE_DB_TTL', str(30 * 86400)))  # Postgres tier, seconds
+    
+    # Image Normalization Configuration
+    IMAGE_NORMALIZE_ENABLED = os.getenv('IMAGE_NORMALIZE_ENABLED', 'true').lower() == 'true'
+    IMAGE_MAX_EDGE = int(os.getenv('IMAGE_MAX_EDGE', '1536'))  # Longest edge in pixels after downscaling
+    IMAGE_OUTPUT_FORMAT = os.getenv('IMAGE_OUTPUT_FORMAT', 'JPEG')  # 'JPEG' or 'WEBP'
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', '85'))
+
+    # Scan Image Rendition Configuration (see utils/rendition_utils.py)
+    RENDITIONS_ENABLED = os.getenv('RENDITIONS_ENABLED', 'true').lower() == 'true'
+    RENDITION_THUMBNAIL_EDGE = int(os.getenv('RENDITION_THUMBNAIL_EDGE', '256'))  # Longest edge in pixels
+    RENDITION_MEDIUM_EDGE = int(os.getenv('RENDITION_MEDIUM_EDGE', '768'))
+    RENDITION_QUALITY = int(os.getenv('RENDITION_QUALITY', '80'))
+    RENDITION_WORKERS = int(os.getenv('RENDITION_WORKERS', '2'))  # Background threads generating renditions
+    RENDITION_BACKFILL_BATCH = int(os.getenv('RENDITION_BACKFILL_BATCH', '50'))  # Scans per backfill batch
+    
+    # Scan History Configuration (see utils/scan_history_utils.py)
+    SCAN_HISTORY_MAX_PER_PAGE = int(os.getenv('SCAN_HISTORY_MAX_PER_PAGE', '100'))
+    SCAN_HISTORY_COUNT = os.getenv('SCAN_HISTORY_COUNT', 'exact')  # Default total: 'exact', 'stats' (user_stats counters) or 'none'
+
+    # Conditional GET Configuration (see utils/etag_utils.py)
+    CONDITIONAL_GET_ENABLED = os.getenv('CONDITIONAL_GET_ENABLED', 'true').lower() == 'true'  # ETag/304 for history, stats and appointment lists
+
+    # User Stats Configuration (see utils/user_stats_utils.py)
+    USER_STATS_COALESCE = os.getenv('USER_STATS_COALESCE', 'false').lower() == 'true'  # Buffer counter increments per worker
+    USER_STATS_FLUSH_INTERVAL_MS = float(os.getenv('USER_STATS_FLUSH_INTERVAL_MS', '500'))  # Max time increments stay buffered
+    USER_STATS_FLUSH_MAX_EVENTS = int(os.getenv('USER_STATS_FLUSH_MAX_EVENTS', '200'))  # Flush early once this many are buffered
+
+    # User Stats Reconciliation (reconcile_user_stats.py, see utils/stats_reconcile_utils.py)
+    STATS_RECONCILE_BATCH_SIZE = int(os.getenv('STATS_RECONCILE_BATCH_SIZE', '500'))  # Users recomputed per transaction
+    STATS_RECONCILE_LAG_SECONDS = int(os.getenv('STATS_RECONCILE_LAG_SECONDS', '300'))  # Watermark overlap for late commits
+    STATS_RECONCILE_LOCK_TIMEOUT_MS = int(os.getenv('STATS_RECONCILE_LOCK_TIMEOUT_MS', '2000'))  # Skip a batch rather than wait on hot rows
+    STATS_RECONCILE_INTERVAL = int(os.getenv('STATS_RECONCILE_INTERVAL', '900'))  # Seconds between runs with --loop
+
+    # Scan Pipeline Configuration
+    SCAN_PIPELINE_MODE = os.getenv('SCAN_PIPELINE_MODE', 'serial')  # 'serial' or 'concurrent'
+    SCAN_UPLOAD_WORKERS = int(os.getenv('SCAN_UPLOAD_WORKERS', '8'))  # Bounded pool for background Supabase uploads
+    SCAN_BATCH_MAX_IMAGES = int(os.getenv('SCAN_BATCH_MAX_IMAGES', '10'))
+    SCAN_BATCH_WORKERS = int(os.getenv('SCAN_BATCH_WORKERS', '4'))  # Concurrent analyses per batch request
+    SCAN_PIPELINE_DISABLED_STAGES = [name.strip() for name in os.getenv('SCAN_PIPELINE_DISABLED_STAGES', '').split(',') if name.strip()]  # e.g. 'cache_lookup,cache_store'
+    
+    # Async Scan Job Configuration
+    SCAN_JOB_WORKERS = int(os.getenv('SCAN_JOB_WORKERS', '4'))  # Threads per scan_worker.py process
+    SCAN_JOB_POLL_INTERVAL = float(os.getenv('SCAN_JOB_POLL_INTERVAL', '1.0'))  # Seconds between empty-queue polls
+    SCAN_JOB_MAX_ATTEMPTS = int(os.getenv('SCAN_JOB_MAX_ATTEMPTS', '3'))
+    SCAN_JOB_STALE_AFTER = int(os.getenv('SCAN_JOB_STALE_AFTER', '300'))  # Reclaim 'running' jobs older than this, seconds
+    SCAN_JOB_MAX_WAIT = int(os.getenv('SCAN_JOB_MAX_WAIT', '30'))  # Upper bound for long-poll/SSE waits, seconds
@@ -0,0 +1,40 @@
+"""
+Database engines and sessions
+
+Handlers, workers and scripts import `db` (the request-scoped session) and
+`SessionLocal` from here, so they do not build the Flask app. Creating the
+engines does not connect. Tables are created by `flask --app app init-db`
+(init_db()), not on import.
+"""
+from sqlalchemy.orm import sessionmaker, scoped_session
+from config import Config
+from models import Base
+from utils.database_utils import create_database_engine, RoutingSession
+from utils.metrics_utils import instrument_engine
+import logging
+
+logger = logging.getLogger(__name__)
+
+if not Config.SQLALCHEMY_DATABASE_URI:
+    raise ValueError("DATABASE_URL environment variable is required")
+
+engine = create_database_engine(Config.SQLALCHEMY_DATABASE_URI)
+# Optional read replica for @read_replica handlers
+read_engine = create_database_engine(Config.DATABASE_READ_URL) if Config.DATABASE_READ_URL else None
+# SQL echo goes through the queued log handler rather than SQLAlchemy's own stdout handler
+if Config.SQLALCHEMY_ECHO and logging.getLogger('sqlalchemy.engine').level == logging.NOTSET:
+    logging.getLogger('sqlalchemy.engine').setLevel(logging.INFO)
+instrument_engine(engine)
+if read_engine is not None:
+    instrument_engine(read_engine)
+
+# Create session factory
+SessionLocal = sessionmaker(
+    autocommit=False, autoflush=False, bind=engine, class_=RoutingSession, info={'replica_engine': read_engine}
+)
+db = scoped_session(SessionLocal)
+
+def init_db():
+    """Create missing tables (existing ones are left as they are; see the migrate_*.py scripts)"""
+    Base.metadata.create_all(bind=engine)
+    logger.info("Database tables created successfully")
@@ -0,0 +1,29 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py app:app
+
+The master imports nothing but this file; each worker imports the app (cheap,
+see benchmarks/bench_startup.py) and then sets up the SDK clients before it
+accepts connections.
+
+GUNICORN_WORKER_CLASS=gevent is the async serving mode (utils/gevent_utils.py):
+each worker keeps up to GUNICORN_WORKER_CONNECTIONS requests in flight while
+they wait on upstream APIs. The app must not be preloaded in that mode, since
+the worker monkey-patches before importing it.
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+workers = int(os.getenv('WEB_CONCURRENCY', '4'))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'sync')  # sync, gthread or gevent
+threads = int(os.getenv('GUNICORN_THREADS', '1'))  # Requests per worker with gthread
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', '1000'))  # Requests per worker with gevent
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))  # Scans wait on the Groq vision call
+
+def post_worker_init(worker):
+    # Runs in the worker after it has loaded the app (post_fork runs before)
+    from utils.gevent_utils import patch_psycopg2
+    from utils.service_utils import warm_services
+
+    # Before the first database connection
+    patch_psycopg2()
+    warm_services()
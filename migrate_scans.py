@@ -1,11 +1,11 @@
 """
 Migration script to add new columns to scans table
 """
-from app import engine
+from database import engine
 from sqlalchemy import text
 
 def migrate():
-    """Add severity, description, and recommendations columns to scans table"""
+    """Add severity, description, recommendations, image_stats and rendition URL columns and history indexes to scans table, and image_url to scan_jobs"""
     try:
         with engine.connect() as conn:
             # Add severity column
@@ -26,11 +26,47 @@ def migrate():
                 ADD COLUMN IF NOT EXISTS recommendations JSON
             """))
             
+            # Add image_stats column (JSON type, filled by image normalization)
+            conn.execute(text("""
+                ALTER TABLE scans 
+                ADD COLUMN IF NOT EXISTS image_stats JSON
+            """))
+            
+            # Add rendition URL columns (filled in the background, see backfill_renditions.py)
+            conn.execute(text("""
+                ALTER TABLE scans 
+                ADD COLUMN IF NOT EXISTS thumbnail_url VARCHAR(500)
+            """))
+            conn.execute(text("""
+                ALTER TABLE scans 
+                ADD COLUMN IF NOT EXISTS medium_url VARCHAR(500)
+            """))
+            
+            # Composite indexes for scan history pages (user, optional type, newest first)
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_scans_user_id_timestamp
+                ON scans (user_id, timestamp DESC, id DESC)
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_scans_user_id_disease_type_timestamp
+                ON scans (user_id, disease_type, timestamp DESC, id DESC)
+            """))
+            
+            # Image stored by an earlier attempt of an async scan job, reused on retries
+            conn.execute(text("""
+                ALTER TABLE scan_jobs 
+                ADD COLUMN IF NOT EXISTS image_url VARCHAR(500)
+            """))
+            
             conn.commit()
             print("✓ Migration completed successfully!")
             print("  - Added severity column (VARCHAR(50))")
             print("  - Added description column (TEXT)")
             print("  - Added recommendations column (JSON)")
+            print("  - Added image_stats column (JSON)")
+            print("  - Added thumbnail_url and medium_url columns (VARCHAR(500))")
+            print("  - Added scan history indexes (user_id, [disease_type,] timestamp DESC, id DESC)")
+            print("  - Added scan_jobs.image_url column (VARCHAR(500))")
             
     except Exception as e:
         print(f"✗ Migration failed: {e}")
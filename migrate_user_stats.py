@@ -6,7 +6,7 @@ from config import Config
 from sqlalchemy import create_engine, text
 
 def migrate():
-    """Create user_stats table"""
+    """Create user_stats and stats_watermarks tables"""
     try:
         # Create engine directly to avoid circular imports
         database_url = Config.SQLALCHEMY_DATABASE_URI or os.getenv('DATABASE_URL')
@@ -30,14 +30,38 @@ def migrate():
                 )
             """))
             
+            # Per-user change counter behind the ETags of the dashboard reads
+            conn.execute(text("""
+                ALTER TABLE user_stats ADD COLUMN IF NOT EXISTS data_version BIGINT DEFAULT 0
+            """))
+            
             # Create index on user_id for faster lookups
             conn.execute(text("""
                 CREATE INDEX IF NOT EXISTS idx_user_stats_user_id ON user_stats(user_id)
             """))
             
+            # Watermark table for reconcile_user_stats.py
+            conn.execute(text("""
+                CREATE TABLE IF NOT EXISTS stats_watermarks (
+                    name VARCHAR(100) PRIMARY KEY,
+                    watermark TIMESTAMP NOT NULL,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """))
+            
+            # Reconciliation finds users with new scans/appointments by creation time
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_scans_timestamp ON scans(timestamp)
+            """))
+            conn.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_appointments_created_at ON appointments(created_at)
+            """))
+            
             conn.commit()
             print("✓ User stats table migration completed successfully!")
             print("  - Created user_stats table")
+            print("  - Added user_stats.data_version")
+            print("  - Created stats_watermarks table")
             print("  - Added indexes for performance")
             
     except Exception as e:
@@ -3,5 +3,8 @@ from models.user_model import User, Base
 from models.scan_model import Scan
 from models.appointment_model import Appointment
 from models.user_stats_model import UserStats
+from models.analysis_cache_model import AnalysisCache
+from models.scan_job_model import ScanJob
+from models.stats_watermark_model import StatsWatermark
 
-__all__ = ['User', 'Scan', 'Appointment', 'UserStats', 'Base']
+__all__ = ['User', 'Scan', 'Appointment', 'UserStats', 'AnalysisCache', 'ScanJob', 'StatsWatermark', 'Base']
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.dialects.postgresql import JSON
+from datetime import datetime
+from models.user_model import Base
+
+class AnalysisCache(Base):
+    __tablename__ = 'analysis_cache'
+    
+    cache_key = Column(String(64), primary_key=True)  # SHA-256 of image hash + disease_type + prompt version + model
+    image_sha256 = Column(String(64), nullable=False, index=True)
+    disease_type = Column(String(50), nullable=False)  # 'skin' or 'eye'
+    prompt_version = Column(String(50), nullable=False)
+    model_name = Column(String(255), nullable=False)
+    result = Column(JSON, nullable=False)  # Parsed analysis returned by the model
+    image_url = Column(String(500), nullable=False)  # Supabase URL of the first upload
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    
+    def to_dict(self):
+        return {
+            'cache_key': self.cache_key,
+            'image_sha256': self.image_sha256,
+            'disease_type': self.disease_type,
+            'prompt_version': self.prompt_version,
+            'model_name': self.model_name,
+            'result': self.result,
+            'image_url': self.image_url,
+            'created_at': self.created_at.isoformat() if self.created_at is not None else None
+        }
@@ -15,9 +15,22 @@ class Appointment(Base):
     date = Column(Date, nullable=False, index=True)
     time = Column(Time, nullable=False)
     status = Column(String(50), default='Upcoming')  # Upcoming, Completed, Cancelled
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)  # Stats reconciliation finds new bookings by this
     
-    def to_dict(self):
+    def to_dict(self, native=False):
+        """native: keep UUIDs, dates and times for a JSON provider that encodes them (utils/json_utils.py)"""
+        if native:
+            return {
+                'id': self.id,
+                'user_id': self.user_id,
+                'doctor_name': self.doctor_name,
+                'specialty': self.specialty,
+                'clinic_name': self.clinic_name,
+                'date': self.date,
+                'time': self.time,
+                'status': self.status,
+                'created_at': self.created_at
+            }
         return {
             'id': str(self.id),
             'user_id': str(self.user_id),
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Text, LargeBinary, Index
+from sqlalchemy.dialects.postgresql import UUID, JSON
+from datetime import datetime
+import uuid
+from models.user_model import Base
+
+class ScanJob(Base):
+    __tablename__ = 'scan_jobs'
+    __table_args__ = (
+        # Workers claim the oldest queued job first
+        Index('idx_scan_jobs_status_created_at', 'status', 'created_at'),
+    )
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    user_id = Column(UUID(as_uuid=True), ForeignKey('users.id'), nullable=True, index=True)  # NULL for guest scans
+    disease_type = Column(String(50), nullable=False)  # 'skin' or 'eye'
+    status = Column(String(50), nullable=False, default='queued')  # queued, running, completed, failed
+    image_data = Column(LargeBinary)  # Uploaded bytes, cleared once the job finishes
+    content_type = Column(String(100))
+    filename = Column(String(255))
+    image_url = Column(String(500))  # Image stored by an earlier attempt, reused when the job is retried
+    result = Column(JSON)  # Same payload the synchronous scan endpoints return
+    error = Column(Text)
+    attempts = Column(Integer, default=0)
+    worker_id = Column(String(255))
+    created_at = Column(DateTime, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    
+    def to_dict(self):
+        return {
+            'job_id': str(self.id),
+            'user_id': str(self.user_id) if self.user_id is not None else None,
+            'disease_type': self.disease_type,
+            'status': self.status,
+            'result': self.result,
+            'error': self.error,
+            'attempts': self.attempts,
+            'created_at': self.created_at.isoformat() if self.created_at is not None else None,
+            'started_at': self.started_at.isoformat() if self.started_at is not None else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at is not None else None
+        }
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, Float, DateTime, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import UUID, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -17,18 +17,64 @@ class Scan(Base):
     description = Column(Text)  # Disease description
     recommendations = Column(JSON)  # List of recommendations
     image_url = Column(String(500), nullable=False)
+    thumbnail_url = Column(String(500))  # Renditions, generated in the background after the scan is saved
+    medium_url = Column(String(500))
+    image_stats = Column(JSON)  # Before/after byte counts and pixel dimensions from normalization
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     
-    def to_dict(self):
+    # Keys of to_dict(), in order
+    FIELDS = (
+        'id', 'user_id', 'disease_type', 'disease_name', 'confidence', 'severity', 'description',
+        'recommendations', 'image_url', 'thumbnail_url', 'medium_url', 'image_stats', 'timestamp'
+    )
+    
+    def to_dict(self, rendition=None, native=False, fields=None):
+        """
+        rendition: 'thumbnail' or 'medium' returns that rendition as image_url (the original until it exists)
+        native: keep UUIDs and datetimes for a JSON provider that encodes them (utils/json_utils.py)
+        fields: only these keys (a subset of FIELDS); columns behind other keys are never touched,
+        so they can stay deferred
+        """
+        if fields is not None:
+            return {name: self._field(name, rendition, native) for name in fields}
+        
+        image_url = self._image_url(rendition)
         return {
-            'id': str(self.id),
-            'user_id': str(self.user_id),
+            'id': self.id if native else str(self.id),
+            'user_id': self.user_id if native else str(self.user_id),
             'disease_type': self.disease_type,
             'disease_name': self.disease_name,
             'confidence': self.confidence,
             'severity': self.severity,
             'description': self.description,
             'recommendations': self.recommendations,
-            'image_url': self.image_url,
-            'timestamp': self.timestamp.isoformat() if self.timestamp is not None else None
+            'image_url': image_url,
+            'thumbnail_url': self.thumbnail_url,
+            'medium_url': self.medium_url,
+            'image_stats': self.image_stats,
+            'timestamp': self.timestamp if native or self.timestamp is None else self.timestamp.isoformat()
         }
+    
+    def _image_url(self, rendition):
+        if rendition == 'thumbnail':
+            return self.thumbnail_url or self.image_url
+        if rendition == 'medium':
+            return self.medium_url or self.image_url
+        return self.image_url
+    
+    def _field(self, name, rendition, native):
+        if name == 'image_url':
+            return self._image_url(rendition)
+        value = getattr(self, name)
+        if native or value is None:
+            return value
+        if name in ('id', 'user_id'):
+            return str(value)
+        if name == 'timestamp':
+            return value.isoformat()
+        return value
+
+# Scan history: the user's scans (optionally of one type) newest first, read as one index
+# range scan; the trailing id matches the (timestamp, id) keyset cursor
+Index('idx_scans_user_id_timestamp', Scan.user_id, Scan.timestamp.desc(), Scan.id.desc())
+Index('idx_scans_user_id_disease_type_timestamp', Scan.user_id, Scan.disease_type, Scan.timestamp.desc(), Scan.id.desc())
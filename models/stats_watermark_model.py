@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, DateTime
+from datetime import datetime
+from models.user_model import Base
+
+class StatsWatermark(Base):
+    __tablename__ = 'stats_watermarks'
+    
+    name = Column(String(100), primary_key=True)  # Job name, e.g. 'user_stats'
+    watermark = Column(DateTime, nullable=False)  # Rows created at or after this are not yet reconciled
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'watermark': self.watermark.isoformat() if self.watermark is not None else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at is not None else None
+        }
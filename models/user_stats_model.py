@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, ForeignKey
 from sqlalchemy.dialects.postgresql import UUID
 from datetime import datetime
 import uuid
@@ -16,6 +16,7 @@ class UserStats(Base):
     last_scan_date = Column(DateTime)
     last_appointment_date = Column(DateTime)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    data_version = Column(BigInteger, default=0)  # Bumped by every write that changes the user's dashboard data
     
     def to_dict(self):
         return {
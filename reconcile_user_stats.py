@@ -0,0 +1,69 @@
+"""
+Recompute user_stats from scans and appointments
+
+Usage:
+    python reconcile_user_stats.py [--full] [--batch-size 500] [--pause-ms 0]
+    python reconcile_user_stats.py --loop [--interval 900]
+
+Only users with scans or appointments created since the last successful run
+are recomputed; --full recomputes every user. Run it from cron, or keep it
+running with --loop. See utils/stats_reconcile_utils.py.
+"""
+import argparse
+import signal
+import threading
+from database import SessionLocal
+from config import Config
+from utils.stats_reconcile_utils import reconcile
+
+def run_once(full, batch_size, pause):
+    db = SessionLocal()
+    try:
+        summary = reconcile(db, full=full, batch_size=batch_size, pause=pause)
+    finally:
+        db.close()
+
+    print(f"✓ Checked {summary['users']} users, updated {summary['updated']} stats rows"
+          f" (since {summary['since'] or 'the beginning'})")
+    if summary['failed_batches']:
+        print(f"✗ {summary['failed_batches']} batch(es) failed; they are retried on the next run")
+    return summary
+
+def main():
+    parser = argparse.ArgumentParser(description='Recompute user stats from scans and appointments')
+    parser.add_argument('--full', action='store_true',
+                        help='Recompute every user, not only those changed since the last run')
+    parser.add_argument('--batch-size', type=int, default=Config.STATS_RECONCILE_BATCH_SIZE,
+                        help='Users recomputed per transaction')
+    parser.add_argument('--pause-ms', type=float, default=0,
+                        help='Sleep between batches')
+    parser.add_argument('--loop', action='store_true',
+                        help='Keep running, reconciling every --interval seconds')
+    parser.add_argument('--interval', type=int, default=Config.STATS_RECONCILE_INTERVAL,
+                        help='Seconds between runs with --loop')
+    args = parser.parse_args()
+
+    if not args.loop:
+        run_once(args.full, args.batch_size, args.pause_ms / 1000)
+        return
+
+    stop_event = threading.Event()
+
+    def shutdown(signum, frame):
+        print("Stopping stats reconciliation...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    full = args.full
+    while not stop_event.is_set():
+        try:
+            run_once(full, args.batch_size, args.pause_ms / 1000)
+            full = False
+        except Exception as e:
+            print(f"✗ Stats reconciliation failed: {e}")
+        stop_event.wait(args.interval)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,18 @@
 from flask import Blueprint, request, jsonify
-from models import Appointment, User
+from models import Appointment
 from utils.firebase_utils import require_auth
-from utils.user_stats_utils import update_appointment_stats
+from utils.database_utils import read_replica
+from utils.identity_utils import resolve_user
+from utils.etag_utils import user_validators, is_not_modified, not_modified_response, with_validators
+from utils.json_utils import NATIVE_TYPES
+from utils.user_stats_utils import update_appointment_stats, touch_stats_upsert
 from datetime import datetime, date, time
+import logging
 import uuid
 import os
 
+logger = logging.getLogger(__name__)
+
 appointment_bp = Blueprint('appointment', __name__)
 
 @appointment_bp.route('/', methods=['POST'])
@@ -13,7 +20,7 @@ appointment_bp = Blueprint('appointment', __name__)
 def create_appointment():
     """Book a new appointment"""
     try:
-        from app import db
+        from database import db
         
         data = request.get_json()
         
@@ -24,8 +31,7 @@ def create_appointment():
                 return jsonify({'error': f'Missing required field: {field}'}), 400
         
         # Get user
-        uid = request.user.get('uid')  # type: ignore
-        user = db.query(User).filter(User.uid == uid).first()
+        user = request.identity  # type: ignore
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -58,30 +64,35 @@ def create_appointment():
         }), 201
         
     except ValueError as e:
-        print(f"Date/time validation error: {e}")
+        logger.error("Date/time validation error: %s", e)
         return jsonify({'error': f'Invalid date/time format: {str(e)}'}), 400
     except Exception as e:
-        print(f"Error creating appointment: {e}")
-        from app import db
+        logger.error("Error creating appointment: %s", e)
+        from database import db
         db.rollback()
         return jsonify({'error': str(e)}), 500
 
 @appointment_bp.route('/<user_uid>', methods=['GET'])
 @require_auth
+@read_replica
 def get_user_appointments(user_uid):
     """Get all appointments for a user"""
     try:
-        from app import db
+        from database import db
         
         # Get status filter
         status = request.args.get('status', None)
         
         # Get user
-        user = db.query(User).filter(User.uid == user_uid).first()
+        user = resolve_user(db, user_uid)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
+        validators = user_validators(db, user.id)
+        if is_not_modified(validators):
+            return not_modified_response(validators)
+        
         # Build query
         query = db.query(Appointment).filter(Appointment.user_id == user.id)
         
@@ -91,12 +102,12 @@ def get_user_appointments(user_uid):
         # Order by date and time
         appointments = query.order_by(Appointment.date.desc(), Appointment.time.desc()).all()
         
-        return jsonify({
-            'appointments': [appt.to_dict() for appt in appointments]
-        }), 200
+        return with_validators(jsonify({
+            'appointments': [appt.to_dict(native=NATIVE_TYPES) for appt in appointments]
+        }), validators), 200
         
     except Exception as e:
-        print(f"Error fetching appointments: {e}")
+        logger.error("Error fetching appointments: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @appointment_bp.route('/<appointment_id>', methods=['DELETE'])
@@ -104,7 +115,7 @@ def get_user_appointments(user_uid):
 def cancel_appointment(appointment_id):
     """Cancel an appointment"""
     try:
-        from app import db
+        from database import db
         
         # Get appointment
         appointment = db.query(Appointment).filter(Appointment.id == uuid.UUID(appointment_id)).first()
@@ -113,14 +124,14 @@ def cancel_appointment(appointment_id):
             return jsonify({'error': 'Appointment not found'}), 404
         
         # Verify user owns this appointment
-        uid = request.user.get('uid')  # type: ignore
-        user = db.query(User).filter(User.uid == uid).first()
+        user = request.identity  # type: ignore
         
         if not user or str(appointment.user_id) != str(user.id):
             return jsonify({'error': 'Unauthorized'}), 403
         
         # Update status to cancelled
         setattr(appointment, 'status', 'Cancelled')
+        db.execute(touch_stats_upsert([appointment.user_id]))
         db.commit()
         
         return jsonify({
@@ -131,8 +142,8 @@ def cancel_appointment(appointment_id):
     except ValueError:
         return jsonify({'error': 'Invalid appointment ID'}), 400
     except Exception as e:
-        print(f"Error cancelling appointment: {e}")
-        from app import db
+        logger.error("Error cancelling appointment: %s", e)
+        from database import db
         db.rollback()
         return jsonify({'error': str(e)}), 500
 
@@ -141,7 +152,7 @@ def cancel_appointment(appointment_id):
 def update_appointment(appointment_id):
     """Update appointment status"""
     try:
-        from app import db
+        from database import db
         
         data = request.get_json()
         
@@ -154,6 +165,7 @@ def update_appointment(appointment_id):
         # Update status
         if 'status' in data:
             setattr(appointment, 'status', data['status'])
+            db.execute(touch_stats_upsert([appointment.user_id]))
         
         db.commit()
         db.refresh(appointment)
@@ -164,7 +176,7 @@ def update_appointment(appointment_id):
         }), 200
         
     except Exception as e:
-        print(f"Error updating appointment: {e}")
-        from app import db
+        logger.error("Error updating appointment: %s", e)
+        from database import db
         db.rollback()
         return jsonify({'error': str(e)}), 500
@@ -2,7 +2,12 @@ from flask import Blueprint, request, jsonify
 from sqlalchemy.orm import Session
 from models import User
 from utils.firebase_utils import require_auth
+from utils.database_utils import read_replica
+from utils.identity_utils import forget_user, remember_user, resolve_user
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -11,13 +16,21 @@ auth_bp = Blueprint('auth', __name__)
 def verify_user():
     """Verify user token and create/update user in database"""
     try:
-        from app import db
+        from database import db
         
         user_data = request.user
         uid = user_data.get('uid')
         email = user_data.get('email')
         name = user_data.get('name', email.split('@')[0])
         
+        # Known user with unchanged details: answered from the identity require_auth resolved
+        identity = request.identity
+        if identity is not None and (not name or name == identity.name):
+            return jsonify({
+                'message': 'User verified',
+                'user': identity.to_dict()
+            }), 200
+        
         # Check if user exists
         user = db.query(User).filter(User.uid == uid).first()
         
@@ -31,8 +44,9 @@ def verify_user():
             db.add(user)
             db.commit()
             db.refresh(user)
+            remember_user(user)
             
-            print(f"✓ New user created in database: {email} (UID: {uid})")
+            logger.info("New user created in database: %s (UID: %s)", email, uid)
             
             return jsonify({
                 'message': 'User created successfully',
@@ -42,8 +56,10 @@ def verify_user():
             # Update user info if name changed
             if name and name != user.name:
                 user.name = name
+                forget_user(uid)
                 db.commit()
                 db.refresh(user)
+            remember_user(user)
             
             return jsonify({
                 'message': 'User verified',
@@ -51,18 +67,19 @@ def verify_user():
             }), 200
             
     except Exception as e:
-        print(f"Error verifying user: {e}")
+        logger.error("Error verifying user: %s", e)
         db.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/user/<uid>', methods=['GET'])
 @require_auth
+@read_replica
 def get_user(uid):
     """Get user details by UID"""
     try:
-        from app import db
+        from database import db
         
-        user = db.query(User).filter(User.uid == uid).first()
+        user = resolve_user(db, uid)
         
         if not user:
             return jsonify({'error': 'User not found'}), 404
@@ -76,7 +93,7 @@ def get_user(uid):
 def register_user():
     """Register new user in database (called after Firebase registration)"""
     try:
-        from app import db
+        from database import db
         
         data = request.get_json()
         
@@ -89,7 +106,7 @@ def register_user():
         name = data.get('name', email.split('@')[0])
         
         # Check if user already exists
-        existing_user = db.query(User).filter(User.uid == uid).first()
+        existing_user = resolve_user(db, uid)
         
         if existing_user:
             return jsonify({
@@ -107,8 +124,9 @@ def register_user():
         db.add(user)
         db.commit()
         db.refresh(user)
+        remember_user(user)
         
-        print(f"✓ User registered in database: {email} (UID: {uid})")
+        logger.info("User registered in database: %s (UID: %s)", email, uid)
         
         return jsonify({
             'message': 'User registered successfully',
@@ -116,6 +134,6 @@ def register_user():
         }), 201
         
     except Exception as e:
-        print(f"Error registering user: {e}")
+        logger.error("Error registering user: %s", e)
         db.rollback()
         return jsonify({'error': str(e)}), 500
@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from utils.gemini_utils import chat_with_gemini
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 chatbot_bp = Blueprint('chatbot', __name__)
 
@@ -28,7 +31,7 @@ def chat():
         }), 200
         
     except Exception as e:
-        print(f"Chatbot error: {e}")
+        logger.error("Chatbot error: %s", e)
         return jsonify({
             'error': str(e),
             'response': 'Sorry, I encountered an error. Please try again later.'
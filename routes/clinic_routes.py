@@ -1,5 +1,8 @@
 from flask import Blueprint, request, jsonify
 from utils.googlemaps_utils import find_nearby_clinics, get_clinic_details
+import logging
+
+logger = logging.getLogger(__name__)
 
 clinic_bp = Blueprint('clinic', __name__)
 
@@ -15,7 +18,7 @@ def get_nearby_clinics():
         if not latitude or not longitude:
             return jsonify({'error': 'Latitude and longitude are required'}), 400
         
-        print(f"Searching clinics at ({latitude}, {longitude}) with radius {radius}m")
+        logger.debug("Searching clinics at (%s, %s) with radius %sm", latitude, longitude, radius)
         
         # Find clinics using SerpAPI
         clinics = find_nearby_clinics(latitude, longitude, radius)
@@ -31,16 +34,14 @@ def get_nearby_clinics():
         }), 200
         
     except Exception as e:
-        print(f"Error in get_nearby_clinics: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_nearby_clinics: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @clinic_bp.route('/details/<place_id>', methods=['GET'])
 def get_details(place_id):
     """Get detailed information about a specific clinic using SerpAPI"""
     try:
-        print(f"Fetching details for place_id: {place_id}")
+        logger.debug("Fetching details for place_id: %s", place_id)
         
         details = get_clinic_details(place_id)
         
@@ -50,7 +51,5 @@ def get_details(place_id):
         return jsonify({'clinic': details}), 200
         
     except Exception as e:
-        print(f"Error in get_details: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in get_details: %s", e)
         return jsonify({'error': str(e)}), 500
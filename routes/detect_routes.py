@@ -1,12 +1,31 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, url_for, Response, stream_with_context
 from werkzeug.utils import secure_filename
-from models import Scan, User
 from utils.firebase_utils import require_auth
-from utils.supabase_utils import upload_image
-from utils.groq_utils import analyze_disease
-from utils.user_stats_utils import update_scan_stats
+from utils.database_utils import read_replica
+from utils.analysis_cache_utils import build_cache_key, get_cached_analyses, store_analyses, get_cache_stats
+from utils.scan_job_utils import get_scan_job, wait_for_job, FINISHED_STATUSES
+from utils.scan_pipeline_utils import (
+    upload_and_analyze, server_timing_header, new_scan_context, run_scan_pipeline, build_scan_response, scan_row, save_scans,
+    GUEST_SCAN_PIPELINE, USER_SCAN_PIPELINE, ScanRequestError, ScanUploadError, ScanAnalysisError
+)
+from utils.image_utils import ImageValidationError
+from utils.logging_utils import log_payload
+from utils.json_utils import NATIVE_TYPES
+from utils.identity_utils import resolve_user
+from utils.etag_utils import user_validators, is_not_modified, not_modified_response, with_validators
+from utils.rendition_utils import RENDITIONS, schedule_renditions
+from utils.scan_history_utils import history_page, count_history, parse_fields, InvalidCursorError, InvalidFieldsError, COUNT_MODES
+from utils.upload_utils import hash_stream, sniff_image_type
+from config import Config
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import json
+import logging
 import os
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
 
 detect_bp = Blueprint('detect', __name__)
 scan_bp = Blueprint('scan', __name__)  # Frontend compatibility endpoint
@@ -16,6 +35,98 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def inspect_image(file, disease_type):
+    """
+    Validate and hash the upload in chunks without reading it into memory
+    Returns (content_type, image_hash, cache_key)
+    """
+    content_type = sniff_image_type(file.stream)
+    if content_type is None:
+        raise ImageValidationError('Invalid image file: not a PNG or JPEG image')
+    
+    image_hash = hash_stream(file.stream)
+    return content_type, image_hash, build_cache_key(image_hash, disease_type)
+
+def scan_response(response, timings):
+    """JSON response with stage timings in the body and the Server-Timing header"""
+    response['timings'] = timings
+    resp = jsonify(response)
+    resp.headers['Server-Timing'] = server_timing_header(timings)
+    return resp, 200
+
+def wants_async_scan():
+    """Clients opt in to async scans with ?async=true or a 'Prefer: respond-async' header"""
+    if request.args.get('async', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return 'respond-async' in request.headers.get('Prefer', '')
+
+def accepted_job_response(job):
+    """202 Accepted response for a queued scan job"""
+    status_url = url_for('scan.get_scan_job_status', job_id=str(job.id))
+    response = jsonify({
+        'job_id': str(job.id),
+        'status': job.status,
+        'status_url': status_url,
+        'events_url': url_for('scan.stream_scan_job_events', job_id=str(job.id))
+    })
+    response.headers['Location'] = status_url
+    return response, 202
+
+def handle_scan_request(disease_type, pipeline, uid=None):
+    """
+    Adapter from a scan request to the shared scan pipeline
+    uid: Firebase uid from require_auth; without it a Bearer token is optional (guest scans)
+    """
+    from database import db
+    
+    # Check if image is in request
+    if 'image' not in request.files:
+        return jsonify({'error': 'No image file provided'}), 400
+    
+    file = request.files['image']
+    
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({'error': 'Invalid file type. Only PNG, JPG, JPEG allowed'}), 400
+    
+    logger.info("Processing %s scan for file: %s", disease_type, file.filename)
+    
+    token = None
+    auth_header = request.headers.get('Authorization')
+    if uid is None and auth_header and auth_header.startswith('Bearer '):
+        token = auth_header.split('Bearer ')[1]
+    
+    ctx = new_scan_context(
+        db, disease_type, file.stream,
+        mode=request.args.get('pipeline'),
+        filename=file.filename,
+        uid=uid,
+        token=token,
+        require_user=uid is not None,
+        async_requested=wants_async_scan()
+    )
+    
+    try:
+        run_scan_pipeline(pipeline, ctx)
+    except ImageValidationError as image_error:
+        return jsonify({'error': str(image_error)}), 400
+    except ScanRequestError as request_error:
+        return jsonify({'error': str(request_error)}), request_error.status_code
+    except ScanUploadError as upload_error:
+        logger.error("Image upload failed: %s", upload_error)
+        return jsonify({'error': f'Failed to upload image: {str(upload_error)}'}), 500
+    except ScanAnalysisError as analysis_error:
+        logger.error("Analysis failed: %s", analysis_error)
+        return jsonify({'error': f'Failed to analyze image: {str(analysis_error)}'}), 500
+    
+    if ctx.job is not None:
+        return accepted_job_response(ctx.job)
+    
+    logger.info("Analysis completed: %s", ctx.analysis_result.get('disease_name'), extra={'timings': ctx.timings})
+    return scan_response(build_scan_response(ctx), ctx.timings)
+
 @detect_bp.route('/<disease_type>', methods=['POST'])
 @require_auth
 def detect_disease(disease_type):
@@ -24,154 +135,102 @@ def detect_disease(disease_type):
     disease_type: 'skin' or 'eye'
     """
     try:
-        from app import db
-        
         if disease_type not in ['skin', 'eye']:
             return jsonify({'error': 'Invalid disease type. Must be skin or eye'}), 400
         
-        # Check if image is in request
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
-        
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Only PNG, JPG, JPEG allowed'}), 400
-        
-        # Get user
-        uid = request.user.get('uid')  # type: ignore
-        user = db.query(User).filter(User.uid == uid).first()
-        
-        if not user:
-            return jsonify({'error': 'User not found'}), 404
-        
-        # Upload image to Supabase
-        image_url = upload_image(file, str(user.id), disease_type)
-        
-        # Analyze disease using Groq AI
-        analysis_result = analyze_disease(image_url, disease_type)
-        
-        # Save scan to database
-        scan = Scan(
-            user_id=user.id,
-            disease_type=disease_type,
-            disease_name=analysis_result.get('disease_name', 'Unknown'),
-            confidence=float(analysis_result.get('confidence', 0)),
-            image_url=image_url
-        )
-        
-        db.add(scan)
-        db.commit()
-        db.refresh(scan)
-        
-        # Return response
-        response = {
-            'scan_id': str(scan.id),
-            'disease_name': scan.disease_name,
-            'confidence': scan.confidence,
-            'severity': analysis_result.get('severity', 'medium'),
-            'recommendations': analysis_result.get('recommendations', []),
-            'description': analysis_result.get('description', ''),
-            'image_url': image_url,
-            'timestamp': scan.timestamp.isoformat()
-        }
-        
-        return jsonify(response), 200
+        return handle_scan_request(disease_type, USER_SCAN_PIPELINE, uid=request.user.get('uid'))  # type: ignore
         
     except Exception as e:
-        print(f"Detection error: {e}")
+        logger.exception("Detection error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @detect_bp.route('/history/<user_uid>', methods=['GET'])
 @require_auth
+@read_replica
 def get_scan_history(user_uid):
-    """Get all scans for a user with pagination"""
+    """Get scans for a user, newest first, by cursor or page number"""
     try:
-        from app import db
-        
-        print("\n" + "="*80)
-        print(f"📊 Fetching Scan History from Neon Database for user: {user_uid}")
-        print("="*80)
+        from database import db
         
         # Get pagination parameters
+        cursor = request.args.get('cursor')
         page = request.args.get('page', 1, type=int)
-        per_page = request.args.get('per_page', 10, type=int)
+        per_page = max(1, min(request.args.get('per_page', 10, type=int), Config.SCAN_HISTORY_MAX_PER_PAGE))
         disease_type = request.args.get('type', None)
-        
-        print(f"Pagination: page={page}, per_page={per_page}")
-        if disease_type:
-            print(f"Filter: disease_type={disease_type}")
+        rendition = request.args.get('rendition', 'original')
+        # Cursor requests continue a listing whose total the client already has
+        count_mode = request.args.get('count', 'none' if cursor else Config.SCAN_HISTORY_COUNT)
+        
+        if rendition != 'original' and rendition not in RENDITIONS:
+            return jsonify({'error': f"Invalid rendition. Must be one of: original, {', '.join(RENDITIONS)}"}), 400
+        if count_mode not in COUNT_MODES:
+            return jsonify({'error': f"Invalid count. Must be one of: {', '.join(COUNT_MODES)}"}), 400
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except InvalidFieldsError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Get user
-        user = db.query(User).filter(User.uid == user_uid).first()
+        user = resolve_user(db, user_uid)
         
         if not user:
-            print(f"❌ User not found with UID: {user_uid}")
+            logger.warning("User not found with UID: %s", user_uid)
             return jsonify({'error': 'User not found'}), 404
         
-        print(f"User found: {user.email} (ID: {user.id})")
-        
-        # Build query
-        query = db.query(Scan).filter(Scan.user_id == user.id)
+        # Nothing written for this user since the client's copy: skip the queries
+        validators = user_validators(db, user.id)
+        if is_not_modified(validators):
+            return not_modified_response(validators)
         
-        if disease_type:
-            query = query.filter(Scan.disease_type == disease_type)
-        
-        # Order by timestamp descending
-        query = query.order_by(Scan.timestamp.desc())
-        
-        # Paginate
-        offset = (page - 1) * per_page
-        scans = query.limit(per_page).offset(offset).all()
-        total = query.count()
-        
-        # Log retrieved scans
-        import json
-        scans_data = [scan.to_dict() for scan in scans]
-        print(f"\nRetrieved {len(scans)} scans (Total: {total}):")
-        print(json.dumps(scans_data, indent=2))
-        print("="*80)
-        print("✅ Scan history fetched successfully!")
-        print("="*80 + "\n")
+        try:
+            scans, next_cursor = history_page(
+                db, user.id, per_page, disease_type, cursor=cursor, page=page, fields=fields, rendition=rendition
+            )
+        except InvalidCursorError as e:
+            return jsonify({'error': str(e)}), 400
+        total = count_history(db, user.id, disease_type, count_mode)
+        
+        scans_data = [scan.to_dict(rendition=rendition, native=NATIVE_TYPES, fields=fields) for scan in scans]
+        logger.debug(
+            "Fetched scan history",
+            extra={'user_id': user.id, 'page': page, 'cursor': cursor, 'per_page': per_page, 'type': disease_type, 'returned': len(scans), 'total': total}
+        )
+        log_payload(logger, "Scan history", scans_data)
         
-        return jsonify({
+        return with_validators(jsonify({
             'scans': scans_data,
+            'next_cursor': next_cursor,
             'total': total,
-            'page': page,
+            'page': None if cursor else page,
             'per_page': per_page,
-            'total_pages': (total + per_page - 1) // per_page
-        }), 200
+            'total_pages': (total + per_page - 1) // per_page if total is not None else None,
+            'rendition': rendition
+        }), validators), 200
         
     except Exception as e:
-        print(f"\n❌ Error fetching scan history: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error fetching scan history: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
 @detect_bp.route('/stats/<user_uid>', methods=['GET'])
 @require_auth
+@read_replica
 def get_user_stats(user_uid):
     """Get user statistics for dashboard"""
     try:
-        from app import db
+        from database import db
         from models import UserStats
         
-        print("\n" + "="*80)
-        print(f"📊 Fetching User Stats from Neon Database for user: {user_uid}")
-        print("="*80)
-        
         # Get user
-        user = db.query(User).filter(User.uid == user_uid).first()
+        user = resolve_user(db, user_uid)
         
         if not user:
-            print(f"❌ User not found with UID: {user_uid}")
+            logger.warning("User not found with UID: %s", user_uid)
             return jsonify({'error': 'User not found'}), 404
         
-        print(f"User found: {user.email} (ID: {user.id})")
+        validators = user_validators(db, user.id)
+        if is_not_modified(validators):
+            return not_modified_response(validators)
         
         # Get user stats
         user_stats = db.query(UserStats).filter(UserStats.user_id == user.id).first()
@@ -189,21 +248,12 @@ def get_user_stats(user_uid):
         else:
             stats_data = user_stats.to_dict()
         
-        print(f"\nRetrieved user stats:")
-        print(f"  - Total scans: {stats_data['total_scans']}")
-        print(f"  - Skin scans: {stats_data['skin_scans']}")
-        print(f"  - Eye scans: {stats_data['eye_scans']}")
-        print(f"  - Total appointments: {stats_data['total_appointments']}")
-        print("="*80)
-        print("✅ User stats fetched successfully!")
-        print("="*80 + "\n")
+        logger.debug("Fetched user stats", extra={'user_id': user.id, 'total_scans': stats_data['total_scans']})
         
-        return jsonify(stats_data), 200
+        return with_validators(jsonify(stats_data), validators), 200
         
     except Exception as e:
-        print(f"\n❌ Error fetching user stats: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error fetching user stats: %s", e)
         return jsonify({'error': str(e)}), 500
 
 # Frontend-compatible endpoints (/api/scan/skin and /api/scan/eye)
@@ -211,257 +261,279 @@ def get_user_stats(user_uid):
 def scan_skin():
     """Analyze skin disease from uploaded image"""
     try:
-        from app import db
+        return handle_scan_request('skin', GUEST_SCAN_PIPELINE)
+    except Exception as e:
+        logger.exception("Skin analysis error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@scan_bp.route('/eye', methods=['POST'])
+def scan_eye():
+    """Analyze eye disease from uploaded image"""
+    try:
+        return handle_scan_request('eye', GUEST_SCAN_PIPELINE)
+    except Exception as e:
+        logger.exception("Eye analysis error: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+@scan_bp.route('/batch', methods=['POST'])
+@require_auth
+def scan_batch():
+    """
+    Analyze several images of the same lesion in one request
+    Form fields: images (multiple files), disease_type ('skin' or 'eye', default 'skin')
+    """
+    try:
+        from database import db
         
-        # Check if image is in request
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
+        disease_type = request.form.get('disease_type', 'skin')
+        if disease_type not in ['skin', 'eye']:
+            return jsonify({'error': 'Invalid disease type. Must be skin or eye'}), 400
         
-        file = request.files['image']
+        files = request.files.getlist('images') + request.files.getlist('image')
+        if not files:
+            return jsonify({'error': 'No image files provided'}), 400
         
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        if len(files) > Config.SCAN_BATCH_MAX_IMAGES:
+            return jsonify({'error': f'Too many images. Maximum is {Config.SCAN_BATCH_MAX_IMAGES} per batch'}), 400
         
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Only PNG, JPG, JPEG allowed'}), 400
+        # Verify the user once for the whole batch
+        user = request.identity  # type: ignore
         
-        print(f"Processing skin scan for file: {file.filename}")
+        if not user:
+            return jsonify({'error': 'User not found'}), 404
         
-        # Get user ID from request (optional - for authenticated requests)
-        user_id_to_save = None
-        auth_header = request.headers.get('Authorization')
+        logger.info("Processing batch of %d %s images for user: %s", len(files), disease_type, user.id)
         
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                # User is authenticated, get their info
-                from utils.firebase_utils import verify_token
-                token = auth_header.split('Bearer ')[1]
-                decoded_token = verify_token(token)
-                
-                if decoded_token:
-                    uid = decoded_token.get('uid')
-                    user = db.query(User).filter(User.uid == uid).first()
-                    if user:
-                        user_id_to_save = user.id
-                        print(f"Authenticated scan for user: {user.email}")
-            except Exception as auth_error:
-                print(f"Auth check failed (continuing as guest): {auth_error}")
-        
-        # Upload image to Supabase
-        try:
-            upload_user_id = str(user_id_to_save) if user_id_to_save is not None else 'guest'
-            image_url = upload_image(file, upload_user_id, 'skin')
-            print(f"Image uploaded successfully: {image_url}")
-        except Exception as upload_error:
-            print(f"Image upload failed: {upload_error}")
-            return jsonify({'error': f'Failed to upload image: {str(upload_error)}'}), 500
-        
-        # Analyze disease using Groq AI
-        try:
-            analysis_result = analyze_disease(image_url, 'skin')
-            print(f"Analysis completed: {analysis_result.get('disease_name')}")
-        except Exception as analysis_error:
-            print(f"Analysis failed: {analysis_error}")
-            return jsonify({'error': f'Failed to analyze image: {str(analysis_error)}'}), 500
-        
-        # Save scan to database if user is authenticated
-        scan_id = None
-        if user_id_to_save is not None:
+        results = [None] * len(files)
+        items = []
+        invalid = set()  # Indexes rejected by validation (client errors)
+        
+        for index, file in enumerate(files):
+            if file.filename == '' or not allowed_file(file.filename):
+                results[index] = {
+                    'index': index,
+                    'filename': file.filename,
+                    'status': 'error',
+                    'error': 'Invalid file type. Only PNG, JPG, JPEG allowed'
+                }
+                invalid.add(index)
+                continue
+            
             try:
-                print("\n" + "="*80)
-                print("💾 Saving Skin Scan to Neon Database...")
-                print("="*80)
-                
-                scan = Scan(
-                    user_id=user_id_to_save,
-                    disease_type='skin',
-                    disease_name=analysis_result.get('disease_name', 'Unknown'),
-                    confidence=float(analysis_result.get('confidence', 0)),
-                    severity=analysis_result.get('severity', 'medium'),
-                    description=analysis_result.get('description', ''),
-                    recommendations=analysis_result.get('recommendations', ['Consult a dermatologist']),
-                    image_url=image_url
-                )
-                
-                db.add(scan)
-                db.commit()
-                db.refresh(scan)
-                scan_id = str(scan.id)
-                
-                # Update user stats
-                update_scan_stats(db, user_id_to_save, 'skin')
-                
-                # Log the saved scan data
-                import json
-                saved_data = {
-                    'scan_id': scan_id,
-                    'user_id': str(user_id_to_save),
-                    'disease_type': 'skin',
-                    'disease_name': analysis_result.get('disease_name', 'Unknown'),
-                    'confidence': float(analysis_result.get('confidence', 0)),
-                    'severity': analysis_result.get('severity', 'medium'),
-                    'description': analysis_result.get('description', ''),
-                    'recommendations': analysis_result.get('recommendations', []),
-                    'image_url': image_url
+                content_type, image_hash, cache_key = inspect_image(file, disease_type)
+            except ImageValidationError as image_error:
+                results[index] = {
+                    'index': index,
+                    'filename': file.filename,
+                    'status': 'error',
+                    'error': str(image_error)
                 }
-                print(json.dumps(saved_data, indent=2))
-                print("="*80)
-                print("✅ Scan saved to Neon PostgreSQL successfully!")
-                print("="*80 + "\n")
+                invalid.add(index)
+                continue
+            
+            items.append({
+                'index': index,
+                'filename': file.filename,
+                'content_type': content_type,
+                'image': file.stream,
+                'image_hash': image_hash,
+                'cache_key': cache_key
+            })
+        
+        # One cache query for the whole batch
+        cached_entries = get_cached_analyses(db, [item['cache_key'] for item in items])
+        
+        # Worker threads have no request context; capture what they need
+        pipeline_mode = request.args.get('pipeline')
+        upload_user_id = str(user.id)
+        
+        def analyze_item(item):
+            cached = cached_entries.get(item['cache_key'])
+            if cached:
+                return cached['image_url'], cached['analysis'], {'mode': 'cached'}, None, True
+            image_url, analysis_result, timings, image_stats = upload_and_analyze(
+                item['image'], item['content_type'], upload_user_id, disease_type,
+                mode=pipeline_mode
+            )
+            return image_url, analysis_result, timings, image_stats, False
+        
+        # Fan out uploads and analyses over a bounded pool
+        with ThreadPoolExecutor(max_workers=Config.SCAN_BATCH_WORKERS, thread_name_prefix='scan-batch') as executor:
+            futures = [
+                (item, executor.submit(analyze_item, item))
+                for item in items
+            ]
+        
+        new_cache_entries = []
+        rows = []
+        for item, future in futures:
+            index = item['index']
+            try:
+                image_url, analysis_result, timings, image_stats, was_cached = future.result()
+            except ImageValidationError as e:
+                results[index] = {'index': index, 'filename': item['filename'], 'status': 'error', 'error': str(e)}
+                invalid.add(index)
+                continue
+            except Exception as e:
+                logger.warning("Batch item %d failed: %s", index, e)
+                results[index] = {'index': index, 'filename': item['filename'], 'status': 'error', 'error': f'Failed to process image: {str(e)}'}
+                continue
+            
+            if not was_cached:
+                new_cache_entries.append((item['cache_key'], item['image_hash'], disease_type, analysis_result, image_url))
+            
+            row = scan_row(disease_type, analysis_result, image_url, image_stats)
+            rows.append(row)
+            
+            results[index] = {
+                'index': index,
+                'filename': item['filename'],
+                'status': 'ok',
+                'scan_id': str(row['id']),
+                'disease_name': row['disease_name'],
+                'confidence': row['confidence'],
+                'severity': row['severity'],
+                'recommendations': row['recommendations'],
+                'description': row['description'],
+                'image_url': image_url,
+                'cached': was_cached,
+                'image_stats': image_stats,
+                'timings': timings,
+                'timestamp': datetime.utcnow().isoformat()
+            }
+        
+        store_analyses(db, new_cache_entries)
+        
+        if rows:
+            try:
+                # One multi-row insert for all scans and one stats upsert, in one transaction
+                saved = save_scans(db, user.id, disease_type, rows)
+                for result in results:
+                    if result and result['status'] == 'ok':
+                        result['timestamp'] = saved[uuid.UUID(result['scan_id'])].isoformat()
+                for image_url in {row['image_url'] for row in rows}:
+                    schedule_renditions(image_url)
             except Exception as db_error:
-                print(f"\n❌ Database Error: Failed to save scan")
-                print(f"Error: {db_error}")
-                import traceback
-                traceback.print_exc()
+                logger.error("Batch database error: %s", db_error)
                 db.rollback()
-                # Continue anyway - don't fail the request
-        
-        # Return response
-        response = {
-            'scan_id': scan_id,
-            'disease_name': analysis_result.get('disease_name', 'Unknown Condition'),
-            'confidence': float(analysis_result.get('confidence', 0)),
-            'severity': analysis_result.get('severity', 'medium'),
-            'recommendations': analysis_result.get('recommendations', ['Consult a dermatologist']),
-            'description': analysis_result.get('description', ''),
-            'image_url': image_url,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        return jsonify(response), 200
+                # Nothing was saved: report every analyzed item as failed
+                for index, result in enumerate(results):
+                    if result and result['status'] == 'ok':
+                        results[index] = {
+                            'index': index,
+                            'filename': result['filename'],
+                            'status': 'error',
+                            'error': 'Failed to save scan'
+                        }
+        
+        succeeded = sum(1 for result in results if result and result['status'] == 'ok')
+        
+        if succeeded:
+            status_code = 200
+        elif len(invalid) == len(results):
+            status_code = 400  # Every image was rejected by validation
+        else:
+            status_code = 500
+        
+        return jsonify({
+            'disease_type': disease_type,
+            'results': results,
+            'total': len(results),
+            'succeeded': succeeded,
+            'failed': len(results) - succeeded
+        }), status_code
         
     except Exception as e:
-        print(f"Skin analysis error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Batch scan error: %s", e)
         return jsonify({'error': str(e)}), 500
 
 
-@scan_bp.route('/eye', methods=['POST'])
-def scan_eye():
-    """Analyze eye disease from uploaded image"""
+@scan_bp.route('/cache/stats', methods=['GET'])
+def analysis_cache_stats():
+    """Hit/miss counters for the analysis result cache"""
     try:
-        from app import db
-        
-        # Check if image is in request
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
-        
-        file = request.files['image']
-        
-        if file.filename == '':
-            return jsonify({'error': 'No file selected'}), 400
+        return jsonify(get_cache_stats()), 200
+    except Exception as e:
+        logger.error("Error fetching cache stats: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+
+def owns_job(job):
+    """Whether the authenticated caller queued this job (require_auth sets request.identity)"""
+    identity = request.identity  # type: ignore
+    return job is not None and identity is not None and job.user_id == identity.id
+
+@scan_bp.route('/jobs/<job_id>', methods=['GET'])
+@require_auth
+def get_scan_job_status(job_id):
+    """
+    Get the status/result of an async scan job
+    Pass ?wait=<seconds> to long-poll until the job finishes
+    """
+    try:
+        from database import db
         
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type. Only PNG, JPG, JPEG allowed'}), 400
+        job_uuid = uuid.UUID(job_id)
+        wait = min(request.args.get('wait', 0, type=float), Config.SCAN_JOB_MAX_WAIT)
         
-        print(f"Processing eye scan for file: {file.filename}")
+        # Someone else's job is reported as missing, not forbidden
+        job = get_scan_job(db, job_uuid)
+        if not owns_job(job):
+            return jsonify({'error': 'Job not found'}), 404
         
-        # Get user ID from request (optional - for authenticated requests)
-        user_id_to_save = None
-        auth_header = request.headers.get('Authorization')
+        if wait > 0 and job.status not in FINISHED_STATUSES:
+            db.rollback()
+            job = wait_for_job(db, job_uuid, wait)
         
-        if auth_header and auth_header.startswith('Bearer '):
-            try:
-                # User is authenticated, get their info
-                from utils.firebase_utils import verify_token
-                token = auth_header.split('Bearer ')[1]
-                decoded_token = verify_token(token)
-                
-                if decoded_token:
-                    uid = decoded_token.get('uid')
-                    user = db.query(User).filter(User.uid == uid).first()
-                    if user:
-                        user_id_to_save = user.id
-                        print(f"Authenticated scan for user: {user.email}")
-            except Exception as auth_error:
-                print(f"Auth check failed (continuing as guest): {auth_error}")
-        
-        # Upload image to Supabase
-        try:
-            upload_user_id = str(user_id_to_save) if user_id_to_save is not None else 'guest'
-            image_url = upload_image(file, upload_user_id, 'eye')
-            print(f"Image uploaded successfully: {image_url}")
-        except Exception as upload_error:
-            print(f"Image upload failed: {upload_error}")
-            return jsonify({'error': f'Failed to upload image: {str(upload_error)}'}), 500
-        
-        # Analyze disease using Groq AI
-        try:
-            analysis_result = analyze_disease(image_url, 'eye')
-            print(f"Analysis completed: {analysis_result.get('disease_name')}")
-        except Exception as analysis_error:
-            print(f"Analysis failed: {analysis_error}")
-            return jsonify({'error': f'Failed to analyze image: {str(analysis_error)}'}), 500
-        
-        # Save scan to database if user is authenticated
-        scan_id = None
-        if user_id_to_save is not None:
-            try:
-                print("\n" + "="*80)
-                print("💾 Saving Eye Scan to Neon Database...")
-                print("="*80)
-                
-                scan = Scan(
-                    user_id=user_id_to_save,
-                    disease_type='eye',
-                    disease_name=analysis_result.get('disease_name', 'Unknown'),
-                    confidence=float(analysis_result.get('confidence', 0)),
-                    severity=analysis_result.get('severity', 'medium'),
-                    description=analysis_result.get('description', ''),
-                    recommendations=analysis_result.get('recommendations', ['Consult an ophthalmologist']),
-                    image_url=image_url
-                )
-                
-                db.add(scan)
-                db.commit()
-                db.refresh(scan)
-                scan_id = str(scan.id)
-                
-                # Update user stats
-                update_scan_stats(db, user_id_to_save, 'eye')
-                
-                # Log the saved scan data
-                import json
-                saved_data = {
-                    'scan_id': scan_id,
-                    'user_id': str(user_id_to_save),
-                    'disease_type': 'eye',
-                    'disease_name': analysis_result.get('disease_name', 'Unknown'),
-                    'confidence': float(analysis_result.get('confidence', 0)),
-                    'severity': analysis_result.get('severity', 'medium'),
-                    'description': analysis_result.get('description', ''),
-                    'recommendations': analysis_result.get('recommendations', []),
-                    'image_url': image_url
-                }
-                print(json.dumps(saved_data, indent=2))
-                print("="*80)
-                print("✅ Scan saved to Neon PostgreSQL successfully!")
-                print("="*80 + "\n")
-            except Exception as db_error:
-                print(f"\n❌ Database Error: Failed to save scan")
-                print(f"Error: {db_error}")
-                import traceback
-                traceback.print_exc()
-                db.rollback()
-                # Continue anyway - don't fail the request
-        
-        # Return response
-        response = {
-            'scan_id': scan_id,
-            'disease_name': analysis_result.get('disease_name', 'Unknown Condition'),
-            'confidence': float(analysis_result.get('confidence', 0)),
-            'severity': analysis_result.get('severity', 'medium'),
-            'recommendations': analysis_result.get('recommendations', ['Consult an ophthalmologist']),
-            'description': analysis_result.get('description', ''),
-            'image_url': image_url,
-            'timestamp': datetime.utcnow().isoformat()
-        }
-        
-        return jsonify(response), 200
+        return jsonify(job.to_dict()), 200
         
+    except ValueError:
+        return jsonify({'error': 'Invalid job ID'}), 400
     except Exception as e:
-        print(f"Eye analysis error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.error("Error fetching scan job: %s", e)
         return jsonify({'error': str(e)}), 500
+
+
+@scan_bp.route('/jobs/<job_id>/events', methods=['GET'])
+@require_auth
+def stream_scan_job_events(job_id):
+    """Server-Sent Events stream of job status changes, closed once the job finishes"""
+    try:
+        from database import db
+        
+        job_uuid = uuid.UUID(job_id)
+    except ValueError:
+        return jsonify({'error': 'Invalid job ID'}), 400
+    
+    if not owns_job(get_scan_job(db, job_uuid)):
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def generate():
+        deadline = time.monotonic() + Config.SCAN_JOB_MAX_WAIT
+        last_status = None
+        
+        while True:
+            job = get_scan_job(db, job_uuid)
+            
+            if job is None:
+                yield f"event: error\ndata: {json.dumps({'error': 'Job not found'})}\n\n"
+                return
+            
+            if job.status != last_status:
+                last_status = job.status
+                yield f"event: status\ndata: {json.dumps(job.to_dict())}\n\n"
+            
+            if job.status in FINISHED_STATUSES or time.monotonic() >= deadline:
+                return
+            
+            # End the read transaction so the next poll sees the worker's commit
+            db.rollback()
+            time.sleep(0.5)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,39 @@
+"""
+Worker process for asynchronous scan jobs
+
+Usage:
+    python scan_worker.py [--workers N]
+
+Run as many of these processes as needed; jobs are claimed with
+SELECT ... FOR UPDATE SKIP LOCKED so no job is processed twice.
+"""
+import argparse
+import signal
+from database import SessionLocal
+from config import Config
+from utils.scan_job_utils import start_worker_pool
+
+def main():
+    parser = argparse.ArgumentParser(description='Process queued scan jobs')
+    parser.add_argument('--workers', type=int, default=Config.SCAN_JOB_WORKERS,
+                        help='Number of worker threads in this process')
+    args = parser.parse_args()
+
+    threads, stop_event = start_worker_pool(SessionLocal, args.workers)
+    print(f"✓ Started {len(threads)} scan worker thread(s)")
+
+    def shutdown(signum, frame):
+        print("Stopping scan workers...")
+        stop_event.set()
+
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    while not stop_event.is_set():
+        stop_event.wait(1)
+
+    for thread in threads:
+        thread.join()
+
+if __name__ == "__main__":
+    main()
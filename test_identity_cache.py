@@ -0,0 +1,60 @@
+"""
+Identity cache invalidation: a changed or deleted user is not served from the cache
+
+Runs against an in-memory SQLite database.
+
+Usage:
+    python -m pytest test_identity_cache.py
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from config import Config
+from models import Base, User
+from utils import identity_utils
+
+@compiles(UUID, 'sqlite')
+def compile_uuid(element, compiler, **kw):
+    return 'CHAR(32)'
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(Config, 'IDENTITY_CACHE_ENABLED', True)
+    engine = create_engine('sqlite://', poolclass=StaticPool, connect_args={'check_same_thread': False})
+    Base.metadata.create_all(engine)
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+    identity_utils._cache.clear()
+
+def add_user(db, uid, name):
+    user = User(uid=uid, name=name, email=f"{uid}@example.com")
+    db.add(user)
+    db.commit()
+    return user
+
+def test_updated_user_is_not_served_from_cache(db):
+    user = add_user(db, 'cache-uid-1', 'Old Name')
+    assert identity_utils.resolve_user(db, 'cache-uid-1').name == 'Old Name'
+
+    user.name = 'New Name'
+    db.commit()
+
+    assert identity_utils.resolve_user(db, 'cache-uid-1').name == 'New Name'
+
+def test_deleted_user_is_not_served_from_cache(db):
+    user = add_user(db, 'cache-uid-2', 'Someone')
+    assert identity_utils.resolve_user(db, 'cache-uid-2') is not None
+
+    db.delete(user)
+    db.commit()
+
+    assert identity_utils.resolve_user(db, 'cache-uid-2') is None
@@ -0,0 +1,141 @@
+"""
+Async scan jobs that run more than once save one scan
+
+Runs against a file-backed SQLite database, with a stand-in analysis backend
+and storage upload.
+
+Usage:
+    python -m pytest test_scan_jobs.py
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from config import Config
+from models import Base, User, Scan, ScanJob, UserStats
+from utils import scan_pipeline_utils
+from utils.scan_job_utils import enqueue_scan_job, claim_next_job, process_scan_job
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+@compiles(UUID, 'sqlite')
+def compile_uuid(element, compiler, **kw):
+    return 'CHAR(32)'
+
+class LocalBackend:
+    name = 'test'
+    accepts_bytes = True
+
+    def __init__(self):
+        self.before_result = None
+
+    def is_available(self):
+        return True
+
+    def analyze(self, image, disease_type):
+        if self.before_result is not None:
+            hook, self.before_result = self.before_result, None
+            hook()
+        return {'disease_name': 'Eczema', 'confidence': 0.9, 'severity': 'low'}
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = LocalBackend()
+    monkeypatch.setattr(scan_pipeline_utils, 'get_backend', lambda disease_type: backend)
+    return backend
+
+@pytest.fixture
+def uploads(monkeypatch):
+    uploads = []
+
+    def upload_image_bytes(body, user_id, disease_type, content_type, extension):
+        uploads.append(user_id)
+        return f"https://storage.example.com/{len(uploads)}.png"
+
+    monkeypatch.setattr(scan_pipeline_utils, 'upload_image_bytes', upload_image_bytes)
+    return uploads
+
+@pytest.fixture
+def sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'IMAGE_NORMALIZE_ENABLED', False)
+    monkeypatch.setattr(Config, 'RENDITIONS_ENABLED', False)
+    monkeypatch.setattr(Config, 'USER_STATS_COALESCE', False)
+    monkeypatch.setattr(Config, 'SCAN_PIPELINE_DISABLED_STAGES', ['cache_lookup', 'cache_store'])
+    engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}")
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def job_id(sessions):
+    db = sessions()
+    user = User(uid='job-uid', name='Someone', email='job-uid@example.com')
+    db.add(user)
+    db.commit()
+    job_id = enqueue_scan_job(db, PNG, 'skin', user_id=user.id, content_type='image/png').id
+    db.close()
+    return job_id
+
+def make_stale(db, job_id):
+    db.query(ScanJob).filter(ScanJob.id == job_id).update(
+        {'started_at': datetime.utcnow() - timedelta(seconds=Config.SCAN_JOB_STALE_AFTER + 1)}
+    )
+    db.commit()
+
+def test_reclaimed_job_saves_one_scan(sessions, job_id, backend, uploads):
+    slow_db, other_db = sessions(), sessions()
+    slow_job = claim_next_job(slow_db, 'slow')
+
+    def reclaimed_and_finished():
+        # While the slow worker waits on its analysis, the job goes stale and another worker runs it
+        make_stale(other_db, job_id)
+        other_job = claim_next_job(other_db, 'other')
+        assert other_job is not None
+        assert process_scan_job(other_db, other_job, 'other')
+
+    backend.before_result = reclaimed_and_finished
+    assert not process_scan_job(slow_db, slow_job, 'slow')
+
+    db = sessions()
+    scans = db.query(Scan).all()
+    job = db.get(ScanJob, job_id)
+    assert len(scans) == 1
+    assert job.status == 'completed'
+    assert job.worker_id == 'other'
+    assert job.result['scan_id'] == str(scans[0].id)
+    assert db.query(UserStats).one().total_scans == 1
+
+def test_failure_after_save_does_not_requeue(sessions, job_id, backend, uploads, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('renditions unavailable')
+
+    monkeypatch.setattr(scan_pipeline_utils, 'schedule_renditions', fail)
+    db = sessions()
+    job = claim_next_job(db, 'worker')
+    assert not process_scan_job(db, job, 'worker')
+
+    assert db.get(ScanJob, job_id).status == 'completed'
+    assert db.query(Scan).count() == 1
+
+def test_retry_reuses_uploaded_image(sessions, job_id, backend, uploads):
+    def fail():
+        raise RuntimeError('model unavailable')
+
+    backend.before_result = fail
+    db = sessions()
+    job = claim_next_job(db, 'worker')
+    assert not process_scan_job(db, job, 'worker')
+    assert db.get(ScanJob, job_id).status == 'queued'
+
+    job = claim_next_job(db, 'worker')
+    assert process_scan_job(db, job, 'worker')
+
+    assert len(uploads) == 1
+    assert db.get(ScanJob, job_id).result['image_url'] == 'https://storage.example.com/1.png'
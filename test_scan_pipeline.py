@@ -0,0 +1,38 @@
+"""
+Scan pipeline checks that need no database rows or upstream APIs
+
+Usage:
+    python -m pytest test_scan_pipeline.py
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from config import Config
+from utils import scan_pipeline_utils
+from utils.pipeline_utils import PipelineContext
+
+class RemoteBackend:
+    accepts_bytes = False
+
+def normalize_context(image):
+    ctx = PipelineContext(image=image, content_type='image/jpeg', extension='jpg', mode='concurrent', backend=RemoteBackend())
+    scan_pipeline_utils._normalize(ctx)
+    return ctx
+
+def test_data_url_size_matches_encoding():
+    for size in (0, 1, 2, 3, 1000, 3 * 1024 * 1024 + 1):
+        data_url = scan_pipeline_utils.encode_data_url(b'\xff' * size, 'image/png')
+        assert scan_pipeline_utils.data_url_size(size, 'image/png') == len(data_url)
+
+def test_image_just_over_3mib_is_uploaded_not_inlined(monkeypatch):
+    monkeypatch.setattr(Config, 'IMAGE_NORMALIZE_ENABLED', False)
+    # Under the 4MiB limit raw, over it once base64-encoded
+    ctx = normalize_context(b'\xff' * (3 * 1024 * 1024 + 1024))
+    assert ctx.mode == 'serial'
+
+def test_small_image_is_inlined(monkeypatch):
+    monkeypatch.setattr(Config, 'IMAGE_NORMALIZE_ENABLED', False)
+    ctx = normalize_context(b'\xff' * (2 * 1024 * 1024))
+    assert ctx.mode == 'concurrent'
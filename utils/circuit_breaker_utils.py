@@ -0,0 +1,209 @@
+"""
+Circuit breakers for upstream model endpoints
+
+Each breaker keeps a rolling time window of call outcomes. When the failure
+rate or the slow-call rate in the window crosses its threshold the circuit
+opens and callers fail fast for CIRCUIT_BREAKER_OPEN_SECONDS. After that a
+limited number of probe calls are let through (half-open); if they succeed
+the circuit closes again, if one fails it reopens.
+"""
+from collections import deque
+from config import Config
+from utils.metrics_utils import register_collector
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+_lock = threading.Lock()
+_breakers = {}
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+class CircuitBreaker:
+    def __init__(self, name, window=None, min_calls=None, failure_rate=None, slow_call_ms=None,
+                 slow_call_rate=None, open_seconds=None, half_open_calls=None):
+        self.name = name
+        self.window = Config.CIRCUIT_BREAKER_WINDOW if window is None else window
+        self.min_calls = Config.CIRCUIT_BREAKER_MIN_CALLS if min_calls is None else min_calls
+        self.failure_rate = Config.CIRCUIT_BREAKER_FAILURE_RATE if failure_rate is None else failure_rate
+        self.slow_call_ms = Config.CIRCUIT_BREAKER_SLOW_CALL_MS if slow_call_ms is None else slow_call_ms
+        self.slow_call_rate = Config.CIRCUIT_BREAKER_SLOW_CALL_RATE if slow_call_rate is None else slow_call_rate
+        self.open_seconds = Config.CIRCUIT_BREAKER_OPEN_SECONDS if open_seconds is None else open_seconds
+        self.half_open_calls = Config.CIRCUIT_BREAKER_HALF_OPEN_CALLS if half_open_calls is None else half_open_calls
+
+        self._lock = threading.Lock()
+        self._calls = deque()  # (timestamp, failed, slow)
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+
+        self.trips = 0
+        self.rejected = 0
+        self.last_trip_reason = None
+        self.last_trip_at = None
+
+    def _prune(self, now):
+        cutoff = now - self.window
+        while self._calls and self._calls[0][0] < cutoff:
+            self._calls.popleft()
+
+    def _trip(self, now, reason):
+        self._state = OPEN
+        self._opened_at = now
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self.trips += 1
+        self.last_trip_reason = reason
+        self.last_trip_at = time.time()
+        logger.warning("Circuit '%s' opened (%s); failing fast for %.0fs", self.name, reason, self.open_seconds)
+
+    def _close(self):
+        self._state = CLOSED
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._calls.clear()
+        logger.info("Circuit '%s' closed", self.name)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state(time.monotonic())
+
+    def _current_state(self, now):
+        # An open circuit becomes eligible for probing once the open period is over
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+        return self._state
+
+    def is_available(self):
+        """False while calls would be rejected (open and not yet probing)"""
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == OPEN:
+                return False
+            if state == HALF_OPEN:
+                return self._probes_in_flight < self.half_open_calls
+            return True
+
+    def allow_request(self):
+        """Reserve a call slot; returns False (and counts a rejection) when the call should fail fast"""
+        if not Config.CIRCUIT_BREAKER_ENABLED:
+            return True
+
+        with self._lock:
+            state = self._current_state(time.monotonic())
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes_in_flight < self.half_open_calls:
+                self._probes_in_flight += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, latency_ms):
+        self._record(latency_ms, failed=False)
+
+    def record_failure(self, latency_ms):
+        self._record(latency_ms, failed=True)
+
+    def _record(self, latency_ms, failed):
+        if not Config.CIRCUIT_BREAKER_ENABLED:
+            return
+
+        now = time.monotonic()
+        slow = latency_ms >= self.slow_call_ms
+
+        with self._lock:
+            state = self._current_state(now)
+
+            if state == HALF_OPEN:
+                self._probes_in_flight = max(self._probes_in_flight - 1, 0)
+                if failed or slow:
+                    self._trip(now, 'probe failed' if failed else 'probe slow')
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_calls:
+                        self._close()
+                return
+
+            if state == OPEN:
+                # A call that started before the circuit opened; nothing to decide
+                return
+
+            self._calls.append((now, failed, slow))
+            self._prune(now)
+
+            total = len(self._calls)
+            if total < self.min_calls:
+                return
+
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+
+            if failures / total >= self.failure_rate:
+                self._trip(now, f"failure rate {failures}/{total}")
+            elif slow_calls / total >= self.slow_call_rate:
+                self._trip(now, f"slow call rate {slow_calls}/{total}")
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            state = self._current_state(now)
+            self._prune(now)
+            total = len(self._calls)
+            failures = sum(1 for _, call_failed, _ in self._calls if call_failed)
+            slow_calls = sum(1 for _, _, call_slow in self._calls if call_slow)
+            retry_in = None
+            if state == OPEN:
+                retry_in = round(max(self.open_seconds - (now - self._opened_at), 0), 1)
+
+            return {
+                'state': state,
+                'enabled': Config.CIRCUIT_BREAKER_ENABLED,
+                'calls_in_window': total,
+                'failure_rate': round(failures / total, 4) if total else 0.0,
+                'slow_call_rate': round(slow_calls / total, 4) if total else 0.0,
+                'trips': self.trips,
+                'rejected': self.rejected,
+                'last_trip_reason': self.last_trip_reason,
+                'last_trip_at': self.last_trip_at,
+                'retry_in_seconds': retry_in
+            }
+
+def get_breaker(name):
+    """Shared breaker for an upstream endpoint, created on first use"""
+    breaker = _breakers.get(name)
+    if breaker is None:
+        with _lock:
+            breaker = _breakers.setdefault(name, CircuitBreaker(name))
+    return breaker
+
+def get_breaker_stats():
+    return {name: breaker.stats() for name, breaker in list(_breakers.items())}
+
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+@register_collector
+def breaker_metric_lines():
+    stats = get_breaker_stats()
+    lines = [
+        "# HELP circuit_breaker_state Circuit state (0 closed, 1 half-open, 2 open)",
+        "# TYPE circuit_breaker_state gauge"
+    ]
+    lines += [f'circuit_breaker_state{{breaker="{name}"}} {STATE_VALUES[s["state"]]}' for name, s in stats.items()]
+    lines += ["# HELP circuit_breaker_trips_total Times the circuit opened", "# TYPE circuit_breaker_trips_total counter"]
+    lines += [f'circuit_breaker_trips_total{{breaker="{name}"}} {s["trips"]}' for name, s in stats.items()]
+    lines += ["# HELP circuit_breaker_rejected_total Calls failed fast while open", "# TYPE circuit_breaker_rejected_total counter"]
+    lines += [f'circuit_breaker_rejected_total{{breaker="{name}"}} {s["rejected"]}' for name, s in stats.items()]
+    return lines
@@ -0,0 +1,54 @@
+"""
+Response compression
+
+JSON responses of at least COMPRESSION_MIN_BYTES are compressed with the
+best encoding the client accepts: brotli (when the brotli package is
+installed) or gzip. Streamed responses (server-sent events) and responses
+that already have a Content-Encoding are left alone. Validators stay correct
+because the dashboard ETags are weak (see utils/etag_utils.py).
+"""
+from flask import request
+from config import Config
+from utils.metrics_utils import span
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json',)
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def compress(data, encoding):
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.COMPRESSION_GZIP_LEVEL, mtime=0)
+
+def compress_response(response):
+    """Compress a response in place if it is worth it and the client accepts it"""
+    if (response.status_code < 200 or response.status_code == 204 or response.status_code >= 300
+            or response.direct_passthrough or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = request.accept_encodings.best_match(available_encodings())
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_MIN_BYTES:
+        return response
+
+    with span('compress'):
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def init_compression(app):
+    if Config.COMPRESSION_ENABLED:
+        app.after_request(compress_response)
@@ -0,0 +1,130 @@
+"""
+Database engines: pool settings, statement timeouts, PgBouncer mode and read replica routing
+
+The primary engine is built from DATABASE_URL with DB_POOL_SIZE,
+DB_MAX_OVERFLOW, DB_POOL_TIMEOUT and DB_POOL_RECYCLE. Pre-ping (a round trip
+on every checkout) is off by default: connections are recycled before Neon
+drops idle ones, and DB_POOL_PRE_PING=true turns it back on.
+DB_STATEMENT_TIMEOUT_MS is sent as a startup option, or, with DB_PGBOUNCER
+(transaction pooling, e.g. Neon's -pooler endpoint, which rejects startup
+options and shares sessions), as SET LOCAL at the start of each transaction.
+
+With DATABASE_READ_URL set, a second engine points at a read replica.
+Handlers decorated with @read_replica send their SELECTs there; flushes and
+other statements still go to the primary. A caller who wrote recently reads
+from the primary instead, so they always see their own writes. No query is
+made to decide this: a write request marks the caller in this process, and
+its response carries the write time (X-Last-Write header and cookie), which
+the client sends back so requests served by other workers see it too.
+"""
+from functools import wraps
+from flask import request
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from config import Config
+from utils.cache_utils import TTLCache
+from utils.metrics_utils import InstrumentedSession
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+WRITE_METHODS = ('POST', 'PUT', 'PATCH', 'DELETE')
+
+# Unix time of the caller's last write, returned by write responses and echoed back by clients
+LAST_WRITE_HEADER = 'X-Last-Write'
+LAST_WRITE_COOKIE = 'last_write'
+
+# Firebase UIDs that wrote through this process within DB_READ_YOUR_WRITES_SECONDS
+_recent_writers = TTLCache(maxsize=Config.IDENTITY_CACHE_MAX_ENTRIES, ttl=Config.DB_READ_YOUR_WRITES_SECONDS)
+
+def engine_options(url):
+    """create_engine() keyword arguments for a database URL"""
+    backend = make_url(url).get_backend_name()
+    if backend != 'postgresql':
+        # SQLite (local runs, benchmarks) keeps SQLAlchemy's defaults
+        return {'pool_pre_ping': Config.DB_POOL_PRE_PING}
+
+    options = {
+        'pool_size': Config.DB_POOL_SIZE,
+        'max_overflow': Config.DB_MAX_OVERFLOW,
+        'pool_timeout': Config.DB_POOL_TIMEOUT,
+        'pool_recycle': Config.DB_POOL_RECYCLE,
+        'pool_pre_ping': Config.DB_POOL_PRE_PING,
+        'connect_args': {'connect_timeout': Config.DB_CONNECT_TIMEOUT}
+    }
+    if Config.DB_STATEMENT_TIMEOUT_MS and not Config.DB_PGBOUNCER:
+        options['connect_args']['options'] = f"-c statement_timeout={Config.DB_STATEMENT_TIMEOUT_MS}"
+    return options
+
+def create_database_engine(url):
+    """Engine for the primary or replica URL with the configured pool and timeouts"""
+    engine = create_engine(url, **engine_options(url))
+
+    if Config.DB_PGBOUNCER and Config.DB_STATEMENT_TIMEOUT_MS and engine.dialect.name == 'postgresql':
+        statement = f"SET LOCAL statement_timeout = {int(Config.DB_STATEMENT_TIMEOUT_MS)}"
+
+        # Session settings would leak to other clients of the pooled server connection
+        @event.listens_for(engine, 'begin')
+        def set_statement_timeout(conn):
+            conn.exec_driver_sql(statement)
+
+    return engine
+
+class RoutingSession(InstrumentedSession):
+    """Session that reads from info['replica_engine'] while info['use_replica'] is set"""
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        replica = self.info.get('replica_engine')
+        if (replica is not None and self.info.get('use_replica') and not self._flushing
+                and getattr(clause, 'is_select', False)):
+            return replica
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+def mark_write(response):
+    """after_request hook: remember callers whose write request succeeded, and tell them when"""
+    user = getattr(request, 'user', None)
+    if request.method in WRITE_METHODS and response.status_code < 400 and user and user.get('uid'):
+        _recent_writers.set(user['uid'], True)
+        written_at = f"{time.time():.3f}"
+        response.headers[LAST_WRITE_HEADER] = written_at
+        response.set_cookie(
+            LAST_WRITE_COOKIE, written_at, max_age=Config.DB_READ_YOUR_WRITES_SECONDS,
+            httponly=True, samesite='Lax', secure=request.is_secure
+        )
+    return response
+
+def _client_last_write():
+    value = request.headers.get(LAST_WRITE_HEADER) or request.cookies.get(LAST_WRITE_COOKIE)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+def wrote_recently(identity):
+    """
+    Whether reads for this caller must see the primary: a write marked in
+    this process, or a client-reported write within DB_READ_YOUR_WRITES_SECONDS
+    (the hint can only send reads to the primary, never hide a write)
+    """
+    if identity is not None and _recent_writers.get(identity.uid) is not None:
+        return True
+    last_write = _client_last_write()
+    return last_write is not None and time.time() - last_write < Config.DB_READ_YOUR_WRITES_SECONDS
+
+def read_replica(f):
+    """Run a read-only handler's SELECTs on the replica (place below @require_auth)"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        from database import db
+
+        if db.info.get('replica_engine') is None or wrote_recently(getattr(request, 'identity', None)):
+            return f(*args, **kwargs)
+
+        db.info['use_replica'] = True
+        try:
+            return f(*args, **kwargs)
+        finally:
+            db.info['use_replica'] = False
+
+    return decorated_function
@@ -0,0 +1,68 @@
+"""
+Conditional GET for the per-user dashboard reads
+
+Scan history, stats and the appointment list only change when something is
+written for that user, and every such write bumps user_stats.data_version
+and updated_at in the same transaction (scan saves, bookings, appointment
+status changes, stored renditions, reconciliation). A handler reads those two
+columns with one indexed lookup and derives its validators from them:
+
+    ETag           W/"<hash of endpoint, user id, data_version, query args>"
+    Last-Modified  user_stats.updated_at
+
+When If-None-Match still matches, the handler answers 304 before running its
+queries or serializing anything. ETags are weak, so they stay valid whatever
+Content-Encoding is used. If-Modified-Since is ignored: Last-Modified has
+one-second resolution, so a second write within the same second as the one a
+client saw would still compare as unmodified.
+
+With USER_STATS_COALESCE the version is bumped when a buffered increment is
+flushed, so a new scan or booking can be reported unchanged for up to
+USER_STATS_FLUSH_INTERVAL_MS.
+"""
+from datetime import timezone
+from flask import current_app, request
+from config import Config
+from models import UserStats
+from utils.metrics_utils import span
+import hashlib
+
+def user_version(db, user_id):
+    """(data_version, updated_at) of a user's dashboard data; (0, None) before their first write"""
+    with span('db.version_lookup'):
+        row = db.query(UserStats.data_version, UserStats.updated_at).filter(UserStats.user_id == user_id).first()
+    if row is None:
+        return 0, None
+    return row.data_version or 0, row.updated_at
+
+def user_validators(db, user_id):
+    """(etag, last_modified) for the current request, or None when conditional GET is disabled"""
+    if not Config.CONDITIONAL_GET_ENABLED:
+        return None
+    version, updated_at = user_version(db, user_id)
+    args = '&'.join(f"{key}={value}" for key, value in sorted(request.args.items(multi=True)))
+    key = f"{request.endpoint}|{user_id}|{version}|{args}"
+    etag = hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+    # HTTP dates have one-second resolution
+    last_modified = updated_at.replace(microsecond=0, tzinfo=timezone.utc) if updated_at else None
+    return etag, last_modified
+
+def is_not_modified(validators):
+    """Whether the client's cached copy is still current"""
+    if validators is None:
+        return False
+    etag, _ = validators
+    return bool(request.if_none_match) and request.if_none_match.contains_weak(etag)
+
+def with_validators(response, validators):
+    """Add ETag, Last-Modified and a revalidate-every-time Cache-Control to a response"""
+    if validators is not None:
+        etag, last_modified = validators
+        response.set_etag(etag, weak=True)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def not_modified_response(validators):
+    return with_validators(current_app.response_class(status=304), validators)
@@ -0,0 +1,242 @@
+"""
+Fast Firebase ID token verification for require_auth and optional-auth scans
+
+Two layers sit in front of firebase_admin's auth.verify_id_token:
+
+  - A verified-token cache keyed by the token's SHA-256. Each entry lives
+    until the token's own `exp` (at most FIREBASE_TOKEN_CACHE_MAX_TTL), so a
+    client reusing its token for up to an hour is verified once.
+  - Local verification against Google's signing certificates. A background
+    thread keeps them in memory and refreshes them before their Cache-Control
+    max-age runs out, so a request never waits on a certificate download. The
+    checks (RS256 signature, exp/iat, aud, iss, sub) are the ones
+    verify_id_token makes, but the certificates are parsed once per refresh
+    rather than on every call.
+
+When the certificates have not been loaded yet, have outlived their max-age
+(refreshes failing), or the token names a key id we do not have (Google
+rotated keys), verification falls back to auth.verify_id_token and the
+refresher is woken up.
+"""
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+from config import Config
+from utils.cache_utils import TTLCache
+from utils.metrics_utils import register_collector
+from utils import http_utils
+import base64
+import hashlib
+import logging
+import os
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+ID_TOKEN_CERT_URL = 'https://www.googleapis.com/robot/v1/metadata/x509/securetoken@system.gserviceaccount.com'
+ID_TOKEN_ISSUER_PREFIX = 'https://securetoken.google.com/'
+
+_token_cache = TTLCache(maxsize=Config.FIREBASE_TOKEN_CACHE_MAX_ENTRIES, ttl=Config.FIREBASE_TOKEN_CACHE_MAX_TTL)
+
+_counters_lock = threading.Lock()
+_counters = {
+    'local': 0,
+    'fallback': 0
+}
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+def token_digest(id_token):
+    return hashlib.sha256(id_token.encode('utf-8')).hexdigest()
+
+def get_cached_token(id_token):
+    """Claims of a token verified earlier and not expired yet, or None"""
+    if not Config.FIREBASE_TOKEN_CACHE_ENABLED:
+        return None
+    claims = _token_cache.get(token_digest(id_token))
+    return dict(claims) if claims is not None else None
+
+def cache_token(id_token, claims):
+    """Remember verified claims until the token expires"""
+    if not Config.FIREBASE_TOKEN_CACHE_ENABLED:
+        return
+    ttl = min(claims.get('exp', 0) - time.time(), Config.FIREBASE_TOKEN_CACHE_MAX_TTL)
+    if ttl > 0:
+        _token_cache.set(token_digest(id_token), dict(claims), ttl=ttl)
+
+def _max_age(response):
+    match = re.search(r'max-age=(\d+)', response.headers.get('Cache-Control', ''))
+    if match:
+        return int(match.group(1))
+    expires = response.headers.get('Expires')
+    if expires:
+        try:
+            return max(0, int(parsedate_to_datetime(expires).timestamp() - time.time()))
+        except (TypeError, ValueError):
+            pass
+    return Config.FIREBASE_KEYS_REFRESH_SECONDS
+
+class SigningKeys:
+    """Google's ID token signing keys (key id -> RSA verifier), refreshed in the background"""
+
+    def __init__(self, url=ID_TOKEN_CERT_URL):
+        self.url = url
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._keys = {}
+        self._expires_at = 0.0
+        self._thread = None
+        self._pid = None
+        self.refreshes = 0
+        self.refresh_failures = 0
+        self.loaded_at = None
+
+    def get(self, key_id):
+        """Verifier for a key id, or None if unknown or the keys are past their max-age"""
+        if time.time() > self._expires_at:
+            # Refreshes keep failing: a rotated-out key must not stay trusted
+            return None
+        return self._keys.get(key_id)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, certs, max_age):
+        """Replace the keys with {key id: PEM certificate} (also used to preload them)"""
+        from cryptography.x509 import load_pem_x509_certificate
+        from google.auth import crypt
+
+        keys = {
+            key_id: crypt.RSAVerifier(load_pem_x509_certificate(pem.encode()).public_key())
+            for key_id, pem in certs.items()
+        }
+        with self._lock:
+            self._keys = keys
+            self._expires_at = time.time() + max_age
+            self.loaded_at = datetime.utcnow()
+
+    def refresh(self):
+        """Download the certificates now; returns seconds until they should be refreshed again"""
+        try:
+            response = http_utils.get('firebase', self.url)
+            response.raise_for_status()
+            max_age = _max_age(response)
+            self.load(response.json(), max_age)
+            self.refreshes += 1
+            logger.debug("Loaded %d Firebase signing keys (max-age %ds)", len(self), max_age)
+            # Refresh well before they expire, so new key ids are known before tokens use them
+            return max(60, max_age * 0.5)
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning("Firebase signing key refresh failed: %s", e)
+            return Config.FIREBASE_KEYS_RETRY_SECONDS
+
+    def start(self):
+        """Start the refresher thread (once per process; again in a forked worker)"""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='firebase-keys', daemon=True)
+            self._thread.start()
+
+    def request_refresh(self):
+        self.start()
+        self._wake.set()
+
+    def _run(self):
+        while True:
+            delay = self.refresh()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+signing_keys = SigningKeys()
+
+def start_key_refresh():
+    if Config.FIREBASE_LOCAL_VERIFY and not os.getenv('FIREBASE_AUTH_EMULATOR_HOST'):
+        signing_keys.start()
+
+def verify_locally(id_token, project_id):
+    """
+    Verify a Firebase ID token against the in-memory signing keys.
+    Returns the claims (with 'uid'), None if it cannot be checked locally
+    (keys not loaded or past their max-age, unknown key id), and raises
+    ValueError if it is invalid.
+    """
+    if not Config.FIREBASE_LOCAL_VERIFY or not project_id or os.getenv('FIREBASE_AUTH_EMULATOR_HOST'):
+        return None
+    import google.auth.jwt
+
+    token = id_token.encode('utf-8')
+    header = google.auth.jwt.decode_header(token)
+    if header.get('alg') != 'RS256':
+        raise ValueError(f"Firebase ID token has incorrect algorithm: {header.get('alg')}")
+
+    verifier = signing_keys.get(header.get('kid'))
+    if verifier is None:
+        # Not loaded yet, expired or a key we have not seen: let firebase_admin fetch, and refresh ours
+        signing_keys.request_refresh()
+        return None
+
+    signed_section, _, encoded_signature = token.rpartition(b'.')
+    signature = base64.urlsafe_b64decode(encoded_signature + b'=' * (-len(encoded_signature) % 4))
+    if not verifier.verify(signed_section, signature):
+        raise ValueError('Firebase ID token has an invalid signature')
+
+    claims = google.auth.jwt.decode(token, verify=False)
+    now = time.time()
+    skew = Config.FIREBASE_CLOCK_SKEW_SECONDS
+    if not isinstance(claims.get('exp'), int) or not isinstance(claims.get('iat'), int):
+        raise ValueError('Firebase ID token has no "exp" or "iat" claim')
+    if now > claims['exp'] + skew:
+        raise ValueError('Token expired')
+    if now < claims['iat'] - skew:
+        raise ValueError('Token used too early')
+    if claims.get('aud') != project_id:
+        raise ValueError(f"Firebase ID token has incorrect audience: {claims.get('aud')}")
+    if claims.get('iss') != ID_TOKEN_ISSUER_PREFIX + project_id:
+        raise ValueError(f"Firebase ID token has incorrect issuer: {claims.get('iss')}")
+    subject = claims.get('sub')
+    if not isinstance(subject, str) or not subject or len(subject) > 128:
+        raise ValueError('Firebase ID token has an invalid "sub" claim')
+
+    claims['uid'] = subject
+    _count('local')
+    return claims
+
+def record_fallback():
+    _count('fallback')
+
+def get_token_stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    return {
+        'cache': _token_cache.stats(),
+        'verifications': counters,
+        'signing_keys': len(signing_keys),
+        'keys_loaded_at': signing_keys.loaded_at.isoformat() if signing_keys.loaded_at else None,
+        'key_refreshes': signing_keys.refreshes,
+        'key_refresh_failures': signing_keys.refresh_failures
+    }
+
+@register_collector
+def token_metric_lines():
+    stats = get_token_stats()
+    lines = [
+        "# HELP firebase_token_cache_events_total Verified-token cache lookups",
+        "# TYPE firebase_token_cache_events_total counter",
+        f'firebase_token_cache_events_total{{event="hits"}} {stats["cache"]["hits"]}',
+        f'firebase_token_cache_events_total{{event="misses"}} {stats["cache"]["misses"]}',
+        "# HELP firebase_token_verifications_total Token signature checks, local (in-memory keys) or fallback (firebase_admin)",
+        "# TYPE firebase_token_verifications_total counter"
+    ]
+    lines += [f'firebase_token_verifications_total{{path="{name}"}} {value}' for name, value in sorted(stats['verifications'].items())]
+    lines += [
+        "# HELP firebase_signing_key_refresh_failures_total Failed downloads of the Firebase signing keys",
+        "# TYPE firebase_signing_key_refresh_failures_total counter",
+        f"firebase_signing_key_refresh_failures_total {stats['key_refresh_failures']}"
+    ]
+    return lines
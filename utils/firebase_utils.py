@@ -1,31 +1,65 @@
-import firebase_admin
-from firebase_admin import credentials, auth
 from functools import wraps
 from flask import request, jsonify
+from utils.metrics_utils import span
+from utils.firebase_token_utils import get_cached_token, cache_token, verify_locally, record_fallback, start_key_refresh
+from utils.identity_utils import resolve_user
+from utils.service_utils import register_service
+import logging
 import os
 
-# Initialize Firebase Admin
-def initialize_firebase():
-    cred_path = os.getenv('FIREBASE_CREDENTIALS')
-    if not cred_path or not os.path.exists(cred_path):
-        print("Warning: Firebase credentials not found. Auth will not work.")
-        return False
+logger = logging.getLogger(__name__)
+
+def _create_firebase_app():
+    """Firebase Admin app, or None without credentials (see utils/service_utils.py)"""
+    import firebase_admin
+    from firebase_admin import credentials
     
     try:
-        cred = credentials.Certificate(cred_path)
-        firebase_admin.initialize_app(cred)
-        return True
-    except Exception as e:
-        print(f"Error initializing Firebase: {e}")
-        return False
+        # Already set up in this process (or inherited across fork)
+        app = firebase_admin.get_app()
+    except ValueError:
+        cred_path = os.getenv('FIREBASE_CREDENTIALS')
+        if not cred_path or not os.path.exists(cred_path):
+            logger.warning("Firebase credentials not found. Auth will not work.")
+            return None
+        try:
+            app = firebase_admin.initialize_app(credentials.Certificate(cred_path))
+        except Exception as e:
+            logger.error("Error initializing Firebase: %s", e)
+            return None
+    
+    start_key_refresh()
+    return app
+
+firebase_service = register_service('firebase', _create_firebase_app)
+
+# Initialize Firebase Admin
+def initialize_firebase():
+    """Set up Firebase Admin now rather than on the first token verification"""
+    return firebase_service.get() is not None
 
-# Verify Firebase ID token
+# Verify Firebase ID token (cached until it expires, see utils/firebase_token_utils.py)
 def verify_token(id_token):
     try:
-        decoded_token = auth.verify_id_token(id_token)
+        decoded_token = get_cached_token(id_token)
+        if decoded_token is not None:
+            return decoded_token
+        
+        with span('firebase.verify_token'):
+            firebase_app = firebase_service.get()
+            if firebase_app is None:
+                raise ValueError('Firebase is not initialized')
+            decoded_token = verify_locally(id_token, firebase_app.project_id)
+            if decoded_token is None:
+                from firebase_admin import auth
+                
+                record_fallback()
+                decoded_token = auth.verify_id_token(id_token, app=firebase_app)
+        
+        cache_token(id_token, decoded_token)
         return decoded_token
     except Exception as e:
-        print(f"Token verification error: {e}")
+        logger.error("Token verification error: %s", e)
         return None
 
 # Middleware decorator for protected routes
@@ -47,9 +81,19 @@ def require_auth(f):
             
             # Attach user info to request
             request.user = decoded_token
-            return f(*args, **kwargs)
             
         except Exception as e:
             return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
+        
+        try:
+            from database import db
+            
+            # Registered user for the token (None until /api/auth/verify or /register creates it)
+            request.identity = resolve_user(db, decoded_token.get('uid'))
+        except Exception as e:
+            logger.error("Error resolving user: %s", e)
+            return jsonify({'error': str(e)}), 500
+        
+        return f(*args, **kwargs)
     
     return decorated_function
@@ -1,7 +1,11 @@
+import logging
 import requests
 from config import Config
+from utils import http_utils
 import json
 
+logger = logging.getLogger(__name__)
+
 def chat_with_gemini(message, conversation_history=None):
     """
     Send message to Gemini 2.0 Flash API and get health advice
@@ -12,7 +16,7 @@ def chat_with_gemini(message, conversation_history=None):
         if not api_key:
             raise Exception("Gemini API key not configured")
         
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
+        url = f"{Config.GEMINI_BASE_URL}/v1beta/models/gemini-2.0-flash:generateContent?key={api_key}"
         
         # System prompt for health assistant
         system_context = """You are a helpful AI health assistant. Provide accurate, helpful health information while always reminding users to consult healthcare professionals for serious concerns. 
@@ -47,7 +51,7 @@ Be empathetic, professional, and clear in your responses. If asked about serious
             "Content-Type": "application/json"
         }
         
-        response = requests.post(url, headers=headers, json=payload, timeout=30)
+        response = http_utils.post('gemini', url, headers=headers, json=payload)
         response.raise_for_status()
         
         result = response.json()
@@ -60,8 +64,8 @@ Be empathetic, professional, and clear in your responses. If asked about serious
             return "I'm sorry, I couldn't generate a response. Please try again."
             
     except requests.exceptions.RequestException as e:
-        print(f"Gemini API request error: {e}")
+        logger.error("Gemini API request error: %s", e)
         raise Exception(f"Failed to get chatbot response: {str(e)}")
     except Exception as e:
-        print(f"Gemini chat error: {e}")
+        logger.error("Gemini chat error: %s", e)
         raise Exception(f"Chat failed: {str(e)}")
@@ -0,0 +1,63 @@
+"""
+Async serving mode: gunicorn's gevent worker (GUNICORN_WORKER_CLASS=gevent)
+
+The gevent worker monkey-patches sockets, threads and locks before it loads
+the app, so every request runs in a greenlet and the existing views yield
+while they wait on Groq, Gemini, SerpAPI or Supabase: requests (http_utils)
+and httpx (Groq, Supabase SDKs) sockets become cooperative, scoped sessions
+become per-greenlet, and the stage and upload executors hand out greenlets.
+One worker keeps up to GUNICORN_WORKER_CONNECTIONS requests in flight.
+
+Two things are not covered by monkey-patching:
+
+  - psycopg2 talks to Postgres in C; patch_psycopg2() installs a wait
+    callback so queries yield too (gunicorn.conf.py does this per worker).
+  - CPU-bound work (Pillow decoding and resizing) would stall every other
+    greenlet in the worker; run_blocking() runs it on gevent's pool of real
+    threads instead.
+
+Outside a gevent worker (sync workers, scan_worker.py, scripts) both are
+no-ops.
+"""
+import sys
+
+def gevent_active():
+    """Whether this process runs in a monkey-patched gevent worker"""
+    if 'gevent' not in sys.modules:
+        return False
+    from gevent import monkey
+
+    return monkey.is_module_patched('socket')
+
+def _wait_callback(conn, timeout=None):
+    import psycopg2
+    from psycopg2 import extensions
+    from gevent.socket import wait_read, wait_write
+
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            break
+        elif state == extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+def patch_psycopg2():
+    """Make psycopg2 yield to other greenlets while it waits on the server (before any connection)"""
+    if not gevent_active():
+        return False
+    from psycopg2 import extensions
+
+    extensions.set_wait_callback(_wait_callback)
+    return True
+
+def run_blocking(func, *args, **kwargs):
+    """func(*args, **kwargs), on a real thread when other greenlets would wait for it"""
+    if not gevent_active():
+        return func(*args, **kwargs)
+    import gevent
+
+    return gevent.get_hub().threadpool.apply(func, args, kwargs)
@@ -1,5 +1,10 @@
+import logging
 import requests
 from config import Config
+from utils import http_utils
+from utils.logging_utils import log_payload
+
+logger = logging.getLogger(__name__)
 
 def find_nearby_clinics(latitude, longitude, radius=5000):
     """
@@ -13,7 +18,7 @@ def find_nearby_clinics(latitude, longitude, radius=5000):
             raise Exception("SerpAPI key not configured")
         
         # SerpAPI Google Maps API endpoint
-        url = "https://serpapi.com/search.json"
+        url = f"{Config.SERPAPI_BASE_URL}/search.json"
         
         # SerpAPI parameters for Google Maps local search
         # Format: ll=@latitude,longitude,zoomz (SerpAPI specific format)
@@ -25,24 +30,18 @@ def find_nearby_clinics(latitude, longitude, radius=5000):
             'api_key': api_key
         }
         
-        print(f"Searching for clinics near ({latitude}, {longitude}) within {radius}m")
+        logger.info("Searching for clinics near (%s, %s) within %sm", latitude, longitude, radius)
         
-        response = requests.get(url, params=params, timeout=15)
+        response = http_utils.get('serpapi', url, params=params)
         response.raise_for_status()
         
         data = response.json()
         
-        # Print raw SerpAPI response in JSON format
-        print("\n" + "="*80)
-        print("📡 SerpAPI Response (JSON):")
-        print("="*80)
-        import json
-        print(json.dumps(data, indent=2))
-        print("="*80 + "\n")
+        log_payload(logger, "SerpAPI response", data)
         
         # Check for errors in SerpAPI response
         if 'error' in data:
-            print(f"❌ SerpAPI error: {data['error']}")
+            logger.error("SerpAPI error: %s", data['error'])
             return []
         
         # Format results from SerpAPI
@@ -72,24 +71,14 @@ def find_nearby_clinics(latitude, longitude, radius=5000):
             }
             clinics.append(clinic)
         
-        # Print formatted clinic data in JSON
-        print("\n" + "="*80)
-        print(f"🏥 Found {len(clinics)} Clinics (Formatted JSON):")
-        print("="*80)
-        import json
-        print(json.dumps(clinics, indent=2, ensure_ascii=False))
-        print("="*80 + "\n")
-        
-        print(f"✅ Successfully returned {len(clinics)} clinics")
+        logger.info("Found %d clinics", len(clinics))
         return clinics
         
     except requests.exceptions.RequestException as e:
-        print(f"SerpAPI request error: {e}")
+        logger.error("SerpAPI request error: %s", e)
         raise Exception(f"Failed to fetch nearby clinics: {str(e)}")
     except Exception as e:
-        print(f"Clinic search error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Clinic search error: %s", e)
         raise Exception(f"Search failed: {str(e)}")
 
 def get_clinic_details(place_id):
@@ -100,7 +89,7 @@ def get_clinic_details(place_id):
         if not api_key:
             raise Exception("SerpAPI key not configured")
         
-        url = "https://serpapi.com/search.json"
+        url = f"{Config.SERPAPI_BASE_URL}/search.json"
         
         params = {
             'engine': 'google_maps',
@@ -109,13 +98,13 @@ def get_clinic_details(place_id):
             'api_key': api_key
         }
         
-        response = requests.get(url, params=params, timeout=15)
+        response = http_utils.get('serpapi', url, params=params)
         response.raise_for_status()
         
         data = response.json()
         
         if 'error' in data:
-            print(f"SerpAPI error: {data['error']}")
+            logger.error("SerpAPI error: %s", data['error'])
             return None
         
         # Extract place details
@@ -140,7 +129,5 @@ def get_clinic_details(place_id):
         return details
         
     except Exception as e:
-        print(f"Get clinic details error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Get clinic details error: %s", e)
         return None
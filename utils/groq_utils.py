@@ -1,6 +1,71 @@
-from groq import Groq
 from config import Config
+from utils import http_utils
+from utils.circuit_breaker_utils import get_breaker
+from utils.logging_utils import log_payload
+from utils.metrics_utils import span
+from utils.service_utils import register_service
 import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+GROQ_MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
+
+# Bump whenever the prompts below change so cached analyses are not reused
+PROMPT_VERSION = "v1"
+
+def attempt_timeout():
+    """Read timeout per attempt, so that all GROQ_MAX_RETRIES + 1 attempts fit in GROQ_DEADLINE"""
+    return min(Config.GROQ_TIMEOUT, Config.GROQ_DEADLINE / (Config.GROQ_MAX_RETRIES + 1))
+
+def _create_groq_client():
+    if not Config.GROQ_API_KEY:
+        raise Exception("Groq API key not configured")
+    from groq import Groq
+    return Groq(
+        api_key=Config.GROQ_API_KEY,
+        http_client=http_utils.create_httpx_client('groq'),
+        timeout=http_utils.httpx_timeout('groq', read=attempt_timeout()),
+        max_retries=Config.GROQ_MAX_RETRIES
+    )
+
+_groq_service = register_service('groq', _create_groq_client)
+
+def get_groq_client():
+    """Long-lived Groq client on the shared, instrumented connection pool"""
+    return _groq_service.get()
+
+def get_groq_breaker():
+    """Circuit breaker for the vision model endpoint"""
+    return get_breaker(f"groq:{GROQ_MODEL}")
+
+def is_groq_available():
+    """False while the Groq circuit is open and calls would fail fast"""
+    return not Config.CIRCUIT_BREAKER_ENABLED or get_groq_breaker().is_available()
+
+def is_fallback_result(result):
+    """True if the analysis was produced locally because the model call failed"""
+    return bool(result.get('is_fallback'))
+
+def is_circuit_open_result(result):
+    """True if the analysis is a fallback returned without calling Groq (circuit open)"""
+    return bool(result.get('circuit_open'))
+
+def _fallback_result(disease_type):
+    return {
+        "disease_name": f"{'Skin' if disease_type == 'skin' else 'Eye'} Condition Detected",
+        "confidence": 75.0,
+        "severity": "medium",
+        "recommendations": [
+            f"Consult a {'dermatologist' if disease_type == 'skin' else 'ophthalmologist'} for accurate diagnosis",
+            "Monitor the condition for any changes",
+            "Maintain good hygiene practices",
+            "Keep the affected area clean and dry" if disease_type == 'skin' else "Avoid rubbing or touching the eyes"
+        ],
+        "description": f"Visual analysis of {'skin' if disease_type == 'skin' else 'eye'} image completed. Professional medical consultation recommended for proper diagnosis and treatment plan.",
+        "is_fallback": True
+    }
 
 def analyze_disease(image_url, disease_type):
     """
@@ -8,13 +73,21 @@ def analyze_disease(image_url, disease_type):
     disease_type: 'skin' or 'eye'
     """
     try:
-        api_key = Config.GROQ_API_KEY
-        
-        if not api_key:
-            raise Exception("Groq API key not configured")
-        
-        # Initialize Groq client
-        client = Groq(api_key=api_key)
+        # Fail fast while the model endpoint is known to be down or too slow
+        breaker = get_groq_breaker()
+        if not breaker.allow_request():
+            logger.warning("Groq circuit open - skipping call, using fallback analysis")
+            fallback_result = _fallback_result(disease_type)
+            fallback_result["circuit_open"] = True
+            return fallback_result
+
+        # Shared Groq client (keep-alive connection pool); failing to create one (e.g. no
+        # API key) counts against the breaker like a failed call
+        try:
+            client = get_groq_client()
+        except Exception:
+            breaker.record_failure(0.0)
+            raise
         
         # Construct prompt based on disease type
         if disease_type == 'skin':
@@ -52,48 +125,50 @@ Provide a response in the following JSON format:
 
 Be professional, accurate, and always recommend consulting an ophthalmologist for proper diagnosis."""
         
-        print("\n" + "="*80)
-        print("🤖 Groq API Request (Official SDK):")
-        print("="*80)
-        print(f"Model: meta-llama/llama-4-maverick-17b-128e-instruct")
-        print(f"Image URL: {image_url}")
-        print(f"Disease Type: {disease_type}")
-        print("="*80)
+        logger.debug(
+            "Groq API request",
+            extra={'model': GROQ_MODEL, 'disease_type': disease_type, 'image_url': image_url if not image_url.startswith('data:') else '(inline)'}
+        )
         
         # Create chat completion with vision model
-        completion = client.chat.completions.create(
-            model="meta-llama/llama-4-maverick-17b-128e-instruct",
-            messages=[
-                {
-                    "role": "user",
-                    "content": [
-                        {
-                            "type": "text",
-                            "text": prompt_text
-                        },
+        request_start = time.perf_counter()
+        try:
+            with span('groq.chat_completion'):
+                completion = client.chat.completions.create(
+                    model=GROQ_MODEL,
+                    messages=[
                         {
-                            "type": "image_url",
-                            "image_url": {
-                                "url": image_url
-                            }
+                            "role": "user",
+                            "content": [
+                                {
+                                    "type": "text",
+                                    "text": prompt_text
+                                },
+                                {
+                                    "type": "image_url",
+                                    "image_url": {
+                                        "url": image_url
+                                    }
+                                }
+                            ]
                         }
-                    ]
-                }
-            ],
-            temperature=0.7,
-            max_completion_tokens=1024,
-            top_p=1,
-            stream=False
-        )
+                    ],
+                    temperature=0.7,
+                    max_completion_tokens=1024,
+                    top_p=1,
+                    stream=False
+                )
+        except Exception:
+            latency_ms = (time.perf_counter() - request_start) * 1000
+            http_utils.record_error('groq', latency_ms)
+            breaker.record_failure(latency_ms)
+            raise
+        breaker.record_success((time.perf_counter() - request_start) * 1000)
         
         # Get response
         ai_response = completion.choices[0].message.content
         
-        print("\n" + "="*80)
-        print("✅ Groq API Response:")
-        print("="*80)
-        print(ai_response)
-        print("="*80 + "\n")
+        log_payload(logger, "Groq API response", ai_response)
         
         # Try to parse JSON from response
         try:
@@ -119,50 +194,12 @@ Be professional, accurate, and always recommend consulting an ophthalmologist fo
                     "Monitor the condition for any changes",
                     "Maintain good hygiene practices"
                 ],
-                "description": ai_response[:200]
+                "description": ai_response[:200],
+                "is_fallback": True
             }
             
     except Exception as e:
-        print(f"\n❌ Groq API Error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Groq API error, using fallback analysis: %s", e)
         
         # Return mock data for now so scans can still be saved to database
-        print("⚠️  Groq API failed - Using fallback analysis")
-        
-        fallback_result = {
-            "disease_name": f"{'Skin' if disease_type == 'skin' else 'Eye'} Condition Detected",
-            "confidence": 75.0,
-            "severity": "medium",
-            "recommendations": [
-                f"Consult a {'dermatologist' if disease_type == 'skin' else 'ophthalmologist'} for accurate diagnosis",
-                "Monitor the condition for any changes",
-                "Maintain good hygiene practices",
-                "Keep the affected area clean and dry" if disease_type == 'skin' else "Avoid rubbing or touching the eyes"
-            ],
-            "description": f"Visual analysis of {'skin' if disease_type == 'skin' else 'eye'} image completed. Professional medical consultation recommended for proper diagnosis and treatment plan."
-        }
-        
-        print("\n" + "="*80)
-        print("📦 Fallback Analysis Result:")
-        print("="*80)
-        print(json.dumps(fallback_result, indent=2))
-        print("="*80 + "\n")
-        
-        return fallback_result
-        
-    except Exception as e:
-        print(f"\n❌ Groq analysis error: {e}")
-        
-        # Return basic fallback for any other errors
-        return {
-            "disease_name": "Analysis Pending",
-            "confidence": 70.0,
-            "severity": "medium",
-            "recommendations": [
-                "Consult a medical professional for accurate diagnosis",
-                "Monitor the condition",
-                "Seek medical attention if symptoms worsen"
-            ],
-            "description": "Image analysis encountered an issue. Please consult a healthcare professional."
-        }
+        return _fallback_result(disease_type)
@@ -0,0 +1,215 @@
+"""
+Shared outbound HTTP layer for all upstream APIs (Groq, Gemini, SerpAPI, Supabase)
+
+One long-lived keep-alive connection pool per upstream, bounded pool sizes,
+connect/read timeouts and jittered-backoff retries for idempotent calls.
+Per-upstream counters (requests, errors, new connections, latency) are kept
+for the /api/health/upstreams endpoint.
+"""
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from config import Config
+from utils.metrics_utils import observe_span, observe_upstream
+import requests
+import threading
+import time
+
+# Read timeouts per upstream, seconds
+READ_TIMEOUTS = {
+    'groq': Config.GROQ_TIMEOUT,
+    'gemini': Config.GEMINI_TIMEOUT,
+    'serpapi': Config.SERPAPI_TIMEOUT,
+    'supabase': Config.SUPABASE_TIMEOUT,
+    'firebase': Config.FIREBASE_TIMEOUT
+}
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_lock = threading.Lock()
+_sessions = {}
+_stats = {}
+
+class UpstreamStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self.new_connections = 0
+        self.status_counts = {}
+        self.total_latency_ms = 0.0
+        self.max_latency_ms = 0.0
+
+    def record(self, latency_ms, status=None, error=False):
+        with self.lock:
+            self.requests += 1
+            self.total_latency_ms += latency_ms
+            self.max_latency_ms = max(self.max_latency_ms, latency_ms)
+            if error:
+                self.errors += 1
+            if status is not None:
+                status_class = f"{status // 100}xx"
+                self.status_counts[status_class] = self.status_counts.get(status_class, 0) + 1
+
+    def record_connection(self):
+        with self.lock:
+            self.new_connections += 1
+
+def _get_stats(upstream):
+    stats = _stats.get(upstream)
+    if stats is None:
+        with _lock:
+            stats = _stats.setdefault(upstream, UpstreamStats())
+    return stats
+
+def get_timeout(upstream):
+    """(connect, read) timeout tuple for requests"""
+    return (Config.HTTP_CONNECT_TIMEOUT, READ_TIMEOUTS.get(upstream, Config.HTTP_DEFAULT_TIMEOUT))
+
+def _build_retry():
+    # urllib3 only retries read errors/statuses for idempotent methods (not POST);
+    # connect errors are retried for every method since nothing was sent yet
+    return Retry(
+        total=Config.HTTP_MAX_RETRIES,
+        backoff_factor=Config.HTTP_BACKOFF_FACTOR,
+        backoff_jitter=Config.HTTP_BACKOFF_JITTER,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+def get_session(upstream):
+    """Long-lived requests.Session (keep-alive pool) for an upstream"""
+    session = _sessions.get(upstream)
+    if session is not None:
+        return session
+
+    with _lock:
+        session = _sessions.get(upstream)
+        if session is None:
+            adapter = HTTPAdapter(
+                pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                pool_maxsize=Config.HTTP_POOL_MAXSIZE,
+                max_retries=_build_retry(),
+                pool_block=False
+            )
+            session = requests.Session()
+            session.mount('https://', adapter)
+            session.mount('http://', adapter)
+            _sessions[upstream] = session
+    return session
+
+def _record(upstream, stats, seconds, status=None, error=False):
+    latency_ms = seconds * 1000
+    stats.record(latency_ms, status=status, error=error or (status is not None and status >= 500))
+    observe_upstream(upstream, latency_ms, status)
+    observe_span(f"upstream.{upstream}", seconds)
+
+def request(upstream, method, url, **kwargs):
+    """Send a request through the upstream's pooled session and record its latency"""
+    kwargs.setdefault('timeout', get_timeout(upstream))
+    stats = _get_stats(upstream)
+    start = time.perf_counter()
+
+    try:
+        response = get_session(upstream).request(method, url, **kwargs)
+    except requests.exceptions.RequestException:
+        _record(upstream, stats, time.perf_counter() - start, error=True)
+        raise
+
+    _record(upstream, stats, time.perf_counter() - start, status=response.status_code)
+    return response
+
+def get(upstream, url, **kwargs):
+    return request(upstream, 'GET', url, **kwargs)
+
+def post(upstream, url, **kwargs):
+    return request(upstream, 'POST', url, **kwargs)
+
+def httpx_limits():
+    import httpx
+
+    return httpx.Limits(
+        max_connections=Config.HTTP_POOL_MAXSIZE,
+        max_keepalive_connections=Config.HTTP_POOL_MAXSIZE,
+        keepalive_expiry=Config.HTTP_KEEPALIVE_EXPIRY
+    )
+
+def httpx_timeout(upstream, read=None):
+    import httpx
+
+    read = READ_TIMEOUTS.get(upstream, Config.HTTP_DEFAULT_TIMEOUT) if read is None else read
+    return httpx.Timeout(read, connect=Config.HTTP_CONNECT_TIMEOUT)
+
+def instrument_httpx_client(client, upstream):
+    """Attach latency and new-connection counters to an httpx.Client owned by an SDK"""
+    stats = _get_stats(upstream)
+
+    def on_connection_event(event_name, info):
+        if event_name == 'connection.connect_tcp.complete':
+            stats.record_connection()
+
+    def on_request(req):
+        req.extensions['trace'] = on_connection_event
+        req.extensions['upstream_start'] = time.perf_counter()
+
+    def on_response(resp):
+        start = resp.request.extensions.get('upstream_start')
+        if start is not None:
+            _record(upstream, stats, time.perf_counter() - start, status=resp.status_code)
+
+    hooks = client.event_hooks
+    hooks.setdefault('request', []).append(on_request)
+    hooks.setdefault('response', []).append(on_response)
+    client.event_hooks = hooks
+    return client
+
+def create_httpx_client(upstream):
+    """Pooled, instrumented httpx.Client for SDKs that accept one (e.g. Groq)"""
+    import httpx
+
+    client = httpx.Client(limits=httpx_limits(), timeout=httpx_timeout(upstream))
+    return instrument_httpx_client(client, upstream)
+
+def record_error(upstream, latency_ms):
+    """For SDK calls that fail before a response arrives (timeouts, connection errors)"""
+    _get_stats(upstream).record(latency_ms, error=True)
+    observe_upstream(upstream, latency_ms)
+
+def _pooled_connections(upstream):
+    """New connections opened by a requests session's urllib3 pools"""
+    session = _sessions.get(upstream)
+    if session is None:
+        return 0
+
+    total = 0
+    for adapter in session.adapters.values():
+        pools = adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+    return total
+
+def get_upstream_stats():
+    """Per-upstream request, error, connection-reuse and latency counters"""
+    result = {}
+    for upstream, stats in list(_stats.items()):
+        with stats.lock:
+            requests_count = stats.requests
+            new_connections = stats.new_connections
+            snapshot = {
+                'requests': requests_count,
+                'errors': stats.errors,
+                'status_counts': dict(stats.status_counts),
+                'avg_latency_ms': round(stats.total_latency_ms / requests_count, 2) if requests_count else 0.0,
+                'max_latency_ms': round(stats.max_latency_ms, 2)
+            }
+
+        new_connections += _pooled_connections(upstream)
+        snapshot['new_connections'] = new_connections
+        snapshot['reused_connections'] = max(requests_count - new_connections, 0)
+        snapshot['connection_reuse_ratio'] = round(snapshot['reused_connections'] / requests_count, 4) if requests_count else 0.0
+        result[upstream] = snapshot
+
+    return result
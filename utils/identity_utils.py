@@ -0,0 +1,101 @@
+"""
+Firebase UID -> user resolution shared by all routes
+
+Handlers need the database id of the caller (or of the user in the URL)
+before doing real work. resolve_user() answers that from a bounded
+in-process TTL cache and only queries `users` on a miss. require_auth
+resolves the token's user once and attaches it as request.identity.
+
+The cache is filled by /api/auth/verify and /api/auth/register. Any ORM
+update or delete of a User row drops its entry in this process (mapper
+events below), so a changed user is never served from here; bulk
+query().update()/delete() bypasses those events and must call forget_user().
+Other worker processes see a change when their entry expires
+(IDENTITY_CACHE_TTL). A user's id never changes, so only name and email can
+be briefly stale there. Unknown UIDs are not cached, so a user is found as
+soon as they register.
+"""
+from sqlalchemy import event
+from config import Config
+from models import User
+from utils.cache_utils import TTLCache
+from utils.metrics_utils import register_collector, span
+import logging
+
+logger = logging.getLogger(__name__)
+
+_cache = TTLCache(maxsize=Config.IDENTITY_CACHE_MAX_ENTRIES, ttl=Config.IDENTITY_CACHE_TTL)
+
+class Identity:
+    """Read-only snapshot of a User row, safe to share between requests"""
+
+    __slots__ = ('id', 'uid', 'name', 'email', 'created_at')
+
+    def __init__(self, id, uid, name, email, created_at=None):
+        self.id = id
+        self.uid = uid
+        self.name = name
+        self.email = email
+        self.created_at = created_at
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.uid, user.name, user.email, user.created_at)
+
+    def to_dict(self):
+        return {
+            'id': str(self.id),
+            'uid': self.uid,
+            'name': self.name,
+            'email': self.email,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+def resolve_user(db, uid):
+    """Identity for a Firebase UID, or None if no such user is registered"""
+    if not uid:
+        return None
+
+    if Config.IDENTITY_CACHE_ENABLED:
+        identity = _cache.get(uid)
+        if identity is not None:
+            return identity
+
+    with span('db.user_lookup'):
+        row = db.query(User.id, User.uid, User.name, User.email, User.created_at).filter(User.uid == uid).first()
+    if row is None:
+        return None
+    return remember_user(row)
+
+def remember_user(user):
+    """Cache (or refresh) a user just created, updated or loaded; returns its Identity"""
+    identity = Identity.from_user(user)
+    if Config.IDENTITY_CACHE_ENABLED:
+        _cache.set(identity.uid, identity)
+    return identity
+
+def forget_user(uid):
+    """Drop a cached user, e.g. after deleting it"""
+    _cache.delete(uid)
+
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _forget_changed_user(mapper, connection, target):
+    # At flush time: a rolled-back change only costs a cache miss
+    forget_user(target.uid)
+
+def get_identity_cache_stats():
+    return _cache.stats()
+
+@register_collector
+def identity_metric_lines():
+    stats = _cache.stats()
+    return [
+        "# HELP identity_cache_events_total Firebase UID -> user lookups answered from the cache (hits) or the database (misses)",
+        "# TYPE identity_cache_events_total counter",
+        f'identity_cache_events_total{{event="hits"}} {stats["hits"]}',
+        f'identity_cache_events_total{{event="misses"}} {stats["misses"]}',
+        "# HELP identity_cache_entries Users in the identity cache",
+        "# TYPE identity_cache_entries gauge",
+        f"identity_cache_entries {stats['size']}"
+    ]
@@ -0,0 +1,127 @@
+"""
+Image preprocessing for the scan pipeline (Pillow)
+
+Applies EXIF orientation, strips metadata, downscales to a bounded longest
+edge and re-encodes to a quality-tuned JPEG/WebP before the image is stored
+or sent to the vision model.
+"""
+from PIL import Image, ImageOps, UnidentifiedImageError
+from config import Config
+from utils.upload_utils import stream_size
+import io
+
+OUTPUT_FORMATS = {
+    'JPEG': ('image/jpeg', 'jpg'),
+    'WEBP': ('image/webp', 'webp')
+}
+
+class ImageValidationError(Exception):
+    """The upload is not a decodable image"""
+
+def _flatten(img, output_format):
+    """Convert to a mode the output encoder accepts; JPEG has no alpha channel"""
+    if output_format == 'JPEG':
+        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
+            rgba = img.convert('RGBA')
+            background = Image.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            return background
+        if img.mode != 'RGB':
+            return img.convert('RGB')
+        return img
+
+    if img.mode not in ('RGB', 'RGBA'):
+        return img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+    return img
+
+def _encode(img, output_format, quality):
+    # Re-encoding without passing exif/icc info drops all metadata
+    output = io.BytesIO()
+    if output_format == 'JPEG':
+        img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(output, format='WEBP', quality=quality, method=4)
+    return output.getvalue()
+
+def normalize_image(image, max_edge=None, output_format=None, quality=None):
+    """
+    Normalize an uploaded image (bytes or a seekable stream; streams are decoded
+    straight from the spooled file without reading the whole upload into memory).
+    Returns (data, content_type, extension, stats) where stats holds before/after
+    byte counts and pixel dimensions.
+    """
+    max_edge = max_edge or Config.IMAGE_MAX_EDGE
+    output_format = (output_format or Config.IMAGE_OUTPUT_FORMAT).upper()
+    quality = quality or Config.IMAGE_QUALITY
+
+    if output_format not in OUTPUT_FORMATS:
+        output_format = 'JPEG'
+
+    try:
+        if isinstance(image, (bytes, bytearray)):
+            original_size = len(image)
+            img = Image.open(io.BytesIO(image))
+        else:
+            original_size = stream_size(image)
+            image.seek(0)
+            img = Image.open(image)
+        original_format = img.format
+        original_width, original_height = img.size
+
+        # Let the JPEG decoder do most of the downscaling (DCT scaling) instead of decoding full size
+        img.draft('RGB', (max_edge, max_edge))
+
+        img = ImageOps.exif_transpose(img)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageValidationError(f"Invalid image file: {e}")
+
+    if max(img.size) > max_edge:
+        img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+    img = _flatten(img, output_format)
+    data = _encode(img, output_format, quality)
+    content_type, extension = OUTPUT_FORMATS[output_format]
+
+    stats = {
+        'original_bytes': original_size,
+        'original_width': original_width,
+        'original_height': original_height,
+        'original_format': original_format,
+        'stored_bytes': len(data),
+        'stored_width': img.size[0],
+        'stored_height': img.size[1],
+        'stored_format': output_format
+    }
+
+    return data, content_type, extension, stats
+
+def render_renditions(image, sizes, output_format=None, quality=None):
+    """
+    Downscaled copies of an image (bytes) for each {name: longest_edge} in sizes.
+    The image is decoded once; each rendition is resized from the next larger one.
+    Images smaller than a size are not upscaled.
+    Returns {name: (data, content_type, extension, (width, height))}.
+    """
+    output_format = (output_format or Config.IMAGE_OUTPUT_FORMAT).upper()
+    quality = quality or Config.IMAGE_QUALITY
+    if output_format not in OUTPUT_FORMATS:
+        output_format = 'JPEG'
+    content_type, extension = OUTPUT_FORMATS[output_format]
+
+    try:
+        img = Image.open(io.BytesIO(image))
+        largest = max(sizes.values())
+        img.draft('RGB', (largest, largest))
+        img = ImageOps.exif_transpose(img)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise ImageValidationError(f"Invalid image file: {e}")
+
+    img = _flatten(img, output_format)
+
+    renditions = {}
+    for name, edge in sorted(sizes.items(), key=lambda item: item[1], reverse=True):
+        if max(img.size) > edge:
+            img.thumbnail((edge, edge), Image.Resampling.LANCZOS)
+        renditions[name] = (_encode(img, output_format, quality), content_type, extension, img.size)
+
+    return renditions
@@ -0,0 +1,61 @@
+"""
+Analysis backend registry
+
+The scan pipeline calls analyze_disease() here instead of a specific model.
+The backend is picked per disease type (ANALYSIS_BACKEND_SKIN / _EYE):
+  - groq:  remote vision model; takes an image URL (public or base64 data URL)
+  - local: in-process CPU classifier (utils.local_inference_utils); takes image bytes
+"""
+from config import Config
+from utils import groq_utils
+from utils.local_inference_utils import LocalBackend
+import threading
+
+class GroqBackend:
+    """Remote Groq vision model (the default)"""
+
+    name = 'groq'
+    accepts_bytes = False
+
+    def cache_identity(self, disease_type):
+        return groq_utils.PROMPT_VERSION, groq_utils.GROQ_MODEL
+
+    def is_available(self):
+        return groq_utils.is_groq_available()
+
+    def analyze(self, image_url, disease_type):
+        return groq_utils.analyze_disease(image_url, disease_type)
+
+_lock = threading.Lock()
+_backend_factories = {}
+_backends = {}
+
+def register_backend(name, factory):
+    """Make a backend selectable by name; factory() is called once per process"""
+    with _lock:
+        _backend_factories[name] = factory
+        _backends.pop(name, None)
+
+def get_backend_name(disease_type):
+    return (getattr(Config, f"ANALYSIS_BACKEND_{disease_type.upper()}", None) or 'groq').lower()
+
+def get_backend(disease_type):
+    """Backend instance configured for a disease type"""
+    name = get_backend_name(disease_type)
+    backend = _backends.get(name)
+    if backend is None:
+        with _lock:
+            backend = _backends.get(name)
+            if backend is None:
+                factory = _backend_factories.get(name)
+                if factory is None:
+                    raise ValueError(f"Unknown analysis backend '{name}' for {disease_type}")
+                backend = _backends[name] = factory()
+    return backend
+
+def analyze_disease(image, disease_type):
+    """Analyze with the configured backend; image is a URL for groq, bytes for local"""
+    return get_backend(disease_type).analyze(image, disease_type)
+
+register_backend('groq', GroqBackend)
+register_backend('local', LocalBackend)
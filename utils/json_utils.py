@@ -0,0 +1,59 @@
+"""
+JSON provider for Flask responses and request bodies
+
+With orjson installed (pip install orjson) and JSON_PROVIDER 'auto' or
+'orjson', responses are encoded by orjson straight to bytes: several times
+faster than the stdlib encoder on long lists, with the same output (sorted
+keys, compact separators, indented in debug) except that non-ASCII text is
+sent as UTF-8 instead of \\u escapes. orjson also encodes UUID, datetime,
+date and time natively, in the same format as str() / isoformat(), so list
+handlers can pass to_dict(native=NATIVE_TYPES) and skip those conversions in
+their per-row loops. JSON_PROVIDER=stdlib keeps Flask's DefaultJSONProvider.
+"""
+from flask.json.provider import DefaultJSONProvider
+from config import Config
+import logging
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+class OrjsonJSONProvider(DefaultJSONProvider):
+    """DefaultJSONProvider with orjson doing the encoding and decoding"""
+
+    def _options(self, indent=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._options(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+def _select_provider():
+    if Config.JSON_PROVIDER == 'stdlib':
+        return DefaultJSONProvider
+    if orjson is None:
+        if Config.JSON_PROVIDER == 'orjson':
+            raise RuntimeError("JSON_PROVIDER=orjson requires orjson (pip install orjson)")
+        return DefaultJSONProvider
+    return OrjsonJSONProvider
+
+JSONProvider = _select_provider()
+
+# Whether responses may carry UUID/datetime values for the provider to encode
+NATIVE_TYPES = JSONProvider is OrjsonJSONProvider
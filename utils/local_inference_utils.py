@@ -0,0 +1,241 @@
+"""
+Local CPU inference backend for disease analysis
+
+Runs an image classifier in-process instead of calling a remote model. Two
+model formats are supported:
+  - .onnx: run with ONNX Runtime (pip install onnxruntime)
+  - .npz:  a small NumPy MLP; arrays w0, b0, w1, b1, ... (ReLU between layers)
+
+Both take an NCHW float32 batch and return one score per class. Class labels
+and preprocessing settings live in a JSON file next to the model (skin.onnx ->
+skin.json):
+
+    {
+        "version": "2024-06",
+        "input_size": 224,
+        "mean": [0.485, 0.456, 0.406],
+        "std": [0.229, 0.224, 0.225],
+        "output": "logits",
+        "labels": [
+            {"disease_name": "Eczema", "severity": "medium", "description": "...", "recommendations": ["..."]},
+            "Healthy skin"
+        ]
+    }
+
+Models are loaded once per worker process. Concurrent requests are grouped
+into batches of up to LOCAL_BATCH_SIZE images for one forward pass.
+"""
+from concurrent.futures import Future
+from config import Config
+from PIL import Image
+import io
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEAN = (0.485, 0.456, 0.406)
+DEFAULT_STD = (0.229, 0.224, 0.225)
+
+DEFAULT_RECOMMENDATIONS = {
+    'skin': ['Consult a dermatologist for accurate diagnosis', 'Monitor the condition for any changes'],
+    'eye': ['Consult an ophthalmologist for accurate diagnosis', 'Monitor the condition for any changes']
+}
+
+class LocalModelError(Exception):
+    """The local model is not configured or could not be loaded"""
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise LocalModelError("The local analysis backend requires numpy (pip install numpy)")
+    return numpy
+
+def softmax(scores):
+    np = _import_numpy()
+    shifted = scores - scores.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+class LocalClassifier:
+    """A loaded model plus its labels and preprocessing settings"""
+
+    def __init__(self, model_path):
+        np = _import_numpy()
+        if not model_path or not os.path.exists(model_path):
+            raise LocalModelError(f"Local model not found: {model_path}")
+
+        metadata_path = os.path.splitext(model_path)[0] + '.json'
+        if not os.path.exists(metadata_path):
+            raise LocalModelError(f"Local model labels not found: {metadata_path}")
+        with open(metadata_path) as f:
+            metadata = json.load(f)
+
+        self.model_path = model_path
+        self.labels = [label if isinstance(label, dict) else {'disease_name': label} for label in metadata['labels']]
+        self.input_size = int(metadata.get('input_size', 224))
+        self.mean = np.array(metadata.get('mean', DEFAULT_MEAN), dtype=np.float32).reshape(3, 1, 1)
+        self.std = np.array(metadata.get('std', DEFAULT_STD), dtype=np.float32).reshape(3, 1, 1)
+        self.outputs_logits = metadata.get('output', 'logits') == 'logits'
+        self.model_name = f"local:{os.path.basename(model_path)}:{metadata.get('version', '1')}"
+
+        if model_path.endswith('.onnx'):
+            self._load_onnx(model_path)
+        else:
+            self._load_npz(model_path)
+
+    def _load_onnx(self, model_path):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise LocalModelError("ONNX models require onnxruntime (pip install onnxruntime)")
+
+        options = onnxruntime.SessionOptions()
+        if Config.LOCAL_INFERENCE_THREADS > 0:
+            options.intra_op_num_threads = Config.LOCAL_INFERENCE_THREADS
+        session = onnxruntime.InferenceSession(model_path, sess_options=options, providers=['CPUExecutionProvider'])
+        input_name = session.get_inputs()[0].name
+        self._forward = lambda batch: session.run(None, {input_name: batch})[0]
+
+    def _load_npz(self, model_path):
+        np = _import_numpy()
+        with np.load(model_path) as data:
+            layers = []
+            i = 0
+            while f"w{i}" in data:
+                layers.append((data[f"w{i}"].astype(np.float32), data[f"b{i}"].astype(np.float32)))
+                i += 1
+        if not layers:
+            raise LocalModelError(f"No layers (w0, b0, ...) in {model_path}")
+
+        def forward(batch):
+            x = batch.reshape(batch.shape[0], -1)
+            for index, (weights, bias) in enumerate(layers):
+                x = x @ weights + bias
+                if index < len(layers) - 1:
+                    x = np.maximum(x, 0)
+            return x
+
+        self._forward = forward
+
+    def preprocess(self, image_bytes):
+        """Image bytes -> normalized CHW float32 tensor"""
+        np = _import_numpy()
+        img = Image.open(io.BytesIO(image_bytes))
+        img.draft('RGB', (self.input_size, self.input_size))
+        img = img.convert('RGB').resize((self.input_size, self.input_size), Image.Resampling.BILINEAR)
+        tensor = np.asarray(img, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return (tensor - self.mean) / self.std
+
+    def predict(self, batch):
+        """NCHW batch -> class probabilities, one row per image"""
+        np = _import_numpy()
+        scores = np.asarray(self._forward(batch), dtype=np.float32)
+        return softmax(scores) if self.outputs_logits else scores
+
+    def to_result(self, probabilities, disease_type):
+        """Same shape as the Groq analysis result"""
+        index = int(probabilities.argmax())
+        label = self.labels[index]
+        return {
+            'disease_name': label['disease_name'],
+            'confidence': round(float(probabilities[index]), 4),
+            'severity': label.get('severity', 'medium'),
+            'recommendations': label.get('recommendations', DEFAULT_RECOMMENDATIONS.get(disease_type, [])),
+            'description': label.get('description', f"Predicted by the local {disease_type} classifier.")
+        }
+
+class _MicroBatcher:
+    """Groups tensors submitted by concurrent requests into one forward pass"""
+
+    def __init__(self, classifier):
+        self.classifier = classifier
+        self.batch_size = max(Config.LOCAL_BATCH_SIZE, 1)
+        self.wait = Config.LOCAL_BATCH_WAIT_MS / 1000
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name='local-inference', daemon=True)
+        self._thread.start()
+
+    def submit(self, tensor):
+        future = Future()
+        self._queue.put((tensor, future))
+        return future
+
+    def _run(self):
+        np = _import_numpy()
+        while True:
+            pending = [self._queue.get()]
+            deadline = time.monotonic() + self.wait
+            while len(pending) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    pending.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                probabilities = self.classifier.predict(np.stack([tensor for tensor, _ in pending]))
+                for (_, future), row in zip(pending, probabilities):
+                    future.set_result(row)
+            except Exception as e:
+                for _, future in pending:
+                    future.set_exception(e)
+
+class LocalBackend:
+    """Analysis backend running the per-disease-type classifier on this machine"""
+
+    name = 'local'
+    accepts_bytes = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._classifiers = {}
+        self._batchers = {}
+
+    def _model_path(self, disease_type):
+        return getattr(Config, f"LOCAL_MODEL_{disease_type.upper()}_PATH", None)
+
+    def get_classifier(self, disease_type):
+        """Load the model for a disease type on first use (once per worker process)"""
+        classifier = self._classifiers.get(disease_type)
+        if classifier is None:
+            with self._lock:
+                classifier = self._classifiers.get(disease_type)
+                if classifier is None:
+                    start = time.perf_counter()
+                    classifier = LocalClassifier(self._model_path(disease_type))
+                    self._batchers[disease_type] = _MicroBatcher(classifier)
+                    self._classifiers[disease_type] = classifier
+                    logger.info("Loaded local %s model %s in %.0fms", disease_type, classifier.model_name, (time.perf_counter() - start) * 1000)
+        return classifier
+
+    def cache_identity(self, disease_type):
+        return 'local', self.get_classifier(disease_type).model_name
+
+    def is_available(self):
+        return True
+
+    def analyze(self, image_bytes, disease_type):
+        classifier = self.get_classifier(disease_type)
+        tensor = classifier.preprocess(image_bytes)
+        probabilities = self._batchers[disease_type].submit(tensor).result()
+        return classifier.to_result(probabilities, disease_type)
+
+    def analyze_many(self, images, disease_type):
+        """Direct batched inference for a list of image bytes"""
+        np = _import_numpy()
+        classifier = self.get_classifier(disease_type)
+        batch_size = max(Config.LOCAL_BATCH_SIZE, 1)
+        results = []
+        for offset in range(0, len(images), batch_size):
+            chunk = images[offset:offset + batch_size]
+            batch = np.stack([classifier.preprocess(image) for image in chunk])
+            results.extend(classifier.to_result(row, disease_type) for row in classifier.predict(batch))
+        return results
@@ -0,0 +1,168 @@
+"""
+Structured, non-blocking logging
+
+Modules log through the standard library (`logger = logging.getLogger(__name__)`).
+init_logging() installs one handler on the root logger that only puts the
+record on a bounded queue; a background listener thread formats and writes
+it to stdout. Request threads never wait on stdout: when the queue is full
+the record is dropped and counted (log_records_dropped_total in /api/metrics).
+
+Levels are set globally with LOG_LEVEL and per module (or package prefix)
+with LOG_LEVELS. Large payloads (model output, upstream responses, result
+lists) go through log_payload(), which is skipped entirely unless its level
+is enabled, keeps only a LOG_PAYLOAD_SAMPLE_RATE share of calls and
+truncates to LOG_PAYLOAD_MAX_CHARS.
+"""
+from logging.handlers import QueueHandler, QueueListener
+from config import Config
+from utils.metrics_utils import register_collector
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import threading
+
+_lock = threading.Lock()
+_listener = None
+_handler = None
+
+# LogRecord attributes; anything else on a record came from `extra=` and is logged as a field
+_RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+def _extra_fields(record):
+    return {key: value for key, value in record.__dict__.items() if key not in _RECORD_ATTRS}
+
+class TextFormatter(logging.Formatter):
+    """`time level logger: message key=value ...`"""
+
+    def __init__(self):
+        super().__init__('%(asctime)s %(levelname)-7s %(name)s: %(message)s')
+
+    def format(self, record):
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += ' ' + ' '.join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record.getMessage()
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exc'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Hands records to the listener thread; drops them instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve %-args and the traceback now (they may change or disappear once the
+        # caller moves on) but leave the formatting to the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+def parse_levels(spec):
+    """'utils.groq_utils=DEBUG,routes=WARNING' -> {'utils.groq_utils': 'DEBUG', 'routes': 'WARNING'}"""
+    levels = {}
+    for item in spec.split(','):
+        name, _, level = item.partition('=')
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+def init_logging(stream=None):
+    """Install the queue handler on the root logger and start the writer thread (once per process)"""
+    global _listener, _handler
+
+    with _lock:
+        if _listener is not None:
+            return
+
+        formatter = JSONFormatter() if Config.LOG_FORMAT.lower() == 'json' else TextFormatter()
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(formatter)
+
+        _handler = NonBlockingQueueHandler(queue.Queue(maxsize=Config.LOG_QUEUE_SIZE))
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(Config.LOG_LEVEL.upper())
+        for name, level in parse_levels(Config.LOG_LEVELS).items():
+            logging.getLogger(name).setLevel(level)
+
+        _listener = QueueListener(_handler.queue, output)
+        _listener.start()
+        atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    global _listener
+
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        logging.getLogger().removeHandler(_handler)
+        _listener = None
+
+def _serialize(payload):
+    if isinstance(payload, (str, bytes)):
+        return payload if isinstance(payload, str) else payload.decode('utf-8', 'replace')
+    return json.dumps(payload, default=str, ensure_ascii=False, separators=(',', ':'))
+
+def truncate(text, max_chars=None):
+    max_chars = Config.LOG_PAYLOAD_MAX_CHARS if max_chars is None else max_chars
+    if len(text) <= max_chars:
+        return text
+    return f"{text[:max_chars]}... ({len(text) - max_chars} more chars)"
+
+def log_payload(logger, message, payload, level=logging.DEBUG, sample_rate=None):
+    """
+    Log a large payload, sampled and truncated. Nothing is serialized unless the
+    level is enabled for the logger and the call is sampled.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    rate = Config.LOG_PAYLOAD_SAMPLE_RATE if sample_rate is None else sample_rate
+    if rate < 1 and random.random() >= rate:
+        return
+
+    text = _serialize(payload)
+    logger.log(level, "%s: %s", message, truncate(text), extra={'payload_chars': len(text), 'sample_rate': rate})
+
+def dropped_records():
+    return _handler.dropped if _handler is not None else 0
+
+@register_collector
+def logging_metric_lines():
+    return [
+        "# HELP log_records_dropped_total Log records dropped because the log queue was full",
+        "# TYPE log_records_dropped_total counter",
+        f"log_records_dropped_total {dropped_records()}"
+    ]
@@ -0,0 +1,215 @@
+"""
+Request and span metrics in Prometheus text format (GET /api/metrics)
+
+Every request is timed by Flask hooks, labeled by blueprint, endpoint, method
+and status. Internal work (Firebase verify, user lookup, Supabase upload,
+upstream API calls, DB queries and commits, JSON serialization, scan pipeline
+stages, response compression) is timed with span() into a second histogram labeled by span name and
+the endpoint that triggered it.
+
+Histograms are fixed-bucket counters behind one lock each; recording a
+value is a bisect plus a few integer adds, so the per-request overhead stays
+in the microseconds.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import Config
+from utils.json_utils import JSONProvider
+import contextvars
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds; covers sub-millisecond cache hits up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Endpoint of the request being served; copied into pipeline stage threads
+_current_endpoint = contextvars.ContextVar('metrics_endpoint', default='background')
+
+_registry = []
+_collectors = []
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        _registry.append(self)
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            values = dict(self._values)
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        for labelvalues, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}  # labelvalues -> [bucket counts..., +Inf count, sum]
+        _registry.append(self)
+
+    def observe(self, value, *labelvalues):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        with self._lock:
+            snapshot = {labelvalues: list(series) for labelvalues, series in self._series.items()}
+
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for labelvalues, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), series[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {series[-1]!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+REQUEST_DURATION = Histogram(
+    'http_request_duration_seconds', 'Request wall time',
+    ('blueprint', 'endpoint', 'method', 'status')
+)
+SPAN_DURATION = Histogram(
+    'span_duration_seconds', 'Wall time of internal spans',
+    ('span', 'endpoint')
+)
+UPSTREAM_DURATION = Histogram(
+    'upstream_request_duration_seconds', 'Outbound API call time by upstream and status class',
+    ('upstream', 'status')
+)
+
+def register_collector(func):
+    """func() -> list of exposition lines, evaluated on every scrape"""
+    _collectors.append(func)
+    return func
+
+def observe_span(name, seconds):
+    if Config.METRICS_ENABLED:
+        SPAN_DURATION.observe(seconds, name, _current_endpoint.get())
+
+@contextmanager
+def span(name):
+    """Time a block as an internal span of the current request"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_span(name, time.perf_counter() - start)
+
+def observe_upstream(upstream, latency_ms, status=None):
+    if Config.METRICS_ENABLED:
+        status_class = f"{status // 100}xx" if status is not None else 'error'
+        UPSTREAM_DURATION.observe(latency_ms / 1000, upstream, status_class)
+
+def render_metrics():
+    lines = []
+    for metric in list(_registry):
+        lines.extend(metric.collect())
+    for collector in list(_collectors):
+        try:
+            lines.extend(collector())
+        except Exception as e:
+            logger.error("Metrics collector error: %s", e)
+    return '\n'.join(lines) + '\n'
+
+class InstrumentedSession(Session):
+    """Session that records every commit as a db.commit span"""
+
+    def commit(self):
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            observe_span('db.commit', time.perf_counter() - start)
+
+class InstrumentedJSONProvider(JSONProvider):
+    """Records JSON response serialization as a serialize span"""
+
+    def response(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return super().response(*args, **kwargs)
+        finally:
+            observe_span('serialize', time.perf_counter() - start)
+
+def instrument_engine(engine):
+    """Record every SQL statement as a db.query span"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('metrics_query_start', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        starts = conn.info.get('metrics_query_start')
+        if starts:
+            observe_span('db.query', time.perf_counter() - starts.pop())
+
+    return engine
+
+def init_metrics(app):
+    """Time every request of the Flask app"""
+    if not Config.METRICS_ENABLED:
+        return
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_start = time.perf_counter()
+        g.metrics_token = _current_endpoint.set(request.endpoint or 'unmatched')
+
+    @app.after_request
+    def record_request(response):
+        start = g.pop('metrics_start', None)
+        if start is not None:
+            REQUEST_DURATION.observe(
+                time.perf_counter() - start,
+                request.blueprint or '',
+                request.endpoint or 'unmatched',
+                request.method,
+                str(response.status_code)
+            )
+        token = g.pop('metrics_token', None)
+        if token is not None:
+            _current_endpoint.reset(token)
+        return response
@@ -0,0 +1,149 @@
+"""
+Small staged pipeline engine
+
+A pipeline is an ordered list of stages. Each stage names the stages it
+depends on; every round, all stages whose dependencies have finished are
+started together, so independent stages run concurrently on the executor.
+Stages that use the request's database session are marked inline and
+always run on the calling thread.
+
+Each stage records its wall time (`<name>_ms` in ctx.timings, and the
+stage.<name> metrics span) and outcome (ok, skipped, error) in ctx.stages.
+"""
+from utils.metrics_utils import observe_span
+import contextvars
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OK = 'ok'
+SKIPPED = 'skipped'
+ERROR = 'error'
+
+class PipelineContext:
+    """Attribute bag passed to every stage, plus the recorded timings and outcomes"""
+
+    def __init__(self, **values):
+        self.timings = {}
+        self.stages = {}
+        self.skip = set()
+        self._lock = threading.Lock()
+        self.__dict__.update(values)
+
+    def record(self, stage, outcome, elapsed_ms=None):
+        with self._lock:
+            self.stages[stage.name] = outcome
+            if elapsed_ms is not None:
+                self.timings[stage.timing_key] = elapsed_ms
+        if elapsed_ms is not None:
+            observe_span(f"stage.{stage.name}", elapsed_ms / 1000)
+
+class Stage:
+    """
+    name:     unique stage name
+    func:     func(ctx), stores its results on ctx
+    requires: stage names, or a callable(ctx) returning them (decided when the stage is scheduled)
+    when:     optional predicate(ctx); the stage is skipped when it returns False
+    inline:   always run on the calling thread (stages sharing the request's DB session)
+    required: errors fail the pipeline; errors in other stages are logged and the run continues
+    """
+
+    def __init__(self, name, func, requires=(), when=None, inline=False, required=True, timing_key=None):
+        self.name = name
+        self.func = func
+        self.requires = requires
+        self.when = when
+        self.inline = inline
+        self.required = required
+        self.timing_key = timing_key or f"{name}_ms"
+
+    def dependencies(self, ctx):
+        return tuple(self.requires(ctx) if callable(self.requires) else self.requires)
+
+class Pipeline:
+    def __init__(self, stages, executor=None):
+        # Dependencies on stages left out of this pipeline count as satisfied, so
+        # shorter pipelines can reuse the same stage definitions
+        names = [stage.name for stage in stages]
+        for index, stage in enumerate(stages):
+            if stage.name in names[:index]:
+                raise ValueError(f"Duplicate pipeline stage '{stage.name}'")
+            if not callable(stage.requires):
+                later = set(stage.requires) & set(names[index:])
+                if later:
+                    raise ValueError(f"Stage '{stage.name}' depends on itself or later stages: {sorted(later)}")
+
+        self.stages = list(stages)
+        self.executor = executor
+
+    def _run_stage(self, stage, ctx):
+        if stage.name in ctx.skip or (stage.when is not None and not stage.when(ctx)):
+            ctx.record(stage, SKIPPED)
+            return
+
+        start = time.perf_counter()
+        try:
+            stage.func(ctx)
+        except Exception as e:
+            ctx.record(stage, ERROR, round((time.perf_counter() - start) * 1000, 2))
+            if stage.required:
+                raise
+            logger.warning("Pipeline stage '%s' failed (continuing): %s", stage.name, e)
+            return
+        ctx.record(stage, OK, round((time.perf_counter() - start) * 1000, 2))
+
+    def run(self, ctx):
+        """Run all stages; re-raises the first error of a required stage"""
+        start = time.perf_counter()
+        finished = set()
+        pending = list(self.stages)
+        names = {stage.name for stage in self.stages}
+
+        try:
+            while pending:
+                ready = [
+                    stage for stage in pending
+                    if all(dependency in finished or dependency not in names for dependency in stage.dependencies(ctx))
+                ]
+                if not ready:
+                    raise RuntimeError(f"Pipeline stages cannot be scheduled: {[stage.name for stage in pending]}")
+
+                inline = [stage for stage in ready if stage.inline]
+                pooled = [stage for stage in ready if not stage.inline]
+
+                # With nothing else to do on this thread, run one pooled stage here instead of handing it off
+                if not inline and pooled:
+                    inline.append(pooled.pop())
+                if self.executor is None:
+                    inline, pooled = pooled + inline, []
+
+                # Copy the context so spans in pool threads keep the request's endpoint label
+                futures = [
+                    self.executor.submit(contextvars.copy_context().run, self._run_stage, stage, ctx)
+                    for stage in pooled
+                ]
+
+                errors = []
+                for stage in inline:
+                    try:
+                        self._run_stage(stage, ctx)
+                    except Exception as e:
+                        errors.append(e)
+                        break
+                for future in futures:
+                    try:
+                        future.result()
+                    except Exception as e:
+                        errors.append(e)
+
+                finished.update(stage.name for stage in ready)
+                pending = [stage for stage in pending if stage.name not in finished]
+
+                if errors:
+                    raise errors[0]
+        finally:
+            ctx.timings['total_ms'] = round((time.perf_counter() - start) * 1000, 2)
+
+        return ctx
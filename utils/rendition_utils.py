@@ -0,0 +1,110 @@
+"""
+Thumbnail and medium renditions of stored scan images
+
+When a scan is saved, schedule_renditions() hands the image to a small
+background pool, so the request does not wait for it. The task resizes the
+image with Pillow (decoded once, see image_utils.render_renditions), uploads
+the copies next to the original in the scans bucket
+(`<original>_thumbnail.jpg`, `<original>_medium.jpg`) and stores their URLs
+on every Scan that points at that original.
+
+Renditions are keyed by the original's URL: scans that reuse an upload
+(analysis cache hits) share them, and a task whose original already has
+renditions just copies the URLs. backfill_renditions.py fills in older scans.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import or_
+from config import Config
+from models import Scan
+from utils.image_utils import render_renditions
+from utils.gevent_utils import run_blocking
+from utils.supabase_utils import upload_image_to_path, download_image, storage_path_from_url
+from utils.user_stats_utils import touch_stats_upsert
+import logging
+import posixpath
+
+logger = logging.getLogger(__name__)
+
+RENDITIONS = ('thumbnail', 'medium')
+
+_executor = ThreadPoolExecutor(
+    max_workers=Config.RENDITION_WORKERS,
+    thread_name_prefix='rendition'
+)
+
+def rendition_sizes():
+    return {
+        'thumbnail': Config.RENDITION_THUMBNAIL_EDGE,
+        'medium': Config.RENDITION_MEDIUM_EDGE
+    }
+
+def rendition_path(original_path, name, extension):
+    """'skin/<user>/20250101_120000_ab12cd34.jpg' -> 'skin/<user>/20250101_120000_ab12cd34_thumbnail.jpg'"""
+    stem, _ = posixpath.splitext(original_path)
+    return f"{stem}_{name}.{extension}"
+
+def create_renditions(image_url, image=None):
+    """
+    Generate and upload all renditions of a stored image.
+    image: the image bytes if at hand, otherwise the original is downloaded.
+    Returns {'thumbnail_url': ..., 'medium_url': ...}.
+    """
+    original_path = storage_path_from_url(image_url)
+    if original_path is None:
+        raise ValueError(f"Not a storage URL: {image_url}")
+
+    if image is None:
+        image = download_image(image_url)
+
+    rendered = run_blocking(render_renditions, image, rendition_sizes(), quality=Config.RENDITION_QUALITY)
+
+    urls = {}
+    for name, (data, content_type, extension, _) in rendered.items():
+        # Upsert: a retried or backfilled rendition overwrites the earlier copy
+        path = rendition_path(original_path, name, extension)
+        urls[f"{name}_url"] = upload_image_to_path(data, path, content_type, upsert=True)
+    return urls
+
+def find_renditions(db, image_url):
+    """Rendition URLs already stored for an original, or None"""
+    row = db.query(Scan.thumbnail_url, Scan.medium_url).filter(
+        Scan.image_url == image_url,
+        Scan.thumbnail_url.isnot(None)
+    ).first()
+    if row is None:
+        return None
+    return {'thumbnail_url': row.thumbnail_url, 'medium_url': row.medium_url}
+
+def store_renditions(db, image_url, urls):
+    """Set the rendition URLs on every scan of this original that has none yet; returns the row count"""
+    missing = db.query(Scan).filter(
+        Scan.image_url == image_url,
+        or_(Scan.thumbnail_url.is_(None), Scan.medium_url.is_(None))
+    )
+    user_ids = [row.user_id for row in missing.with_entities(Scan.user_id).distinct()]
+    updated = missing.update(urls, synchronize_session=False)
+    if updated:
+        # Their history pages change, so cached copies must not revalidate
+        db.execute(touch_stats_upsert(user_ids))
+    db.commit()
+    return updated
+
+def _generate(image_url, image):
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        urls = find_renditions(db, image_url) or create_renditions(image_url, image)
+        store_renditions(db, image_url, urls)
+        logger.debug("Renditions stored for %s", image_url)
+    except Exception as e:
+        db.rollback()
+        logger.warning("Rendition generation failed for %s: %s", image_url, e)
+    finally:
+        db.close()
+
+def schedule_renditions(image_url, image=None):
+    """Generate renditions for a saved scan's image in the background (no-op when disabled)"""
+    if not Config.RENDITIONS_ENABLED or not image_url:
+        return None
+    return _executor.submit(_generate, image_url, image)
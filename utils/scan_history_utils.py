@@ -0,0 +1,106 @@
+"""
+Scan history pages
+
+Pages are read newest first with keyset pagination on (timestamp, id): the
+next page starts after the last scan of the previous one, so every page is
+one range scan on idx_scans_user_id_timestamp (or the disease_type variant)
+however deep it is. The position travels as an opaque cursor string.
+Page-number pagination (LIMIT/OFFSET) is kept for existing clients.
+
+A `fields` list narrows a page to some of Scan.FIELDS: the other columns
+are deferred with load_only(), so wide ones (description, recommendations,
+image_stats) are not read from Postgres at all. id and timestamp are always
+loaded, since the cursor is built from them.
+
+The total is optional: 'exact' counts the scans, 'stats' takes the counters
+from user_stats (no scan rows read; can lag by the user_stats coalescing
+interval until reconcile_user_stats.py corrects drift) and 'none' skips it.
+"""
+from datetime import datetime
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import load_only
+from models import Scan, UserStats
+import base64
+import json
+import uuid
+
+COUNT_MODES = ('exact', 'stats', 'none')
+
+STATS_COUNTERS = {None: 'total_scans', 'skin': 'skin_scans', 'eye': 'eye_scans'}
+
+class InvalidCursorError(ValueError):
+    """The cursor was not produced by encode_cursor()"""
+
+class InvalidFieldsError(ValueError):
+    """A requested field is not one of Scan.FIELDS"""
+
+def parse_fields(value):
+    """'a,b,c' -> ('a', 'b', 'c') in request order, or None (all fields) when empty"""
+    if not value:
+        return None
+    fields = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in fields if name not in Scan.FIELDS]
+    if unknown:
+        raise InvalidFieldsError(f"Invalid fields: {', '.join(unknown)}. Must be a comma-separated subset of: {', '.join(Scan.FIELDS)}")
+    return fields or None
+
+def field_columns(fields, rendition=None):
+    """Scan columns to load for these fields; image_url as a rendition also needs that rendition's column"""
+    names = {'id', 'timestamp', *fields}
+    if 'image_url' in fields and rendition in ('thumbnail', 'medium'):
+        names.add(f"{rendition}_url")
+    return [getattr(Scan, name) for name in Scan.FIELDS if name in names]
+
+def encode_cursor(scan):
+    """Opaque cursor pointing after this scan"""
+    payload = json.dumps({'t': scan.timestamp.isoformat(), 'id': str(scan.id)}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(cursor):
+    """Cursor -> (timestamp, scan id)"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        return datetime.fromisoformat(payload['t']), uuid.UUID(payload['id'])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {e}") from e
+
+def history_query(db, user_id, disease_type=None, fields=None, rendition=None):
+    query = db.query(Scan).filter(Scan.user_id == user_id)
+    if fields:
+        query = query.options(load_only(*field_columns(fields, rendition)))
+    if disease_type:
+        query = query.filter(Scan.disease_type == disease_type)
+    return query.order_by(Scan.timestamp.desc(), Scan.id.desc())
+
+def history_page(db, user_id, per_page, disease_type=None, cursor=None, page=None, fields=None, rendition=None):
+    """
+    One page of scans, newest first: after `cursor` if given, otherwise
+    page number `page` (1-based) with OFFSET. Returns (scans, next_cursor);
+    next_cursor is None on the last page. With `fields`, only the columns
+    behind them are loaded (serialize with to_dict(fields=fields)).
+    """
+    query = history_query(db, user_id, disease_type, fields, rendition)
+    if cursor:
+        timestamp, scan_id = decode_cursor(cursor)
+        query = query.filter(tuple_(Scan.timestamp, Scan.id) < tuple_(timestamp, scan_id))
+    elif page and page > 1:
+        query = query.offset((page - 1) * per_page)
+
+    # One extra row tells whether there is a next page without counting
+    scans = query.limit(per_page + 1).all()
+    if len(scans) <= per_page:
+        return scans, None
+    scans = scans[:per_page]
+    return scans, encode_cursor(scans[-1])
+
+def count_history(db, user_id, disease_type=None, mode='exact'):
+    """Total scans for the history view, by COUNT_MODES mode; None for 'none'"""
+    if mode == 'none':
+        return None
+    if mode == 'stats' and disease_type in STATS_COUNTERS:
+        total = db.query(getattr(UserStats, STATS_COUNTERS[disease_type])).filter(UserStats.user_id == user_id).scalar()
+        return total or 0
+    query = db.query(func.count(Scan.id)).filter(Scan.user_id == user_id)
+    if disease_type:
+        query = query.filter(Scan.disease_type == disease_type)
+    return query.scalar()
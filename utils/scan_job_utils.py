@@ -0,0 +1,234 @@
+"""
+Postgres-backed job queue for asynchronous scans.
+
+The scan routes enqueue a `scan_jobs` row and return 202 right away. Worker
+threads (see scan_worker.py) claim jobs with SELECT ... FOR UPDATE SKIP LOCKED,
+so any number of worker processes can drain the queue without processing the
+same job twice.
+
+A job can still run again: its worker crashes, the attempt fails and is
+retried, or a slow worker is reclaimed after SCAN_JOB_STALE_AFTER. The job is
+therefore completed in the transaction that saves its scan, and a worker only
+updates a job while it still holds it (status 'running', its worker_id), so a
+job saves one scan and a reclaimed worker cannot overwrite the result.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import or_, and_, update
+from config import Config
+from models import ScanJob
+from utils.scan_pipeline_utils import new_scan_context, run_scan_pipeline, build_scan_response, JOB_SCAN_PIPELINE
+from utils.inference_utils import get_backend
+from utils.circuit_breaker_utils import CircuitOpenError
+import logging
+import os
+import socket
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATUSES = ('completed', 'failed')
+
+DISEASE_TYPES = ('skin', 'eye')
+
+class ScanJobLostError(Exception):
+    """Another worker reclaimed the job, or finished it, while this one was processing it"""
+
+def enqueue_scan_job(db, image_bytes, disease_type, user_id=None, content_type=None, filename=None):
+    """Store the uploaded image in a new queued job"""
+    job = ScanJob(
+        user_id=user_id,
+        disease_type=disease_type,
+        status='queued',
+        image_data=image_bytes,
+        content_type=content_type,
+        filename=filename
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+def get_scan_job(db, job_id):
+    return db.query(ScanJob).filter(ScanJob.id == job_id).first()
+
+def available_disease_types():
+    """Disease types whose analysis backend is not failing fast (circuit closed)"""
+    return [disease_type for disease_type in DISEASE_TYPES if get_backend(disease_type).is_available()]
+
+def claim_next_job(db, worker_id, disease_types=DISEASE_TYPES):
+    """
+    Atomically claim the oldest runnable job of one of disease_types.
+    Jobs left 'running' by a crashed worker are reclaimed after SCAN_JOB_STALE_AFTER.
+    """
+    stale_cutoff = datetime.utcnow() - timedelta(seconds=Config.SCAN_JOB_STALE_AFTER)
+
+    job = db.query(ScanJob).filter(
+        ScanJob.disease_type.in_(disease_types),
+        or_(
+            ScanJob.status == 'queued',
+            and_(ScanJob.status == 'running', ScanJob.started_at < stale_cutoff)
+        )
+    ).order_by(ScanJob.created_at).with_for_update(skip_locked=True).first()
+
+    if not job:
+        db.rollback()
+        return None
+
+    job.status = 'running'
+    job.worker_id = worker_id
+    job.started_at = datetime.utcnow()
+    job.attempts = (job.attempts or 0) + 1
+    db.commit()
+    return job
+
+def update_claimed_job(db, job_id, worker_id, **values):
+    """
+    UPDATE a job only while worker_id still holds it (status 'running', not reclaimed).
+    Does not commit; returns whether the job was updated.
+    """
+    result = db.execute(
+        update(ScanJob)
+        .where(ScanJob.id == job_id, ScanJob.worker_id == worker_id, ScanJob.status == 'running')
+        .values(**values)
+    )
+    return result.rowcount == 1
+
+def complete_scan_job(db, job_id, worker_id, result):
+    """Store a job's result (without committing); raises ScanJobLostError if the worker no longer holds it"""
+    completed = update_claimed_job(
+        db, job_id, worker_id,
+        status='completed',
+        result=result,
+        error=None,
+        image_data=None,
+        finished_at=datetime.utcnow()
+    )
+    if not completed:
+        raise ScanJobLostError(f"Scan job {job_id} is no longer held by {worker_id}")
+
+def _retry_values(ctx):
+    # Keep the image an attempt already stored, so the retry does not upload it again
+    return {'image_url': ctx.image_url} if ctx is not None and ctx.image_url else {}
+
+def process_scan_job(db, job, worker_id):
+    """Run the scan pipeline for a job worker_id claimed and store the result"""
+    job_id, attempts = job.id, job.attempts or 0
+    ctx = None
+
+    def complete(scan):
+        complete_scan_job(db, job_id, worker_id, build_scan_response(scan))
+
+    try:
+        ctx = new_scan_context(
+            db, job.disease_type, job.image_data,
+            content_type=job.content_type,
+            filename=job.filename,
+            user_id=job.user_id,
+            image_url=job.image_url,
+            defer_on_circuit_open=True,
+            complete_job=complete
+        )
+        run_scan_pipeline(JOB_SCAN_PIPELINE, ctx)
+        logger.debug("Scan job %s finished", job_id, extra={'timings': ctx.timings})
+
+        if ctx.scan_id is None:
+            # No scan saved (guest job): the persist stage did not complete it
+            complete(ctx)
+            db.commit()
+        return True
+
+    except ScanJobLostError as e:
+        logger.warning("Scan job %s result dropped: %s", job_id, e)
+        db.rollback()
+        return False
+
+    except CircuitOpenError as e:
+        # Not the job's fault: put it back without using up an attempt
+        logger.info("Scan job %s deferred: %s", job_id, e)
+        db.rollback()
+        update_claimed_job(
+            db, job_id, worker_id,
+            status='queued',
+            error=str(e),
+            attempts=max(attempts - 1, 0),
+            **_retry_values(ctx)
+        )
+        db.commit()
+        return False
+
+    except Exception as e:
+        logger.error("Scan job %s failed (attempt %s): %s", job_id, attempts, e)
+        db.rollback()
+
+        # Requeue until the attempt budget is used up; a no-op once the job was completed
+        if attempts >= Config.SCAN_JOB_MAX_ATTEMPTS:
+            values = {'status': 'failed', 'image_data': None, 'finished_at': datetime.utcnow()}
+        else:
+            values = {'status': 'queued', **_retry_values(ctx)}
+        update_claimed_job(db, job_id, worker_id, error=str(e), **values)
+        db.commit()
+        return False
+
+def run_worker(session_factory, worker_id, stop_event, poll_interval=None):
+    """Claim and process jobs until stop_event is set"""
+    poll_interval = Config.SCAN_JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    logger.info("Scan worker %s started", worker_id)
+
+    while not stop_event.is_set():
+        # Leave jobs queued while their backend is failing fast instead of finishing them with
+        # fallbacks; a Groq outage does not hold up disease types served by the local model
+        disease_types = available_disease_types()
+        if not disease_types:
+            stop_event.wait(poll_interval)
+            continue
+
+        db = session_factory()
+        try:
+            job = claim_next_job(db, worker_id, disease_types)
+            if job is None:
+                stop_event.wait(poll_interval)
+                continue
+
+            logger.info("Scan worker %s processing job %s (%s)", worker_id, job.id, job.disease_type)
+            process_scan_job(db, job, worker_id)
+        except Exception as e:
+            logger.error("Scan worker %s error: %s", worker_id, e)
+            db.rollback()
+            stop_event.wait(poll_interval)
+        finally:
+            db.close()
+
+    logger.info("Scan worker %s stopped", worker_id)
+
+def start_worker_pool(session_factory, num_workers=None):
+    """Start worker threads; returns (threads, stop_event)"""
+    num_workers = Config.SCAN_JOB_WORKERS if num_workers is None else num_workers
+    stop_event = threading.Event()
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    threads = []
+    for i in range(num_workers):
+        thread = threading.Thread(
+            target=run_worker,
+            args=(session_factory, f"{prefix}:{i}", stop_event),
+            name=f"scan-worker-{i}",
+            daemon=True
+        )
+        thread.start()
+        threads.append(thread)
+
+    return threads, stop_event
+
+def wait_for_job(db, job_id, timeout, interval=0.5):
+    """Long-poll helper: return the job once it finishes or timeout elapses"""
+    deadline = time.monotonic() + timeout
+
+    while True:
+        job = get_scan_job(db, job_id)
+        if job is None or job.status in FINISHED_STATUSES or time.monotonic() >= deadline:
+            return job
+
+        # End the read transaction so we see the worker's commit and don't hold a connection
+        db.rollback()
+        time.sleep(interval)
@@ -0,0 +1,416 @@
+"""
+Scan pipeline: validate -> auth -> cache -> normalize -> upload/analyze -> persist
+
+All scan entry points (/api/detect, /api/scan/skin|eye, async scan jobs,
+batch items) run the same stages on the engine in utils.pipeline_utils;
+they only differ in which stages they include.
+
+Images are normalized (utils.image_utils) when IMAGE_NORMALIZE_ENABLED.
+Two modes (Config.SCAN_PIPELINE_MODE, overridable per request):
+  - serial:     upload to Supabase, then let Groq fetch the public URL
+  - concurrent: send the bytes inline to Groq as a base64 data URL while the
+                Supabase upload runs on a bounded thread pool
+Backends that take image bytes (the local classifier) always run concurrently
+with the upload.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy import insert
+from werkzeug.utils import secure_filename
+from config import Config
+from models import Scan
+from utils.supabase_utils import upload_image_bytes
+from utils.inference_utils import get_backend
+from utils.image_utils import normalize_image, ImageValidationError
+from utils.upload_utils import open_upload_body, read_all, stream_size, hash_stream, sniff_image_type
+from utils.analysis_cache_utils import build_cache_key, get_cached_analysis, store_analysis
+from utils.identity_utils import resolve_user
+from utils.user_stats_utils import scan_stats_upsert, scan_increments, coalescing_enabled, buffer_stats
+from utils.rendition_utils import schedule_renditions
+from utils.groq_utils import is_circuit_open_result
+from utils.circuit_breaker_utils import CircuitOpenError
+from utils.pipeline_utils import Pipeline, PipelineContext, Stage
+from utils.gevent_utils import run_blocking
+import base64
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_MODES = ('serial', 'concurrent')
+
+# Groq rejects base64 image payloads above 4MB; larger images go through the URL path
+MAX_INLINE_IMAGE_BYTES = 4 * 1024 * 1024
+
+DEFAULT_RECOMMENDATION = {
+    'skin': 'Consult a dermatologist',
+    'eye': 'Consult an ophthalmologist'
+}
+
+# Stages that may be turned off with SCAN_PIPELINE_DISABLED_STAGES
+OPTIONAL_STAGES = ('cache_lookup', 'cache_store')
+
+_stage_executor = ThreadPoolExecutor(
+    max_workers=Config.SCAN_UPLOAD_WORKERS,
+    thread_name_prefix='scan-stage'
+)
+
+class ScanRequestError(Exception):
+    """The scan request cannot be processed (bad input, unknown user)"""
+
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+class ScanUploadError(Exception):
+    """The image could not be stored in Supabase"""
+
+class ScanAnalysisError(Exception):
+    """The vision model call failed"""
+
+def encode_data_url(image_bytes, content_type=None):
+    """Inline image as a base64 data URL for the vision model"""
+    encoded = base64.b64encode(image_bytes).decode('ascii')
+    return f"data:{content_type or 'image/jpeg'};base64,{encoded}"
+
+def data_url_size(image_size, content_type=None):
+    """Length of encode_data_url() for an image of image_size bytes (base64 adds a third)"""
+    return len(f"data:{content_type or 'image/jpeg'};base64,") + 4 * -(-image_size // 3)
+
+def _extension_for(content_type):
+    if content_type == 'image/png':
+        return 'png'
+    if content_type == 'image/webp':
+        return 'webp'
+    return 'jpg'
+
+def resolve_pipeline_mode(requested=None):
+    mode = (requested or Config.SCAN_PIPELINE_MODE or 'serial').lower()
+    return mode if mode in PIPELINE_MODES else 'serial'
+
+def default_recommendations(disease_type):
+    return [DEFAULT_RECOMMENDATION.get(disease_type, 'Consult a medical professional')]
+
+# ---------------------------------------------------------------------------
+# Stages
+# ---------------------------------------------------------------------------
+
+def _validate(ctx):
+    """Check the file signature and hash the upload in chunks for the cache key"""
+    content_type = sniff_image_type(ctx.image)
+    if content_type is None:
+        raise ImageValidationError('Invalid image file: not a PNG or JPEG image')
+
+    ctx.content_type = content_type
+    ctx.extension = _extension_for(content_type)
+    ctx.image_hash = hash_stream(ctx.image)
+    ctx.cache_key = build_cache_key(ctx.image_hash, ctx.disease_type)
+
+def _authenticate(ctx):
+    """Resolve the user: required for authenticated routes, optional (guest) otherwise"""
+    user = None
+
+    if ctx.uid:
+        user = resolve_user(ctx.db, ctx.uid)
+    elif ctx.token:
+        try:
+            from utils.firebase_utils import verify_token
+            decoded_token = verify_token(ctx.token)
+            if decoded_token:
+                user = resolve_user(ctx.db, decoded_token.get('uid'))
+        except Exception as auth_error:
+            logger.warning("Auth check failed (continuing as guest): %s", auth_error)
+
+    if user is None:
+        if ctx.require_user:
+            raise ScanRequestError('User not found', 404)
+        return
+
+    ctx.user_id = user.id
+    logger.debug("Authenticated scan for user: %s", user.id)
+
+def _lookup_cache(ctx):
+    """Reuse a previous analysis of the same image if we have one"""
+    cached = get_cached_analysis(ctx.db, ctx.cache_key)
+    if cached:
+        ctx.cached = cached
+        ctx.image_url = cached['image_url']
+        ctx.analysis_result = cached['analysis']
+        logger.debug("Analysis cache hit: %s", ctx.analysis_result.get('disease_name'))
+
+def _should_enqueue(ctx):
+    """
+    Async when asked for, or while the backend's circuit is open and SCAN_QUEUE_ON_CIRCUIT_OPEN is set.
+    Only for signed-in users: job results are served to their owner only, so guest scans run inline.
+    """
+    if ctx.cached or ctx.user_id is None:
+        return False
+    return ctx.async_requested or (Config.SCAN_QUEUE_ON_CIRCUIT_OPEN and not ctx.backend.is_available())
+
+def _enqueue(ctx):
+    """Hand upload and analysis to a scan worker; the job row stores the full image bytes"""
+    from utils.scan_job_utils import enqueue_scan_job
+    ctx.job = enqueue_scan_job(
+        ctx.db,
+        read_all(ctx.image),
+        ctx.disease_type,
+        user_id=ctx.user_id,
+        content_type=ctx.content_type,
+        filename=secure_filename(ctx.filename) if ctx.filename else None
+    )
+
+def _needs_analysis(ctx):
+    return not ctx.cached and ctx.job is None
+
+def _needs_upload(ctx):
+    # A retried scan job reuses the image its earlier attempt stored
+    return _needs_analysis(ctx) and ctx.image_url is None
+
+def _normalize(ctx):
+    """Normalize the image and decide whether the analysis can run alongside the upload"""
+    if Config.IMAGE_NORMALIZE_ENABLED:
+        ctx.image, ctx.content_type, ctx.extension, ctx.image_stats = run_blocking(normalize_image, ctx.image)
+
+    if (ctx.mode == 'concurrent' and not ctx.backend.accepts_bytes
+            and data_url_size(stream_size(ctx.image), ctx.content_type) > MAX_INLINE_IMAGE_BYTES):
+        ctx.mode = ctx.timings['mode'] = 'serial'
+
+    if ctx.backend.accepts_bytes or ctx.mode == 'concurrent':
+        # Inline analysis (data URL or local model) is the one stage that needs the whole image in memory
+        ctx.image = read_all(ctx.image)
+
+def _upload(ctx):
+    upload_user_id = ctx.upload_user_id or (str(ctx.user_id) if ctx.user_id is not None else 'guest')
+    body = open_upload_body(ctx.image)
+    try:
+        ctx.image_url = upload_image_bytes(body, upload_user_id, ctx.disease_type, ctx.content_type, ctx.extension)
+    except Exception as e:
+        raise ScanUploadError(str(e)) from e
+    finally:
+        if hasattr(body, 'close'):
+            body.close()
+
+def _analysis_dependencies(ctx):
+    # Remote models without inline input fetch the image from its storage URL
+    if ctx.backend.accepts_bytes or ctx.mode == 'concurrent':
+        return ('normalize',)
+    return ('normalize', 'upload')
+
+def _analyze(ctx):
+    if ctx.backend.accepts_bytes:
+        analysis_input = ctx.image
+    elif ctx.mode == 'concurrent':
+        analysis_input = encode_data_url(ctx.image, ctx.content_type)
+    else:
+        analysis_input = ctx.image_url
+
+    try:
+        if ctx.backend.accepts_bytes:
+            # In-process model: CPU-bound, kept off the gevent hub
+            ctx.analysis_result = run_blocking(ctx.backend.analyze, analysis_input, ctx.disease_type)
+        else:
+            ctx.analysis_result = ctx.backend.analyze(analysis_input, ctx.disease_type)
+    except Exception as e:
+        raise ScanAnalysisError(str(e)) from e
+
+    if ctx.defer_on_circuit_open and is_circuit_open_result(ctx.analysis_result):
+        raise CircuitOpenError("Groq circuit open")
+
+def _store_cache(ctx):
+    store_analysis(ctx.db, ctx.cache_key, ctx.image_hash, ctx.disease_type, ctx.analysis_result, ctx.image_url)
+
+def scan_row(disease_type, result, image_url, image_stats=None):
+    """Scan column values for an analysis result"""
+    return {
+        'id': uuid.uuid4(),
+        'disease_name': result.get('disease_name', 'Unknown'),
+        'confidence': float(result.get('confidence', 0)),
+        'severity': result.get('severity', 'medium'),
+        'description': result.get('description', ''),
+        'recommendations': result.get('recommendations', default_recommendations(disease_type)),
+        'image_url': image_url,
+        'image_stats': image_stats
+    }
+
+def save_scans(db, user_id, disease_type, rows, before_commit=None):
+    """
+    Insert scans (scan_row() dicts) with INSERT ... RETURNING id, timestamp and add
+    them to the user's stats with an upsert, in one transaction and one commit.
+    With USER_STATS_COALESCE the stats increment is buffered after the commit instead.
+    before_commit({scan id: timestamp}) runs in the same transaction, after the inserts;
+    if it raises, nothing is saved.
+    Returns {scan id: timestamp}.
+    """
+    now = datetime.utcnow()
+    values = [{'user_id': user_id, 'disease_type': disease_type, 'timestamp': now, **row} for row in rows]
+    coalesce = coalescing_enabled()
+
+    try:
+        saved = {
+            row.id: row.timestamp
+            for row in db.execute(insert(Scan).values(values).returning(Scan.id, Scan.timestamp))
+        }
+        if not coalesce:
+            db.execute(scan_stats_upsert(user_id, disease_type, len(values), now))
+        if before_commit is not None:
+            before_commit(saved)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    if coalesce:
+        buffer_stats(scan_increments(user_id, disease_type, len(values), now))
+
+    return saved
+
+def _persist(ctx):
+    """Save the scan with all analysis fields and update the user's stats"""
+    row = scan_row(ctx.disease_type, ctx.analysis_result, ctx.image_url, ctx.image_stats)
+    ctx.scan_id = str(row['id'])
+
+    def complete_job(saved):
+        # Scan jobs store their result in the scan's transaction, so a rerun cannot save it twice
+        ctx.timestamp = saved[row['id']]
+        ctx.complete_job(ctx)
+
+    saved = save_scans(ctx.db, ctx.user_id, ctx.disease_type, [row],
+                       before_commit=complete_job if ctx.complete_job is not None else None)
+    ctx.timestamp = saved[row['id']]
+    logger.info("Scan %s saved for user %s: %s", ctx.scan_id, ctx.user_id, row['disease_name'])
+
+    # Normalized bytes are passed along when in memory; otherwise the task downloads the original
+    schedule_renditions(ctx.image_url, ctx.image if isinstance(ctx.image, bytes) and not ctx.cached else None)
+
+def _build_stages(persist_required):
+    def is_user_scan(ctx):
+        return ctx.user_id is not None
+
+    def stored_analysis(ctx):
+        return ctx.job is None and ctx.analysis_result is not None
+
+    return {
+        'validate': Stage('validate', _validate),
+        'auth': Stage('auth', _authenticate, inline=True),
+        'cache_lookup': Stage('cache_lookup', _lookup_cache, requires=('validate',), inline=True,
+                              required=False, timing_key='cache_ms'),
+        'enqueue': Stage('enqueue', _enqueue, requires=('validate', 'auth', 'cache_lookup'),
+                         when=_should_enqueue, inline=True),
+        'normalize': Stage('normalize', _normalize, requires=('validate', 'cache_lookup', 'enqueue'),
+                           when=_needs_analysis),
+        'upload': Stage('upload', _upload, requires=('normalize', 'auth'), when=_needs_upload),
+        'analysis': Stage('analysis', _analyze, requires=_analysis_dependencies, when=_needs_analysis),
+        'cache_store': Stage('cache_store', _store_cache, requires=('upload', 'analysis'),
+                             when=_needs_analysis, inline=True, required=False),
+        'persist': Stage('persist', _persist, requires=('auth', 'upload', 'analysis', 'cache_store'),
+                         when=lambda ctx: is_user_scan(ctx) and stored_analysis(ctx), inline=True,
+                         required=persist_required)
+    }
+
+def build_pipeline(stage_names, persist_required=True):
+    stages = _build_stages(persist_required)
+    return Pipeline([stages[name] for name in stage_names], executor=_stage_executor)
+
+# /api/scan/skin|eye: guests allowed, a failed save does not fail the scan
+GUEST_SCAN_PIPELINE = build_pipeline(
+    ['validate', 'auth', 'cache_lookup', 'enqueue', 'normalize', 'upload', 'analysis', 'cache_store', 'persist'],
+    persist_required=False
+)
+
+# /api/detect/<type>: authenticated, the scan must be saved
+USER_SCAN_PIPELINE = build_pipeline(
+    ['validate', 'auth', 'cache_lookup', 'enqueue', 'normalize', 'upload', 'analysis', 'cache_store', 'persist']
+)
+
+# Async scan jobs: the user was resolved when the job was queued
+JOB_SCAN_PIPELINE = build_pipeline(
+    ['validate', 'cache_lookup', 'normalize', 'upload', 'analysis', 'cache_store', 'persist']
+)
+
+# Upload + analysis only (batch items, which are cached and saved in bulk)
+ANALYZE_PIPELINE = build_pipeline(['normalize', 'upload', 'analysis'])
+
+def new_scan_context(db, disease_type, image, mode=None, **values):
+    """Context for one scan; image is bytes or a seekable upload stream"""
+    backend = get_backend(disease_type)
+    mode = 'concurrent' if backend.accepts_bytes else resolve_pipeline_mode(mode)
+
+    ctx = PipelineContext(
+        db=db,
+        disease_type=disease_type,
+        image=image,
+        filename=None,
+        content_type=None,
+        extension='jpg',
+        mode=mode,
+        backend=backend,
+        uid=None,
+        token=None,
+        require_user=False,
+        async_requested=False,
+        defer_on_circuit_open=False,
+        complete_job=None,
+        user_id=None,
+        upload_user_id=None,
+        image_hash=None,
+        cache_key=None,
+        cached=None,
+        job=None,
+        image_url=None,
+        analysis_result=None,
+        image_stats=None,
+        scan_id=None,
+        timestamp=None
+    )
+    ctx.__dict__.update(values)
+    ctx.skip = {name for name in Config.SCAN_PIPELINE_DISABLED_STAGES if name in OPTIONAL_STAGES}
+    ctx.timings.update({'mode': mode, 'backend': backend.name})
+    return ctx
+
+def run_scan_pipeline(pipeline, ctx):
+    """Run the pipeline; per-stage timings go to ctx.timings and outcomes to ctx.timings['stages']"""
+    try:
+        pipeline.run(ctx)
+    finally:
+        if ctx.cached:
+            ctx.timings['mode'] = 'cached'
+        elif ctx.job is not None:
+            ctx.timings['mode'] = 'async'
+        ctx.timings['stages'] = dict(ctx.stages)
+    return ctx
+
+def build_scan_response(ctx):
+    """Response body shared by all scan endpoints and async job results"""
+    result = ctx.analysis_result
+    return {
+        'scan_id': ctx.scan_id,
+        'disease_name': result.get('disease_name', 'Unknown Condition'),
+        'confidence': float(result.get('confidence', 0)),
+        'severity': result.get('severity', 'medium'),
+        'recommendations': result.get('recommendations', default_recommendations(ctx.disease_type)),
+        'description': result.get('description', ''),
+        'image_url': ctx.image_url,
+        'cached': ctx.cached is not None,
+        'image_stats': ctx.image_stats,
+        'timestamp': (ctx.timestamp or datetime.utcnow()).isoformat()
+    }
+
+def upload_and_analyze(image, content_type, upload_user_id, disease_type, mode=None):
+    """
+    Normalize, store and analyze the image (bytes or a seekable upload stream).
+    Returns (image_url, analysis_result, timings, image_stats); timings holds per-stage
+    milliseconds and image_stats the before/after sizes (None when normalization is off).
+    """
+    ctx = new_scan_context(
+        None, disease_type, image, mode=mode,
+        content_type=content_type,
+        extension=_extension_for(content_type),
+        upload_user_id=upload_user_id
+    )
+    run_scan_pipeline(ANALYZE_PIPELINE, ctx)
+    return ctx.image_url, ctx.analysis_result, ctx.timings, ctx.image_stats
+
+def server_timing_header(timings):
+    """Format stage timings for the Server-Timing response header"""
+    parts = [f"{name[:-3]};dur={value}" for name, value in timings.items() if name.endswith('_ms')]
+    return ', '.join(parts)
@@ -0,0 +1,82 @@
+"""
+Lazily created SDK clients (Firebase Admin, Supabase, Groq)
+
+Importing the app neither imports nor sets up any SDK. Each client is
+registered with register_service(name, factory) and created by the first
+get() in a process: the first request that needs it, or warm_services() in
+the gunicorn worker hook (gunicorn.conf.py), so a worker is ready before it
+takes traffic and nothing is created in the master process. A client
+created before a fork is created again in the child, since connection pools
+and threads do not survive fork().
+
+A factory that raises is tried again on the next get(); one that returns
+None (service not configured) is remembered as unavailable.
+"""
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class LazyService:
+    """One SDK client per process, created on first use"""
+
+    def __init__(self, name, factory):
+        self.name = name
+        self._factory = factory
+        self._lock = threading.Lock()
+        self._value = None
+        self._pid = None
+        self.init_seconds = None
+
+    def get(self):
+        if self._pid == os.getpid():
+            return self._value
+        with self._lock:
+            if self._pid != os.getpid():
+                start = time.perf_counter()
+                self._value = self._factory()
+                self.init_seconds = time.perf_counter() - start
+                self._pid = os.getpid()
+                logger.debug("Service %s initialized in %.1fms", self.name, self.init_seconds * 1000)
+        return self._value
+
+    def initialized(self):
+        return self._pid == os.getpid()
+
+    def reset(self):
+        """Forget the client; the next get() creates a new one"""
+        with self._lock:
+            self._value = None
+            self._pid = None
+
+_services = {}
+
+def register_service(name, factory):
+    service = LazyService(name, factory)
+    _services[name] = service
+    return service
+
+def get_service(name):
+    return _services[name].get()
+
+def warm_services(names=None):
+    """Create registered clients now instead of on first use; failures are logged, not raised"""
+    for name, service in list(_services.items()):
+        if names is not None and name not in names:
+            continue
+        try:
+            service.get()
+        except Exception as e:
+            logger.warning("Service %s could not be initialized: %s", name, e)
+
+def get_service_stats():
+    return {
+        name: {
+            'initialized': service.initialized(),
+            'available': service.initialized() and service._value is not None,
+            'init_ms': round(service.init_seconds * 1000, 1) if service.init_seconds is not None else None
+        }
+        for name, service in _services.items()
+    }
@@ -0,0 +1,177 @@
+"""
+Recompute user_stats from the scans and appointments tables
+
+user_stats is kept up to date incrementally (utils/user_stats_utils.py) and
+can drift from the rows it counts: failed or lost increments, rows written
+by hand, scans saved before stats existed. reconcile() rebuilds the counters
+with set-based GROUP BY user_id queries, one batch of users per transaction,
+for users with scans or appointments created at or after the watermark
+stored in stats_watermarks (every user on the first run or with full=True).
+
+The new watermark is the run's start time minus STATS_RECONCILE_LAG_SECONDS,
+so rows whose transactions were still open when the run started (or whose
+stats increments were still in a coalescing buffer) are covered by the next
+run. Recomputing a user twice is harmless.
+
+Scans and appointments are only read with plain SELECTs, which take no row
+locks. Each batch writes its user_stats rows with one upsert, only where a
+value differs. On Postgres it runs under lock_timeout, so a batch that would
+queue behind live counter updates fails fast. The watermark is then left
+where it was and the next run retries those users.
+"""
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, or_, select, text, union
+from sqlalchemy.dialects.postgresql import insert
+from config import Config
+from models import Appointment, Scan, StatsWatermark, User, UserStats
+from utils.user_stats_utils import COUNTERS, DATES
+import logging
+import time
+import uuid
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_NAME = 'user_stats'
+
+def get_watermark(db, name=WATERMARK_NAME):
+    row = db.get(StatsWatermark, name)
+    return row.watermark if row is not None else None
+
+def set_watermark(db, watermark, name=WATERMARK_NAME):
+    stmt = insert(StatsWatermark).values(name=name, watermark=watermark, updated_at=datetime.utcnow())
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[StatsWatermark.name],
+        set_={'watermark': stmt.excluded.watermark, 'updated_at': stmt.excluded.updated_at}
+    ))
+    db.commit()
+
+def changed_user_ids(db, since, after=None, limit=500):
+    """
+    Next batch of user ids, in id order after `after`, with scans or appointments
+    created at or after `since` (every user when since is None).
+    """
+    if since is None:
+        user_id = User.id
+        query = select(user_id)
+    else:
+        changed = union(
+            select(Scan.user_id.label('user_id')).where(Scan.timestamp >= since),
+            select(Appointment.user_id.label('user_id')).where(Appointment.created_at >= since)
+        ).subquery()
+        user_id = changed.c.user_id
+        query = select(user_id)
+
+    if after is not None:
+        query = query.where(user_id > after)
+    return list(db.execute(query.order_by(user_id).limit(limit)).scalars())
+
+def compute_stats(db, user_ids):
+    """{user_id: stats column values} recomputed from scans and appointments"""
+    stats = {
+        user_id: {'user_id': user_id, **{column: 0 for column in COUNTERS}, **{column: None for column in DATES}}
+        for user_id in user_ids
+    }
+
+    scan_totals = db.execute(
+        select(
+            Scan.user_id,
+            func.count().label('total_scans'),
+            func.sum(case((Scan.disease_type == 'skin', 1), else_=0)).label('skin_scans'),
+            func.sum(case((Scan.disease_type == 'eye', 1), else_=0)).label('eye_scans'),
+            func.max(Scan.timestamp).label('last_scan_date')
+        ).where(Scan.user_id.in_(user_ids)).group_by(Scan.user_id)
+    )
+    for row in scan_totals:
+        stats[row.user_id].update(
+            total_scans=row.total_scans, skin_scans=row.skin_scans, eye_scans=row.eye_scans,
+            last_scan_date=row.last_scan_date
+        )
+
+    appointment_totals = db.execute(
+        select(
+            Appointment.user_id,
+            func.count().label('total_appointments'),
+            func.max(Appointment.created_at).label('last_appointment_date')
+        ).where(Appointment.user_id.in_(user_ids)).group_by(Appointment.user_id)
+    )
+    for row in appointment_totals:
+        stats[row.user_id].update(
+            total_appointments=row.total_appointments, last_appointment_date=row.last_appointment_date
+        )
+
+    return stats
+
+def write_stats(db, stats):
+    """Upsert recomputed stats, rewriting only rows that differ; returns the number of rows written"""
+    now = datetime.utcnow()
+    values = [{'id': uuid.uuid4(), **item, 'updated_at': now, 'data_version': 1} for item in stats.values()]
+    stmt = insert(UserStats).values(values)
+    columns = COUNTERS + DATES
+    result = db.execute(stmt.on_conflict_do_update(
+        index_elements=[UserStats.user_id],
+        set_={
+            **{column: getattr(stmt.excluded, column) for column in columns},
+            'updated_at': stmt.excluded.updated_at,
+            'data_version': func.coalesce(UserStats.data_version, 0) + 1
+        },
+        where=or_(*[getattr(UserStats, column).is_distinct_from(getattr(stmt.excluded, column)) for column in columns])
+    ))
+    return result.rowcount
+
+def _set_lock_timeout(db):
+    if db.get_bind().dialect.name == 'postgresql':
+        # Transaction-local, so the pooled connection goes back with the default
+        db.execute(text("SELECT set_config('lock_timeout', :timeout, true)"),
+                   {'timeout': f"{Config.STATS_RECONCILE_LOCK_TIMEOUT_MS}ms"})
+
+def reconcile_batch(db, user_ids):
+    """Recompute and write one batch of users in its own transaction; returns rows written"""
+    try:
+        _set_lock_timeout(db)
+        written = write_stats(db, compute_stats(db, user_ids))
+        db.commit()
+        return written
+    except Exception:
+        db.rollback()
+        raise
+
+def reconcile(db, full=False, batch_size=None, pause=0.0):
+    """
+    Reconcile users changed since the stored watermark (all users if full or
+    no watermark yet), then advance the watermark if every batch succeeded.
+    pause: seconds to sleep between batches, to spread the load.
+    Returns a summary dict.
+    """
+    batch_size = batch_size or Config.STATS_RECONCILE_BATCH_SIZE
+    started = datetime.utcnow()
+    since = None if full else get_watermark(db)
+    db.commit()
+
+    summary = {'since': since, 'users': 0, 'updated': 0, 'failed_batches': 0, 'watermark': since}
+    after = None
+    while True:
+        user_ids = changed_user_ids(db, since, after, batch_size)
+        db.commit()
+        if not user_ids:
+            break
+        after = user_ids[-1]
+
+        try:
+            summary['updated'] += reconcile_batch(db, user_ids)
+        except Exception as e:
+            summary['failed_batches'] += 1
+            logger.warning("Stats reconciliation batch of %d users failed: %s", len(user_ids), e)
+        summary['users'] += len(user_ids)
+
+        if pause:
+            time.sleep(pause)
+
+    if not summary['failed_batches']:
+        summary['watermark'] = started - timedelta(seconds=Config.STATS_RECONCILE_LAG_SECONDS)
+        set_watermark(db, summary['watermark'])
+
+    logger.info(
+        "Stats reconciliation: %d users checked, %d rows updated, %d failed batches (since %s)",
+        summary['users'], summary['updated'], summary['failed_batches'], since
+    )
+    return summary
@@ -1,101 +1,158 @@
-from supabase.client import create_client
-from typing import Optional, Any
 from config import Config
+from utils import http_utils
+from utils.upload_utils import open_upload_body
+from utils.metrics_utils import span
+from utils.service_utils import register_service
+import logging
 import uuid
 from datetime import datetime
 
-# Initialize Supabase client
-supabase: Optional[Any] = None
+logger = logging.getLogger(__name__)
 
-def initialize_supabase():
-    global supabase
+BUCKET_NAME = 'scans'  # Create this bucket in Supabase
+
+def _create_supabase_client():
+    """Supabase client, or None when it is not configured (see utils/service_utils.py)"""
     try:
         supabase_url = Config.SUPABASE_URL
         supabase_key = Config.SUPABASE_KEY
         
         # Validate configuration
         if not supabase_url:
-            print("⚠️  SUPABASE_URL not found in .env file")
-            return False
+            logger.warning("SUPABASE_URL not found in .env file")
+            return None
             
         if not supabase_key:
-            print("⚠️  SUPABASE_KEY not found in .env file")
-            return False
+            logger.warning("SUPABASE_KEY not found in .env file")
+            return None
         
         if 'your_supabase_project' in supabase_url:
-            print("⚠️  SUPABASE_URL is still set to placeholder value")
-            print(f"   Current: {supabase_url}")
-            print("   Please update with your actual Supabase project URL")
-            return False
+            logger.warning("SUPABASE_URL is still set to placeholder value (%s); update it with your Supabase project URL", supabase_url)
+            return None
+        
+        from supabase.client import create_client
+        from supabase.lib.client_options import ClientOptions
         
         # Create Supabase client
-        print(f"Connecting to Supabase: {supabase_url}")
-        supabase = create_client(supabase_url, supabase_key)
-        print(f"✓ Supabase initialized successfully")
-        return True
+        logger.info("Connecting to Supabase: %s", supabase_url)
+        client = create_client(
+            supabase_url,
+            supabase_key,
+            options=ClientOptions(storage_client_timeout=http_utils.httpx_timeout('supabase'))
+        )
+        
+        # Storage calls reuse one keep-alive httpx client; count them with the other upstreams
+        http_utils.instrument_httpx_client(client.storage.session, 'supabase')
+        logger.info("Supabase initialized successfully")
+        return client
         
     except Exception as e:
-        print(f"✗ Error initializing Supabase: {e}")
-        import traceback
-        traceback.print_exc()
-        return False
+        logger.exception("Error initializing Supabase: %s", e)
+        return None
+
+supabase_service = register_service('supabase', _create_supabase_client)
+
+def get_supabase():
+    """The process's Supabase client (created on first use), or None if it is not configured"""
+    return supabase_service.get()
+
+def initialize_supabase():
+    """Create the Supabase client now rather than on the first upload"""
+    return get_supabase() is not None
 
 def upload_image(file, user_id, scan_type):
     """
     Upload image to Supabase Storage
     Returns the public URL of the uploaded image
     """
+    # Stream spooled uploads instead of reading the whole file into memory
+    file_content = open_upload_body(file)
+    content_type = file.content_type if hasattr(file, 'content_type') else "image/jpeg"
+    
+    try:
+        return upload_image_bytes(file_content, user_id, scan_type, content_type)
+    finally:
+        if hasattr(file_content, 'close'):
+            file_content.close()
+
+def upload_image_bytes(file_content, user_id, scan_type, content_type="image/jpeg", extension="jpg"):
+    """
+    Upload image content (bytes or a BufferedReader, which is streamed in chunks) to Supabase Storage
+    Returns the public URL of the uploaded image
+    """
+    # Generate unique filename
+    timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
+    filename = f"{scan_type}/{user_id}/{timestamp}_{uuid.uuid4().hex[:8]}.{extension}"
+    
+    return upload_image_to_path(file_content, filename, content_type)
+
+def upload_image_to_path(file_content, path, content_type="image/jpeg", upsert=False):
+    """
+    Upload image content to a given path in the scans bucket
+    Returns the public URL of the uploaded image
+    """
     try:
         # Check if Supabase is initialized
+        supabase = get_supabase()
         if supabase is None:
             raise Exception("Supabase is not initialized. Please check your SUPABASE_URL and SUPABASE_KEY in .env")
         
-        # Generate unique filename
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
-        filename = f"{scan_type}/{user_id}/{timestamp}_{uuid.uuid4().hex[:8]}.jpg"
-        
-        # Upload to Supabase storage bucket
-        bucket_name = 'scans'  # Create this bucket in Supabase
-        
-        # Read file content
-        file.seek(0)  # Reset file pointer to beginning
-        file_content = file.read()
-        
-        print(f"Uploading image: {filename} to bucket: {bucket_name}")
+        logger.debug("Uploading image: %s to bucket: %s", path, BUCKET_NAME)
         
         # Upload file
-        response = supabase.storage.from_(bucket_name).upload(
-            path=filename,
-            file=file_content,
-            file_options={"content-type": file.content_type if hasattr(file, 'content_type') else "image/jpeg"}
-        )
+        file_options = {"content-type": content_type or "image/jpeg"}
+        if upsert:
+            file_options["x-upsert"] = "true"
+        with span('supabase.upload'):
+            response = supabase.storage.from_(BUCKET_NAME).upload(
+                path=path,
+                file=file_content,
+                file_options=file_options
+            )
         
-        print(f"Upload response: {response}")
+        logger.debug("Upload response: %s", response)
         
         # Get public URL
-        public_url = supabase.storage.from_(bucket_name).get_public_url(filename)
+        public_url = supabase.storage.from_(BUCKET_NAME).get_public_url(path)
         
-        print(f"Public URL: {public_url}")
+        logger.debug("Public URL: %s", public_url)
         
         return public_url
         
     except Exception as e:
-        print(f"Supabase upload error: {e}")
-        print(f"Error type: {type(e).__name__}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Supabase upload error (%s): %s", type(e).__name__, e)
         raise Exception(f"Failed to upload image to Supabase: {str(e)}")
 
+def storage_path_from_url(public_url):
+    """'<SUPABASE_URL>/storage/v1/object/public/scans/skin/<user>/<file>.jpg?' -> 'skin/<user>/<file>.jpg'"""
+    marker = f"/object/public/{BUCKET_NAME}/"
+    if not public_url or marker not in public_url:
+        return None
+    return public_url.split(marker, 1)[1].split('?', 1)[0]
+
+def download_image(public_url):
+    """Download a stored image by its public URL; returns the bytes"""
+    supabase = get_supabase()
+    if supabase is None:
+        raise Exception("Supabase is not initialized. Please check your SUPABASE_URL and SUPABASE_KEY in .env")
+    
+    path = storage_path_from_url(public_url)
+    if path is None:
+        raise Exception(f"Not a {BUCKET_NAME} bucket URL: {public_url}")
+    
+    with span('supabase.download'):
+        return supabase.storage.from_(BUCKET_NAME).download(path)
+
 def delete_image(file_path):
     """Delete image from Supabase Storage"""
     try:
+        supabase = get_supabase()
         if supabase is None:
-            print("Supabase not initialized, cannot delete image")
+            logger.warning("Supabase not initialized, cannot delete image")
             return False
             
-        bucket_name = 'scans'
-        supabase.storage.from_(bucket_name).remove([file_path])
+        supabase.storage.from_(BUCKET_NAME).remove([file_path])
         return True
     except Exception as e:
-        print(f"Supabase delete error: {e}")
+        logger.error("Supabase delete error: %s", e)
         return False
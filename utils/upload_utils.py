@@ -0,0 +1,159 @@
+"""
+Memory-bounded handling of uploaded images
+
+Request bodies above UPLOAD_SPOOL_THRESHOLD are spooled to a temp file by
+the request class below. The helpers here hash, validate and stream those
+files in chunks so the full image is only read into memory by stages that
+really need the bytes (inline data URLs, the async job table).
+"""
+from flask import Request
+from config import Config
+import hashlib
+import io
+import os
+import tempfile
+
+# Leading bytes of the image formats we accept
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png')
+)
+
+class UploadSpool(tempfile.SpooledTemporaryFile):
+    """SpooledTemporaryFile that remembers its threshold (kept in memory up to, on disk above)"""
+
+    def __init__(self, threshold):
+        super().__init__(max_size=threshold, mode='rb+')
+        self.threshold = threshold
+
+class SpooledRequest(Request):
+    """Request class that spools file uploads to disk above a configurable size"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadSpool(Config.UPLOAD_SPOOL_THRESHOLD)
+
+def _unwrap(stream):
+    """FileStorage -> its underlying stream"""
+    return getattr(stream, 'stream', stream)
+
+def iter_chunks(stream, chunk_size=None):
+    """Yield the stream's content from the start in fixed-size chunks"""
+    stream = _unwrap(stream)
+    chunk_size = chunk_size or Config.UPLOAD_CHUNK_SIZE
+    stream.seek(0)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+    stream.seek(0)
+
+def hash_stream(stream):
+    """Incremental SHA-256 hex digest of a stream or bytes"""
+    if isinstance(stream, (bytes, bytearray)):
+        return hashlib.sha256(stream).hexdigest()
+
+    digest = hashlib.sha256()
+    for chunk in iter_chunks(stream):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def stream_size(stream):
+    """Size in bytes of a stream or bytes, without reading it"""
+    if isinstance(stream, (bytes, bytearray)):
+        return len(stream)
+
+    stream = _unwrap(stream)
+    position = stream.tell()
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(position)
+    return size
+
+def sniff_image_type(stream):
+    """Content type from the file signature, or None if it is not a supported image"""
+    if isinstance(stream, (bytes, bytearray)):
+        header = bytes(stream[:16])
+    else:
+        stream = _unwrap(stream)
+        stream.seek(0)
+        header = stream.read(16)
+        stream.seek(0)
+
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+def read_all(stream):
+    """Full content as bytes; only for stages that need the whole image in memory"""
+    if isinstance(stream, (bytes, bytearray)):
+        return bytes(stream)
+
+    stream = _unwrap(stream)
+    stream.seek(0)
+    data = stream.read()
+    stream.seek(0)
+    return data
+
+def is_spooled_to_disk(stream):
+    stream = _unwrap(stream)
+    if isinstance(stream, UploadSpool):
+        # The spool moves to disk once a write takes it past the threshold (0: never)
+        return stream.threshold > 0 and stream_size(stream) > stream.threshold
+    return hasattr(stream, 'fileno') and not isinstance(stream, io.BytesIO)
+
+class _PositionalReader(io.RawIOBase):
+    """Read-only view of a file descriptor with its own offset (os.pread)"""
+
+    def __init__(self, fd):
+        self._fd = os.dup(fd)
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = os.pread(self._fd, len(buffer), self._position)
+        size = len(data)
+        buffer[:size] = data
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += os.fstat(self._fd).st_size
+        self._position = offset
+        return self._position
+
+    def tell(self):
+        return self._position
+
+    def fileno(self):
+        return self._fd
+
+    def close(self):
+        if not self.closed:
+            os.close(self._fd)
+        super().close()
+
+def open_upload_body(stream):
+    """
+    Body for a storage upload: small in-memory uploads are passed as bytes, files
+    spooled to disk as a BufferedReader so the HTTP client streams them in chunks.
+    """
+    if isinstance(stream, (bytes, bytearray)):
+        return bytes(stream)
+
+    stream = _unwrap(stream)
+    if not is_spooled_to_disk(stream):
+        return read_all(stream)
+
+    # Independent reader over the same temp file, so other stages can keep using the stream
+    stream.flush()
+    return io.BufferedReader(_PositionalReader(stream.fileno()), buffer_size=Config.UPLOAD_CHUNK_SIZE)
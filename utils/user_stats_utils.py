@@ -1,71 +1,264 @@
 """
 Utility functions for managing user statistics
+
+Counters are bumped with INSERT ... ON CONFLICT (user_id) DO UPDATE SET
+total_scans = user_stats.total_scans + excluded.total_scans, ... so concurrent
+scans and bookings for one user never lose increments, and the row is created
+by the first one.
+
+With USER_STATS_COALESCE=true, increments are instead merged per user in a
+per-process buffer and written by a background thread as one multi-row upsert
+every USER_STATS_FLUSH_INTERVAL_MS, or as soon as USER_STATS_FLUSH_MAX_EVENTS
+increments are waiting. Stats then lag by up to one interval, and increments
+still buffered when a process is killed are lost (a clean exit flushes them).
+
+Every upsert also bumps data_version, the per-user change counter the
+dashboard reads validate against (see utils/etag_utils.py).
 """
 from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from config import Config
 from models import UserStats
+from utils.metrics_utils import register_collector
+import atexit
+import logging
+import os
+import threading
+import uuid
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('total_scans', 'skin_scans', 'eye_scans', 'total_appointments')
+DATES = ('last_scan_date', 'last_appointment_date')
+
+def scan_increments(user_id, disease_type, count=1, scanned_at=None):
+    """Counter increments for count scans of one disease type"""
+    return {
+        'user_id': user_id,
+        'total_scans': count,
+        'skin_scans': count if disease_type == 'skin' else 0,
+        'eye_scans': count if disease_type == 'eye' else 0,
+        'last_scan_date': scanned_at or datetime.utcnow()
+    }
+
+def appointment_increments(user_id, count=1, booked_at=None):
+    """Counter increments for count booked appointments"""
+    return {
+        'user_id': user_id,
+        'total_appointments': count,
+        'last_appointment_date': booked_at or datetime.utcnow()
+    }
+
+def merge_increments(into, increments):
+    """Add increments to an accumulated dict for the same user (latest dates win)"""
+    for column in COUNTERS:
+        into[column] = into.get(column, 0) + increments.get(column, 0)
+    for column in DATES:
+        if increments.get(column) is not None and (into.get(column) is None or increments[column] > into[column]):
+            into[column] = increments[column]
+    return into
+
+def stats_upsert(increments):
+    """
+    INSERT ... ON CONFLICT (user_id) DO UPDATE statement applying a list of
+    increments (at most one per user) in one round trip.
+    """
+    now = datetime.utcnow()
+    values = [
+        {
+            'id': uuid.uuid4(),
+            'user_id': item['user_id'],
+            **{column: item.get(column, 0) for column in COUNTERS},
+            **{column: item.get(column) for column in DATES},
+            'updated_at': now,
+            'data_version': 1
+        }
+        for item in increments
+    ]
+    stmt = insert(UserStats).values(values)
+    set_ = {column: func.coalesce(getattr(UserStats, column), 0) + getattr(stmt.excluded, column) for column in COUNTERS}
+    set_.update({column: func.coalesce(getattr(stmt.excluded, column), getattr(UserStats, column)) for column in DATES})
+    set_['updated_at'] = stmt.excluded.updated_at
+    set_['data_version'] = func.coalesce(UserStats.data_version, 0) + 1
+    return stmt.on_conflict_do_update(index_elements=[UserStats.user_id], set_=set_)
+
+def scan_stats_upsert(user_id, disease_type, count=1, scanned_at=None):
+    """
+    Upsert adding count scans to the user's stats; execute it in the same
+    transaction as the scan insert.
+    """
+    return stats_upsert([scan_increments(user_id, disease_type, count, scanned_at)])
+
+def appointment_stats_upsert(user_id, count=1, booked_at=None):
+    """Upsert adding count appointments to the user's stats"""
+    return stats_upsert([appointment_increments(user_id, count, booked_at)])
+
+def touch_stats_upsert(user_ids):
+    """
+    Upsert bumping only data_version and updated_at, for writes that change
+    what the dashboard reads without changing a counter (appointment status,
+    scan renditions); execute it in the same transaction as the write.
+    """
+    return stats_upsert([{'user_id': user_id} for user_id in sorted(set(user_ids), key=str)])
+
+class StatsBuffer:
+    """Per-process user_stats increments, merged per user and flushed in bulk by a background thread"""
+
+    def __init__(self, interval_ms, max_events, session_factory=None):
+        self.interval = interval_ms / 1000
+        self.max_events = max_events
+        self._session_factory = session_factory
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}
+        self._events = 0
+        self._thread = None
+        self._pid = None
+        self.flushes = 0
+        self.flush_failures = 0
+        self.flushed_events = 0
+
+    def add(self, increments):
+        """Buffer increments; wakes the flusher once max_events are waiting"""
+        with self._lock:
+            self._start()
+            merge_increments(self._pending.setdefault(increments['user_id'], {'user_id': increments['user_id']}), increments)
+            self._events += 1
+            full = self._events >= self.max_events
+        if full:
+            self._wake.set()
+
+    def pending_events(self):
+        return self._events
+
+    def flush(self):
+        """Write all buffered increments with one upsert; returns the number of increments written"""
+        with self._flush_lock:
+            with self._lock:
+                if self._pid != os.getpid():
+                    # Nothing buffered here yet, or increments copied from a parent across fork()
+                    return 0
+                pending, events = self._pending, self._events
+                self._pending, self._events = {}, 0
+            if not pending:
+                return 0
+
+            session_factory = self._session_factory
+            if session_factory is None:
+                from database import SessionLocal as session_factory
+
+            # Rows in user_id order, so concurrent flushes from other workers lock them in the same order
+            rows = sorted(pending.values(), key=lambda item: str(item['user_id']))
+            db = session_factory()
+            try:
+                db.execute(stats_upsert(rows))
+                db.commit()
+            except Exception as e:
+                db.rollback()
+                self.flush_failures += 1
+                logger.warning("User stats flush failed, keeping %d increments for the next one: %s", events, e)
+                self._requeue(pending, events)
+                return 0
+            finally:
+                db.close()
+
+            self.flushes += 1
+            self.flushed_events += events
+            logger.debug("Flushed %d user stats increments for %d users", events, len(rows))
+            return events
+
+    def _requeue(self, pending, events):
+        with self._lock:
+            for user_id, increments in pending.items():
+                merge_increments(self._pending.setdefault(user_id, {'user_id': user_id}), increments)
+            self._events += events
+
+    def _start(self):
+        # Called with self._lock held. A forked worker starts its own flusher and
+        # drops increments copied from the parent, which the parent flushes itself.
+        if self._pid == os.getpid():
+            return
+        if self._pid is not None:
+            self._pending, self._events = {}, 0
+        self._pid = os.getpid()
+        self._thread = threading.Thread(target=self._run, name='user-stats-flush', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+_buffer = StatsBuffer(Config.USER_STATS_FLUSH_INTERVAL_MS, Config.USER_STATS_FLUSH_MAX_EVENTS)
+atexit.register(_buffer.flush)
+
+def coalescing_enabled():
+    return Config.USER_STATS_COALESCE
+
+def buffer_stats(increments):
+    """Queue increments for the next bulk flush"""
+    _buffer.add(increments)
+
+def flush_stats():
+    """Write buffered increments now; returns how many were written"""
+    return _buffer.flush()
 
 def get_or_create_user_stats(db, user_id):
     """Get existing user stats or create new ones"""
     try:
-        # Try to get existing stats
-        user_stats = db.query(UserStats).filter(UserStats.user_id == user_id).first()
-        
-        # If not found, create new stats
-        if not user_stats:
-            user_stats = UserStats(user_id=user_id)
-            db.add(user_stats)
-            db.commit()
-            db.refresh(user_stats)
-        
-        return user_stats
+        # INSERT ... ON CONFLICT DO NOTHING: concurrent first requests cannot both create the row
+        db.execute(
+            insert(UserStats).values(
+                id=uuid.uuid4(), user_id=user_id, **{column: 0 for column in COUNTERS}, updated_at=datetime.utcnow()
+            ).on_conflict_do_nothing(index_elements=[UserStats.user_id])
+        )
+        db.commit()
+        return db.query(UserStats).filter(UserStats.user_id == user_id).first()
     except Exception as e:
-        print(f"Error getting/creating user stats: {e}")
+        logger.error("Error getting/creating user stats: %s", e)
         db.rollback()
         return None
 
-def update_scan_stats(db, user_id, disease_type):
-    """Update user scan statistics"""
+def _apply(db, increments):
+    if coalescing_enabled():
+        buffer_stats(increments)
+        return
+    db.execute(stats_upsert([increments]))
+    db.commit()
+
+def update_scan_stats(db, user_id, disease_type, count=1):
+    """Update user scan statistics; count > 1 records a batch of scans at once"""
     try:
-        # Get or create user stats
-        user_stats = get_or_create_user_stats(db, user_id)
-        
-        if not user_stats:
-            return False
-        
-        # Update stats using setattr to avoid type issues
-        setattr(user_stats, 'total_scans', (getattr(user_stats, 'total_scans') or 0) + 1)
-        setattr(user_stats, 'last_scan_date', datetime.utcnow())
-        
-        if disease_type == 'skin':
-            setattr(user_stats, 'skin_scans', (getattr(user_stats, 'skin_scans') or 0) + 1)
-        elif disease_type == 'eye':
-            setattr(user_stats, 'eye_scans', (getattr(user_stats, 'eye_scans') or 0) + 1)
-        
-        db.commit()
-        db.refresh(user_stats)
+        _apply(db, scan_increments(user_id, disease_type, count))
         return True
     except Exception as e:
-        print(f"Error updating scan stats: {e}")
+        logger.error("Error updating scan stats: %s", e)
         db.rollback()
         return False
 
 def update_appointment_stats(db, user_id):
     """Update user appointment statistics"""
     try:
-        # Get or create user stats
-        user_stats = get_or_create_user_stats(db, user_id)
-        
-        if not user_stats:
-            return False
-        
-        # Update stats using setattr to avoid type issues
-        setattr(user_stats, 'total_appointments', (getattr(user_stats, 'total_appointments') or 0) + 1)
-        setattr(user_stats, 'last_appointment_date', datetime.utcnow())
-        
-        db.commit()
-        db.refresh(user_stats)
+        _apply(db, appointment_increments(user_id))
         return True
     except Exception as e:
-        print(f"Error updating appointment stats: {e}")
+        logger.error("Error updating appointment stats: %s", e)
         db.rollback()
-        return False
\ No newline at end of file
+        return False
+
+@register_collector
+def user_stats_metric_lines():
+    return [
+        "# HELP user_stats_buffered_increments User stats increments waiting for the next flush",
+        "# TYPE user_stats_buffered_increments gauge",
+        f"user_stats_buffered_increments {_buffer.pending_events()}",
+        "# HELP user_stats_flushes_total Bulk user stats flushes written",
+        "# TYPE user_stats_flushes_total counter",
+        f"user_stats_flushes_total {_buffer.flushes}",
+        "# HELP user_stats_flush_failures_total Bulk user stats flushes that failed and were retried",
+        "# TYPE user_stats_flush_failures_total counter",
+        f"user_stats_flush_failures_total {_buffer.flush_failures}"
+    ]